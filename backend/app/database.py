@@ -1,8 +1,10 @@
-import os
 import logging
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from .db.lesson_cache import lesson_cache
+from .db.local_store import COLUMN_FIELDS
+from .db.supabase_client import get_supabase_client
 
 # Configure logging
 logging.basicConfig(
@@ -30,15 +32,9 @@ class Database:
         return self._client
 
     def _initialize_client(self):
-        """Initialize the Supabase client with environment variables."""
+        """Use the backend's shared Supabase client (SUPABASE_URL and SUPABASE_SERVICE_KEY)."""
         try:
-            supabase_url = os.getenv('SUPABASE_URL')
-            supabase_key = os.getenv('SUPABASE_KEY')
-
-            if not supabase_url or not supabase_key:
-                raise ValueError("Supabase URL and key must be set in environment variables")
-
-            self._client = create_client(supabase_url, supabase_key)
+            self._client = get_supabase_client(mock_if_unavailable=False)
             logger.info("Successfully connected to Supabase")
         except Exception as e:
             logger.error(f"Error initializing Supabase client: {str(e)}")
@@ -68,7 +64,19 @@ class Database:
             raise
 
     def get_lesson(self, lesson_id: str) -> Dict[str, Any]:
-        """Retrieve a lesson by ID."""
+        """Retrieve a lesson by ID (served from the lesson cache when possible)."""
+        lesson, _ = self.get_lesson_with_etag(lesson_id)
+        return lesson
+
+    def get_lesson_with_etag(self, lesson_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Retrieve a lesson by ID together with its content hash, for conditional requests."""
+        entry = lesson_cache.get_or_load(lesson_id, self._fetch_lesson)
+        if entry is None:
+            return None, None
+        return entry.data, entry.etag
+
+    def _fetch_lesson(self, lesson_id: str) -> Optional[Dict[str, Any]]:
+        """Load a lesson straight from Supabase, bypassing the cache."""
         try:
             response = self.client.table('lessons').select('*').eq('id', lesson_id).execute()
             return response.data[0] if response.data else None
@@ -76,6 +84,15 @@ class Database:
             logger.error(f"Error retrieving lesson: {str(e)}")
             raise
 
+    def get_lesson_fields(self, lesson_id: str, fields: List[str]) -> Optional[Dict[str, Any]]:
+        """Retrieve only the given fields of a lesson (a flat dict, not a row), bypassing the cache."""
+        try:
+            response = self.client.table('lessons').select(lesson_select(fields)).eq('id', lesson_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error retrieving lesson fields: {str(e)}")
+            raise
+
     def update_lesson(self, lesson_id: str, lesson_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing lesson."""
         try:
@@ -84,6 +101,8 @@ class Database:
         except Exception as e:
             logger.error(f"Error updating lesson: {str(e)}")
             raise
+        finally:
+            lesson_cache.invalidate(lesson_id)
 
     def delete_lesson(self, lesson_id: str) -> bool:
         """Delete a lesson by ID."""
@@ -93,11 +112,14 @@ class Database:
         except Exception as e:
             logger.error(f"Error deleting lesson: {str(e)}")
             raise
+        finally:
+            lesson_cache.invalidate(lesson_id)
 
-    def list_lessons(self, user_id: Optional[str] = None, limit: int = 10, offset: int = 0) -> list:
-        """List lessons with pagination and optional user filter."""
+    def list_lessons(self, user_id: Optional[str] = None, limit: int = 10, offset: int = 0,
+                     fields: Optional[List[str]] = None) -> list:
+        """List lessons with pagination and optional user filter (only the given fields, if any)."""
         try:
-            query = self.client.table('lessons').select('*')
+            query = self.client.table('lessons').select(lesson_select(fields) if fields else '*')
             
             # Filter by user_id if provided
             if user_id:
@@ -109,5 +131,13 @@ class Database:
             logger.error(f"Error listing lessons: {str(e)}")
             raise
 
+def lesson_select(fields: List[str]) -> str:
+    """
+    PostgREST select list for a lesson projection: fields with their own column
+    are read from it, the rest are extracted from the lesson_data JSONB (with an
+    alias, so the result is a flat dict keyed by field name).
+    """
+    return ','.join(name if name in COLUMN_FIELDS else f"{name}:lesson_data->{name}" for name in fields)
+
 # Create a singleton instance
 db = Database() 
\ No newline at end of file
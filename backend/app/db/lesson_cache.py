@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedLesson:
+    """A cached lesson record (or a negative entry when ``data`` is None)."""
+    data: Optional[Dict[str, Any]]
+    etag: Optional[str]
+    size: int
+    expires_at: Optional[float] = None
+
+    @property
+    def is_negative(self) -> bool:
+        return self.data is None
+
+
+def compute_content_hash(record: Dict[str, Any]) -> str:
+    """Returns a stable SHA-256 hash of a lesson record, used as its ETag."""
+    stored_hash = record.get("content_hash")
+    if stored_hash:
+        return str(stored_hash)
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ByteBoundedLRU:
+    """In-process LRU whose capacity is measured in (approximate) bytes, not entries."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, CachedLesson]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedLesson]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedLesson) -> None:
+        if entry.size > self.max_bytes:
+            logger.debug(f"Lesson {key} ({entry.size} bytes) exceeds cache capacity; not caching.")
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+
+
+class SharedLessonTier:
+    """
+    SQLite-backed cache tier shared by every worker process on the same host.
+
+    Besides the cached records it keeps an invalidation log, which workers poll
+    so that a write in one process evicts stale entries from the others.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 3600.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lesson_cache ("
+            " lesson_id TEXT PRIMARY KEY, payload TEXT NOT NULL, etag TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lesson_cache_invalidations ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, lesson_id TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def get(self, lesson_id: str) -> Optional[CachedLesson]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, etag FROM lesson_cache WHERE lesson_id = ? AND expires_at > ?",
+                (lesson_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        payload, etag = row
+        return CachedLesson(data=json.loads(payload), etag=etag, size=len(payload))
+
+    def set(self, lesson_id: str, entry: CachedLesson) -> None:
+        payload = json.dumps(entry.data, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lesson_cache (lesson_id, payload, etag, expires_at) VALUES (?, ?, ?, ?)",
+                (lesson_id, payload, entry.etag, time.time() + self.ttl_seconds),
+            )
+
+    def invalidate(self, lesson_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM lesson_cache WHERE lesson_id = ?", (lesson_id,))
+            self._conn.execute(
+                "INSERT INTO lesson_cache_invalidations (lesson_id, created_at) VALUES (?, ?)",
+                (lesson_id, now),
+            )
+            # Keep the log short; workers only ever need the recent tail.
+            self._conn.execute("DELETE FROM lesson_cache_invalidations WHERE created_at < ?", (now - 3600,))
+
+    def invalidations_since(self, seq: int) -> "tuple[int, list]":
+        """Returns (latest_seq, lesson_ids invalidated after ``seq``)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, lesson_id FROM lesson_cache_invalidations WHERE seq > ? ORDER BY seq",
+                (seq,),
+            ).fetchall()
+        if not rows:
+            return seq, []
+        return rows[-1][0], [lesson_id for _, lesson_id in rows]
+
+    def latest_seq(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM lesson_cache_invalidations").fetchone()
+        return row[0] or 0
+
+
+class LessonCache:
+    """
+    Read-through cache in front of lesson retrieval.
+
+    Lookups go to the in-process LRU first, then to the optional shared tier,
+    and finally to the supplied loader. Missing IDs are cached negatively for a
+    short time so repeated lookups of unknown lessons don't hit the database.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        negative_ttl: float = 30.0,
+        shared_tier: Optional[SharedLessonTier] = None,
+        sync_interval: float = 1.0,
+    ):
+        self.local = ByteBoundedLRU(max_bytes)
+        self.negative_ttl = negative_ttl
+        self.shared = shared_tier
+        self.sync_interval = sync_interval
+        self._last_sync = 0.0
+        self._last_seq = shared_tier.latest_seq() if shared_tier else 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "LessonCache":
+        """Builds the cache from LESSON_CACHE_* environment variables."""
+        max_bytes = int(os.getenv("LESSON_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        negative_ttl = float(os.getenv("LESSON_CACHE_NEGATIVE_TTL", "30"))
+        shared_path = os.getenv("LESSON_CACHE_SHARED_PATH")
+        if not shared_path and os.getenv("SHARED_STATE_DIR"):
+            # Multi-worker mode (see services/utils/shared_state.py): share the cache by default
+            shared_path = os.path.join(os.getenv("SHARED_STATE_DIR"), "lesson-cache.sqlite3")
+        shared_tier = None
+        if shared_path:
+            try:
+                shared_tier = SharedLessonTier(shared_path, float(os.getenv("LESSON_CACHE_SHARED_TTL", "3600")))
+                logger.info(f"Shared lesson cache tier enabled at {shared_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open shared lesson cache at {shared_path}: {e}. Using in-process cache only.")
+        return cls(max_bytes=max_bytes, negative_ttl=negative_ttl, shared_tier=shared_tier)
+
+    def get_or_load(self, lesson_id: str, loader: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[CachedLesson]:
+        """
+        Returns the cached lesson, loading (and caching) it on a miss.
+
+        Args:
+            lesson_id: ID of the lesson to fetch.
+            loader: Called with ``lesson_id`` on a miss; returns the record or None.
+
+        Returns:
+            The cached entry, or None if the lesson does not exist.
+        """
+        self._sync_invalidations()
+
+        entry = self.local.get(lesson_id)
+        if entry is not None:
+            self.hits += 1
+            return None if entry.is_negative else entry
+
+        if self.shared is not None:
+            entry = self.shared.get(lesson_id)
+            if entry is not None:
+                self.hits += 1
+                self.local.set(lesson_id, entry)
+                return entry
+
+        self.misses += 1
+        record = loader(lesson_id)
+        if record is None:
+            self.local.set(lesson_id, CachedLesson(
+                data=None, etag=None, size=len(lesson_id),
+                expires_at=time.monotonic() + self.negative_ttl,
+            ))
+            return None
+
+        entry = CachedLesson(
+            data=record,
+            etag=compute_content_hash(record),
+            size=len(json.dumps(record, default=str)),
+        )
+        self.local.set(lesson_id, entry)
+        if self.shared is not None:
+            self.shared.set(lesson_id, entry)
+        return entry
+
+    def invalidate(self, *lesson_ids: Optional[str]) -> None:
+        """Evicts the given lessons from every tier (including negative entries)."""
+        for lesson_id in filter(None, lesson_ids):
+            lesson_id = str(lesson_id)
+            self.local.pop(lesson_id)
+            if self.shared is not None:
+                try:
+                    self.shared.invalidate(lesson_id)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to invalidate lesson {lesson_id} in shared cache: {e}")
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def _sync_invalidations(self) -> None:
+        """Applies invalidations recorded by other workers, at most once per sync interval."""
+        if self.shared is None:
+            return
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        try:
+            self._last_seq, lesson_ids = self.shared.invalidations_since(self._last_seq)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read shared cache invalidations: {e}")
+            return
+        for lesson_id in lesson_ids:
+            self.local.pop(lesson_id)
+
+
+# Process-wide cache used by the Database layer and the lesson service
+lesson_cache = LessonCache.from_env()
@@ -0,0 +1,415 @@
+import os
+import json
+import zlib
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .local_store import DEFAULT_DB_PATH
+
+try:
+    import zstandard
+    _ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=10)
+    _ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+except ImportError:  # Optional dependency; fall back to zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# At most SNAPSHOT_INTERVAL versions follow a snapshot (a full manifest) as
+# deltas, so reconstruction never replays more than SNAPSHOT_INTERVAL - 1 deltas.
+SNAPSHOT_INTERVAL = int(os.getenv("LESSON_SNAPSHOT_INTERVAL", "8"))
+COMPRESS_MIN_BYTES = 256
+# Attempts at appending a version when concurrent saves take the same number
+SAVE_ATTEMPTS = 5
+
+# Lesson fields that are split into content-addressed blobs (one per item)
+LIST_FIELDS = ("vocabulary", "quiz", "learning_objectives")
+PARAGRAPH_SEPARATOR = "\n\n"
+
+_CODEC_RAW, _CODEC_ZLIB, _CODEC_ZSTD = b"r", b"d", b"z"
+
+
+class VersionConflict(Exception):
+    """Another save already took this version number of the lesson."""
+
+
+def encode_blob(raw: bytes) -> bytes:
+    """Compresses a blob (zstd if available, else zlib), prefixed with a one-byte codec tag."""
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return _CODEC_RAW + raw
+    if zstandard is not None:
+        return _CODEC_ZSTD + _ZSTD_COMPRESSOR.compress(raw)
+    return _CODEC_ZLIB + zlib.compress(raw, 6)
+
+
+def decode_blob(stored: bytes) -> bytes:
+    codec, payload = stored[:1], stored[1:]
+    if codec == _CODEC_RAW:
+        return payload
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == _CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Lesson blob is zstd-compressed but the 'zstandard' package is not installed.")
+        return _ZSTD_DECOMPRESSOR.decompress(payload)
+    raise ValueError(f"Unknown lesson blob codec: {codec!r}")
+
+
+def _canonical_bytes(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def split_lesson(lesson: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    """
+    Splits a lesson into a manifest and its content-addressed blobs.
+
+    Content paragraphs, the summary and every vocabulary/quiz/objective item
+    become blobs keyed by their SHA-256; the manifest keeps the remaining
+    scalar fields inline and lists blob hashes for the rest. Unchanged items
+    hash identically across versions, so they are stored only once.
+
+    Returns:
+        Tuple of (manifest, {hash: uncompressed blob bytes})
+    """
+    blobs: Dict[str, bytes] = {}
+
+    def add_blob(value: Any) -> str:
+        raw = _canonical_bytes(value)
+        digest = hashlib.sha256(raw).hexdigest()
+        blobs[digest] = raw
+        return digest
+
+    manifest: Dict[str, Any] = {}
+    for key, value in lesson.items():
+        if key == "lesson_content":
+            manifest["paragraphs"] = [add_blob(p) for p in (value or "").split(PARAGRAPH_SEPARATOR)]
+        elif key == "summary" and value:
+            manifest["summary"] = add_blob(value)
+        elif key in LIST_FIELDS and value:
+            manifest[key] = [add_blob(item) for item in value]
+        else:
+            manifest[key] = value
+    return manifest, blobs
+
+
+def join_lesson(manifest: Dict[str, Any], blobs: Dict[str, bytes]) -> Dict[str, Any]:
+    """Inverse of split_lesson: rebuilds the lesson dict from a manifest and decoded blobs."""
+    def load(digest: str) -> Any:
+        return json.loads(blobs[digest])
+
+    lesson: Dict[str, Any] = {}
+    for key, value in manifest.items():
+        if key == "paragraphs":
+            lesson["lesson_content"] = PARAGRAPH_SEPARATOR.join(load(d) for d in value)
+        elif key == "summary" and value:
+            lesson["summary"] = load(value)
+        elif key in LIST_FIELDS and value:
+            lesson[key] = [load(d) for d in value]
+        else:
+            lesson[key] = value
+    return lesson
+
+
+def manifest_blob_hashes(manifest: Dict[str, Any]) -> Set[str]:
+    hashes = set(manifest.get("paragraphs") or [])
+    if manifest.get("summary"):
+        hashes.add(manifest["summary"])
+    for key in LIST_FIELDS:
+        hashes.update(manifest.get(key) or [])
+    return hashes
+
+
+def diff_manifests(parent: Dict[str, Any], child: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the delta that turns ``parent`` into ``child``.
+
+    Changed hash lists are stored as (length of the common prefix, new tail),
+    since continuations mostly append paragraphs and items.
+    """
+    delta: Dict[str, Any] = {"set": {}, "splice": {}, "unset": [key for key in parent if key not in child]}
+    for key, value in child.items():
+        old = parent.get(key, object())
+        if old == value:
+            continue
+        if isinstance(old, list) and isinstance(value, list):
+            keep = 0
+            while keep < min(len(old), len(value)) and old[keep] == value[keep]:
+                keep += 1
+            delta["splice"][key] = [keep, value[keep:]]
+        else:
+            delta["set"][key] = value
+    return delta
+
+
+def apply_delta(manifest: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    result = {key: value for key, value in manifest.items() if key not in delta.get("unset", [])}
+    result.update(delta.get("set", {}))
+    for key, (keep, tail) in delta.get("splice", {}).items():
+        result[key] = result[key][:keep] + tail
+    return result
+
+
+class SQLiteVersionBackend:
+    """Stores blobs and version records in the local SQLite lesson database."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lesson_blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS lesson_versions (
+                lesson_id TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                parent_version INTEGER,
+                is_snapshot INTEGER NOT NULL,
+                manifest BLOB NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (lesson_id, version)
+            );
+        """)
+
+    def missing_blobs(self, hashes: Iterable[str]) -> Set[str]:
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT hash FROM lesson_blobs WHERE hash IN ({','.join('?' * len(hashes))})", hashes
+            ).fetchall()
+        return set(hashes) - {row[0] for row in rows}
+
+    def put_blobs(self, blobs: Dict[str, bytes]) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO lesson_blobs (hash, data) VALUES (?, ?)", blobs.items())
+
+    def get_blobs(self, hashes: Iterable[str]) -> Dict[str, bytes]:
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT hash, data FROM lesson_blobs WHERE hash IN ({','.join('?' * len(hashes))})", hashes
+            ).fetchall()
+        return {digest: bytes(data) for digest, data in rows}
+
+    def insert_version(self, row: Dict[str, Any]) -> None:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO lesson_versions (lesson_id, version, parent_version, is_snapshot, manifest, created_at)"
+                    " VALUES (:lesson_id, :version, :parent_version, :is_snapshot, :manifest, :created_at)",
+                    row,
+                )
+        except sqlite3.IntegrityError as e:
+            raise VersionConflict(str(e)) from e
+
+    def get_versions(self, lesson_id: str, first: int = 1, last: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT * FROM lesson_versions WHERE lesson_id = ? AND version >= ?"
+        params: List[Any] = [lesson_id, first]
+        if last is not None:
+            sql += " AND version <= ?"
+            params.append(last)
+        with self._lock:
+            cursor = self._conn.execute(sql + " ORDER BY version", params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def latest_version(self, lesson_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(version) FROM lesson_versions WHERE lesson_id = ?", (lesson_id,)
+            ).fetchone()
+        return row[0] or 0
+
+    def latest_snapshot(self, lesson_id: str, version: int) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(version) FROM lesson_versions WHERE lesson_id = ? AND version <= ? AND is_snapshot = 1",
+                (lesson_id, version),
+            ).fetchone()
+        return row[0] or 0
+
+
+class SupabaseVersionBackend:
+    """Stores blobs and version records in Supabase (see migrations/003_lesson_versions.sql)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _to_bytea(data: bytes) -> str:
+        return "\\x" + data.hex()
+
+    @staticmethod
+    def _from_bytea(value: str) -> bytes:
+        return bytes.fromhex(value[2:] if value.startswith("\\x") else value)
+
+    def missing_blobs(self, hashes: Iterable[str]) -> Set[str]:
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        response = self.client.table("lesson_blobs").select("hash").in_("hash", hashes).execute()
+        return set(hashes) - {row["hash"] for row in response.data or []}
+
+    def put_blobs(self, blobs: Dict[str, bytes]) -> None:
+        rows = [{"hash": digest, "data": self._to_bytea(data)} for digest, data in blobs.items()]
+        self.client.table("lesson_blobs").upsert(rows, ignore_duplicates=True).execute()
+
+    def get_blobs(self, hashes: Iterable[str]) -> Dict[str, bytes]:
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        response = self.client.table("lesson_blobs").select("hash, data").in_("hash", hashes).execute()
+        return {row["hash"]: self._from_bytea(row["data"]) for row in response.data or []}
+
+    def insert_version(self, row: Dict[str, Any]) -> None:
+        from postgrest.exceptions import APIError
+
+        try:
+            self.client.table("lesson_versions").insert({
+                **row,
+                "is_snapshot": bool(row["is_snapshot"]),
+                "manifest": self._to_bytea(row["manifest"]),
+            }).execute()
+        except APIError as e:
+            if e.code == "23505":  # unique_violation on (lesson_id, version)
+                raise VersionConflict(e.message) from e
+            raise
+
+    def get_versions(self, lesson_id: str, first: int = 1, last: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = self.client.table("lesson_versions").select("*").eq("lesson_id", lesson_id).gte("version", first)
+        if last is not None:
+            query = query.lte("version", last)
+        response = query.order("version").execute()
+        return [{**row, "manifest": self._from_bytea(row["manifest"])} for row in response.data or []]
+
+    def latest_version(self, lesson_id: str) -> int:
+        response = self.client.table("lesson_versions").select("version") \
+            .eq("lesson_id", lesson_id).order("version", desc=True).limit(1).execute()
+        return response.data[0]["version"] if response.data else 0
+
+    def latest_snapshot(self, lesson_id: str, version: int) -> int:
+        response = self.client.table("lesson_versions").select("version") \
+            .eq("lesson_id", lesson_id).eq("is_snapshot", True).lte("version", version) \
+            .order("version", desc=True).limit(1).execute()
+        return response.data[0]["version"] if response.data else 0
+
+
+class LessonVersionStore:
+    """
+    Versioned, deduplicated, compressed lesson storage.
+
+    Each save appends a version. Versions store either a full manifest
+    (snapshots, at least every SNAPSHOT_INTERVAL versions) or a delta against
+    their parent; the lesson text itself lives in shared content-addressed blobs.
+    Reads locate snapshots from the stored rows, so changing the interval
+    never affects existing history.
+    """
+
+    def __init__(self, backend, snapshot_interval: int = SNAPSHOT_INTERVAL):
+        self.backend = backend
+        self.snapshot_interval = max(1, snapshot_interval)
+
+    def save_version(self, lesson_id: str, lesson: Dict[str, Any]) -> int:
+        """
+        Appends a new version of a lesson.
+
+        Args:
+            lesson_id: ID shared by every version of the lesson.
+            lesson: The full lesson (LessonGenerationResponse fields, JSON-compatible).
+
+        Returns:
+            The new version number (1 for the first save).
+
+        Raises:
+            VersionConflict: if concurrent saves took the next version number
+                SAVE_ATTEMPTS times in a row.
+        """
+        manifest, blobs = split_lesson(lesson)
+        missing = self.backend.missing_blobs(blobs.keys())
+        if missing:
+            self.backend.put_blobs({digest: encode_blob(blobs[digest]) for digest in missing})
+
+        for attempt in range(1, SAVE_ATTEMPTS + 1):
+            parent_version = self.backend.latest_version(lesson_id)
+            version = parent_version + 1
+            snapshot_version = self.backend.latest_snapshot(lesson_id, parent_version) if parent_version else 0
+            parent_manifest = self._load_manifest(lesson_id, parent_version) if snapshot_version else None
+            is_snapshot = parent_manifest is None or version - snapshot_version >= self.snapshot_interval
+            if is_snapshot:
+                record = {"manifest": manifest}
+            else:
+                record = {"delta": diff_manifests(parent_manifest, manifest)}
+            try:
+                self.backend.insert_version({
+                    "lesson_id": lesson_id,
+                    "version": version,
+                    "parent_version": parent_version or None,
+                    "is_snapshot": int(is_snapshot),
+                    "manifest": encode_blob(_canonical_bytes(record)),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                })
+                break
+            except VersionConflict:
+                if attempt == SAVE_ATTEMPTS:
+                    raise
+                logger.info(f"Version {version} of lesson {lesson_id} was taken by a concurrent save; retrying")
+        logger.info(
+            f"Saved lesson {lesson_id} version {version} "
+            f"({'snapshot' if is_snapshot else 'delta'}, {len(missing)} new of {len(blobs)} blobs)"
+        )
+        return version
+
+    def get_version(self, lesson_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Reconstructs a version of a lesson (the latest by default), or None if it doesn't exist."""
+        if version is None:
+            version = self.backend.latest_version(lesson_id)
+        if not version:
+            return None
+        manifest = self._load_manifest(lesson_id, version)
+        if manifest is None:
+            return None
+        stored = self.backend.get_blobs(manifest_blob_hashes(manifest))
+        return join_lesson(manifest, {digest: decode_blob(data) for digest, data in stored.items()})
+
+    def list_versions(self, lesson_id: str) -> List[Dict[str, Any]]:
+        return [
+            {key: row[key] for key in ("version", "parent_version", "is_snapshot", "created_at")}
+            for row in self.backend.get_versions(lesson_id)
+        ]
+
+    def _load_manifest(self, lesson_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """Replays deltas from the latest stored snapshot at or before ``version``."""
+        snapshot_version = self.backend.latest_snapshot(lesson_id, version)
+        if not snapshot_version:
+            return None
+        rows = self.backend.get_versions(lesson_id, first=snapshot_version, last=version)
+        manifest: Optional[Dict[str, Any]] = None
+        for row in rows:
+            record = json.loads(decode_blob(bytes(row["manifest"])))
+            if "manifest" in record:
+                manifest = record["manifest"]
+            elif manifest is not None:
+                manifest = apply_delta(manifest, record["delta"])
+        if manifest is None or not rows or rows[-1]["version"] != version:
+            return None
+        return manifest
+
+
+_sqlite_version_store: Optional[LessonVersionStore] = None
+
+
+def get_local_version_store() -> LessonVersionStore:
+    """Returns the process-wide version store backed by the local SQLite database."""
+    global _sqlite_version_store
+    if _sqlite_version_store is None:
+        path = os.getenv("LOCAL_LESSON_DB_PATH", str(DEFAULT_DB_PATH))
+        _sqlite_version_store = LessonVersionStore(SQLiteVersionBackend(path))
+    return _sqlite_version_store
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "lessons.sqlite3"
+
+# Facet columns that can be filtered on, mapped to the search parameter names
+FACET_COLUMNS = ("subject", "academic_grade", "language", "teacher_style")
+
+# Lesson fields that save_lesson also writes to their own column; projections read
+# these from the column and everything else from inside lesson_data
+COLUMN_FIELDS = ("id", "title", "subject", "topic", "academic_grade", "language", "teacher_style", "word_count")
+
+_FIELD_NAME_RE = re.compile(r"^\w+$")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_fts_query(query: str) -> Optional[str]:
+    """
+    Turns free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so user input can't inject FTS operators) and the
+    last word is prefix-matched to make search-as-you-type work.
+    """
+    tokens = _TOKEN_RE.findall(query or "")
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class LocalLessonStore:
+    """
+    SQLite-backed lesson storage used when Supabase is unavailable.
+
+    Lessons are stored as JSON alongside their facet columns, and an FTS5 table
+    mirrors the searchable text (title, content, summary, vocabulary terms) so
+    local search behaves like the tsvector search in Postgres.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    @classmethod
+    def from_env(cls) -> "LocalLessonStore":
+        """Opens the store at LOCAL_LESSON_DB_PATH (defaults to backend/data/lessons.sqlite3)."""
+        return cls(os.getenv("LOCAL_LESSON_DB_PATH", str(DEFAULT_DB_PATH)))
+
+    def _create_schema(self) -> None:
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lessons (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                topic TEXT,
+                academic_grade TEXT NOT NULL,
+                language TEXT,
+                teacher_style TEXT,
+                word_count INTEGER NOT NULL,
+                summary TEXT,
+                lesson_data TEXT NOT NULL,
+                created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+                updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+            );
+            CREATE INDEX IF NOT EXISTS idx_local_lessons_facets
+                ON lessons(subject, academic_grade, language, teacher_style);
+            CREATE VIRTUAL TABLE IF NOT EXISTS lessons_fts USING fts5(
+                lesson_id UNINDEXED, title, content, summary, vocabulary,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+        """)
+
+    def save_lesson(self, record: Dict[str, Any]) -> str:
+        """
+        Inserts or updates a lesson and refreshes its full-text entry.
+
+        Args:
+            record: Row in the same shape save_lesson writes to Supabase
+                (facet columns plus the full 'lesson_data' dict).
+
+        Returns:
+            The lesson ID.
+        """
+        return self.save_lessons([record])[0]
+
+    def save_lessons(self, records: List[Dict[str, Any]]) -> List[str]:
+        """Inserts or updates several lessons in a single transaction; returns their IDs."""
+        lesson_rows, fts_rows = [], []
+        for record in records:
+            lesson_data = record["lesson_data"]
+            lesson_id = str(record.get("id") or lesson_data.get("id"))
+            vocabulary_terms = " ".join(
+                item.get("term", "") for item in (lesson_data.get("vocabulary") or []) if isinstance(item, dict)
+            )
+            lesson_rows.append((
+                lesson_id, record["title"], record["subject"], record.get("topic"),
+                record["academic_grade"], record.get("language"), record.get("teacher_style"),
+                record["word_count"], lesson_data.get("summary"), json.dumps(lesson_data, default=str),
+            ))
+            fts_rows.append((
+                lesson_id, record["title"], lesson_data.get("lesson_content", ""),
+                lesson_data.get("summary") or "", vocabulary_terms,
+            ))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO lessons (id, title, subject, topic, academic_grade, language,"
+                    " teacher_style, word_count, summary, lesson_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(id) DO UPDATE SET title = excluded.title, subject = excluded.subject,"
+                    " topic = excluded.topic, academic_grade = excluded.academic_grade,"
+                    " language = excluded.language, teacher_style = excluded.teacher_style,"
+                    " word_count = excluded.word_count, summary = excluded.summary,"
+                    " lesson_data = excluded.lesson_data,"
+                    " updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')",
+                    lesson_rows,
+                )
+                self._conn.executemany(
+                    "DELETE FROM lessons_fts WHERE lesson_id = ?", [(row[0],) for row in fts_rows]
+                )
+                self._conn.executemany(
+                    "INSERT INTO lessons_fts (lesson_id, title, content, summary, vocabulary) VALUES (?, ?, ?, ?, ?)",
+                    fts_rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [row[0] for row in lesson_rows]
+
+    def get_lesson(self, lesson_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored row (with 'lesson_data' decoded) or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM lessons WHERE id = ?", (lesson_id,)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def get_lesson_fields(self, lesson_id: str, fields: List[str]) -> Optional[Dict[str, Any]]:
+        """Returns only the given fields of a lesson (a flat dict, not a row), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._projection(fields)} FROM lessons WHERE id = ?", (lesson_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recent_lessons(self, limit: int = 1000, offset: int = 0) -> List[Dict[str, Any]]:
+        """Returns the most recently saved lessons, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM lessons ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def recent_lesson_fields(self, fields: List[str], limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Like recent_lessons, but returns only the given fields of each lesson."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._projection(fields)} FROM lessons ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def lessons_after(self, after_id: Optional[str] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """Returns up to ``limit`` lessons with IDs greater than ``after_id``, in ID order (keyset pagination)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM lessons WHERE id > ? ORDER BY id LIMIT ?", (after_id or "", limit)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def delete_lesson(self, lesson_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM lessons WHERE id = ?", (lesson_id,))
+            self._conn.execute("DELETE FROM lessons_fts WHERE lesson_id = ?", (lesson_id,))
+        return cursor.rowcount > 0
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ranked full-text search with optional facet filters.
+
+        Args:
+            query: Free-text query; when empty, results are ordered by recency.
+            filters: Facet column -> exact (case-insensitive) value.
+            limit: Maximum number of results.
+            offset: Number of results to skip.
+
+        Returns:
+            List of rows, each with a 'rank' (higher is better).
+        """
+        where, params = [], []
+        for column, value in (filters or {}).items():
+            if column in FACET_COLUMNS and value:
+                where.append(f"l.{column} = ? COLLATE NOCASE")
+                params.append(value.strip())
+
+        fts_query = build_fts_query(query)
+        if fts_query:
+            # bm25() is lower-is-better; weight title > summary/vocabulary > content
+            sql = (
+                "SELECT l.*, -bm25(lessons_fts, 0.0, 10.0, 1.0, 4.0, 4.0) AS rank"
+                " FROM lessons_fts JOIN lessons l ON l.id = lessons_fts.lesson_id"
+                " WHERE lessons_fts MATCH ?"
+            )
+            params.insert(0, fts_query)
+            if where:
+                sql += " AND " + " AND ".join(where)
+            sql += " ORDER BY rank DESC"
+        else:
+            sql = "SELECT l.*, 0.0 AS rank FROM lessons l"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY l.created_at DESC"
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    @staticmethod
+    def _projection(fields: List[str]) -> str:
+        """
+        SQL expression building a JSON object of the given lesson fields, so
+        the projection happens in SQLite and only the result is decoded.
+        """
+        parts = []
+        for name in fields:
+            if not _FIELD_NAME_RE.match(name):
+                raise ValueError(f"Invalid field name: {name!r}")
+            source = name if name in COLUMN_FIELDS else f"json_extract(lesson_data, '$.{name}')"
+            parts.append(f"'{name}', {source}")
+        return f"json_object({', '.join(parts)})"
+
+    @staticmethod
+    def _row_to_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["lesson_data"] = json.loads(record["lesson_data"])
+        return record
+
+
+_local_store: Optional[LocalLessonStore] = None
+
+
+def get_local_store() -> LocalLessonStore:
+    """Returns the process-wide local store, opening it on first use."""
+    global _local_store
+    if _local_store is None:
+        _local_store = LocalLessonStore.from_env()
+        logger.info(f"Local lesson store opened at {_local_store.path}")
+    return _local_store
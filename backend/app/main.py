@@ -7,6 +7,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, PlainTextResponse
 from dotenv import load_dotenv
 from .routers import lesson_router # Import the lesson router
+from .routers import admin_router
+from services.utils.compression import CompressionMiddleware
+from services.utils.cancellation import DisconnectMiddleware
+from services.utils.tracing import TracingMiddleware
+from services.utils.profiling import ProfilingMiddleware
+from services.utils.loop_watchdog import LoopWatchdogMiddleware
+from services.utils.shared_state import run_once
+from services.utils import metrics, metrics_endpoint
+from services.utils.structured_logging import configure_logging
+from .db.lesson_cache import lesson_cache
+from .database import db
 
 # --- Configuration ---
 # Load .env file from the backend directory (one level up from app)
@@ -15,7 +26,8 @@ load_dotenv(dotenv_path=dotenv_path)
 
 # Logging setup
 log_level = os.getenv("LOG_LEVEL", "info").upper()
-logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+# Queued (never blocks the event loop) and JSON-formatted unless LOG_FORMAT=text
+configure_logging(log_level)
 logger = logging.getLogger(__name__)
 
 # Static files directory (assuming 'static' folder in 'app')
@@ -34,6 +46,14 @@ if not origins:
 
 logger.info(f"Configuring CORS for origins: {origins}")
 
+# --- Startup Tasks ---
+# Checks database access (as init_db.py does) once per start; in multi-worker mode only one worker runs it
+if os.getenv("DB_INIT_ON_STARTUP", "false").lower() == "true":
+    try:
+        run_once("database-init", db.initialize_tables)
+    except Exception as e:
+        logger.error(f"Database initialization on startup failed: {e}")
+
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="EasyLesson API",
@@ -49,6 +69,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli for responses above API_COMPRESSION_MIN_BYTES (streamed exports pass through)
+app.add_middleware(CompressionMiddleware)
+# Cancel pending OpenRouter calls when the client goes away mid-generation
+app.add_middleware(DisconnectMiddleware)
+# Sampling profile of a single request on demand (X-Profile header plus the admin token)
+app.add_middleware(ProfilingMiddleware)
+# Measures event loop lag; LOOP_WATCHDOG=true also logs what blocks the loop
+app.add_middleware(LoopWatchdogMiddleware)
+# Request spans, exported per TRACE_EXPORTER and summarised in a Server-Timing header
+app.add_middleware(TracingMiddleware)
 
 # --- API Routers ---
 # Placeholder for API endpoints, prefixed with /api
@@ -62,9 +92,18 @@ async def get_status():
 
 # TODO: Add other routers here (e.g., lessons, auth)
 api_router.include_router(lesson_router.router)
+api_router.include_router(admin_router.router)
 
 app.include_router(api_router)
 
+# Prometheus metrics at /metrics (summed over all workers in multi-worker mode)
+app.include_router(metrics_endpoint.router)
+metrics_endpoint.start_worker_snapshots()
+metrics.function("lesson_cache_hits_total", "Lesson lookups served from the lesson cache.",
+                 lambda: lesson_cache.hits, kind="counter")
+metrics.function("lesson_cache_misses_total", "Lesson lookups that had to load the lesson.",
+                 lambda: lesson_cache.misses, kind="counter")
+
 # --- Static Files & SPA Catch-all ---
 # Mount the static directory AFTER the API router
 # All requests not matching /api/... will be checked against static files
@@ -98,4 +137,4 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000)) # Default backend port
     reload_flag = os.getenv("UVICORN_RELOAD", "false").lower() == "true"
     logger.info(f"Starting Uvicorn server locally on port {port} (Reload: {reload_flag})")
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload_flag, app_dir=str(Path(__file__).parent))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload_flag, app_dir=str(Path(__file__).parent), log_config=None)
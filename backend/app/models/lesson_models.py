@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, Literal, Union
+from typing import Dict, List, Optional, Literal, Union
 import uuid
 from datetime import datetime
 
@@ -33,6 +33,11 @@ class QuizItem(BaseModel):
                 raise ValueError(f"correct_option_id '{correct_id}' does not match any provided option ID.")
         return options
 
+class FieldNormalization(BaseModel):
+    """Records how a free-form request field was canonicalized."""
+    original: str = Field(..., description="The value as it was sent.")
+    canonical: str = Field(..., description="The canonical value that was used.")
+
 # --- Lesson Generation ---
 
 class LessonGenerationRequest(BaseModel):
@@ -50,6 +55,12 @@ class LessonGenerationRequest(BaseModel):
     include_vocabulary: bool = Field(default=True, description="Flag to include a list of key vocabulary terms.")
     include_quiz: bool = Field(default=True, description="Flag to include a multiple-choice comprehension quiz.")
     user_prompt_addition: Optional[str] = Field(None, description="Optional additional instructions or context from the user.")
+    reuse_similarity_threshold: Optional[float] = Field(
+        None,
+        ge=0.5,
+        le=1.0,
+        description="If set, return an existing saved lesson whose request parameters are at least this similar (0.5-1.0) instead of generating a new one."
+    )
 
 class LessonGenerationResponse(BaseModel):
     """Defines the structure of a generated lesson."""
@@ -66,6 +77,7 @@ class LessonGenerationResponse(BaseModel):
     vocabulary: Optional[List[VocabularyItem]] = Field(None, description="Generated vocabulary list, if requested.")
     quiz: Optional[List[QuizItem]] = Field(None, description="Generated comprehension quiz, if requested.")
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp when the lesson was generated.")
+    normalization: Optional[Dict[str, FieldNormalization]] = Field(None, description="Request fields that were canonicalized before generation.")
     # We might add fields later for user ID, saved status, etc.
 
 # --- Lesson Continuation ---
@@ -85,3 +97,33 @@ class LessonContinuationRequest(BaseModel):
 
 # We will reuse LessonGenerationResponse for the output of a continuation,
 # as the AI is expected to regenerate the *entire* lesson structure based on the continuation request.
+
+# --- Lesson Search ---
+
+class LessonSearchResult(BaseModel):
+    """A single ranked search hit: lesson metadata without the full content."""
+    id: str = Field(..., description="Unique identifier of the saved lesson.")
+    title: str = Field(..., description="Title of the lesson.")
+    subject: str = Field(..., description="Subject of the lesson.")
+    topic: Optional[str] = Field(None, description="Specific topic, if any.")
+    academic_grade: Optional[str] = Field(None, description="Academic grade level of the lesson.")
+    language: Optional[str] = Field(None, description="Language of the lesson.")
+    teacher_style: Optional[str] = Field(None, description="Teaching style used for the lesson.")
+    summary: Optional[str] = Field(None, description="Lesson summary, if one was generated.")
+    word_count: Optional[int] = Field(None, description="Approximate word count of the lesson content.")
+    created_at: Optional[datetime] = Field(None, description="Timestamp when the lesson was saved.")
+    rank: float = Field(0.0, description="Relevance score; higher is more relevant.")
+
+class LessonSearchResponse(BaseModel):
+    """Ranked search results for saved lessons."""
+    query: Optional[str] = Field(None, description="The full-text query that was run, if any.")
+    results: List[LessonSearchResult] = Field(default_factory=list, description="Matching lessons, best match first.")
+    limit: int = Field(..., description="Maximum number of results requested.")
+    offset: int = Field(..., description="Number of results skipped.")
+
+class LessonVersionInfo(BaseModel):
+    """Metadata for one stored version of a lesson."""
+    version: int = Field(..., description="Version number, starting at 1 for the generated lesson.")
+    parent_version: Optional[int] = Field(None, description="Version this one was continued from.")
+    is_snapshot: bool = Field(..., description="Whether the version is stored in full rather than as a delta.")
+    created_at: Optional[datetime] = Field(None, description="Timestamp when the version was saved.")
@@ -0,0 +1,146 @@
+import os
+import hmac
+import logging
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from ..services import transfer_service
+from services.utils.content_negotiation import CBOR, MSGPACK, normalize_media_type, preferred_media_type
+from services.llm.key_pool import key_pool
+from services.llm.usage_ledger import GROUPS as USAGE_GROUPS, totals, usage_ledger
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Allows the request only if the X-Admin-Token header matches ADMIN_TOKEN.
+    Admin endpoints are disabled entirely when ADMIN_TOKEN is not set.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled.")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
+
+
+# Included in main.py under the /api prefix, so endpoints live at /api/admin/...
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+COMPRESSION_PATTERN = "^(none|gzip|zstd)$"
+USAGE_GROUP_PATTERN = f"^({'|'.join(USAGE_GROUPS)})$"
+# Negotiated media type -> transfer record format
+RECORD_FORMATS = {MSGPACK: "msgpack", CBOR: "cbor"}
+
+
+@router.get(
+    "/lessons/export",
+    summary="Export Lessons",
+    description="Streams every saved lesson as NDJSON (one row per line), optionally gzip or zstd compressed. Pass the last exported ID as `after` to resume. "
+                "With `Accept: application/msgpack` or `application/cbor`, rows are concatenated MessagePack maps or a CBOR sequence instead.",
+)
+def export_lessons_endpoint(
+    request: Request,
+    compression: str = Query("none", pattern=COMPRESSION_PATTERN, description="Compression of the response body"),
+    after: Optional[str] = Query(None, description="Only export lessons with IDs after this one"),
+    batch_size: int = Query(transfer_service.TRANSFER_BATCH_SIZE, ge=1, le=5000, description="Rows read per page"),
+):
+    if compression == "zstd" and transfer_service.zstandard is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="zstd compression is not available on this server.")
+    available = [media_type for media_type, record_format in RECORD_FORMATS.items() if _format_available(record_format)]
+    record_format = RECORD_FORMATS.get(preferred_media_type(request.headers.get("accept", ""), available), "ndjson")
+    logger.info(f"Starting lesson export (format={record_format}, compression={compression}, after={after})")
+    extension = transfer_service.FORMAT_EXTENSIONS[record_format] + {"none": "", "gzip": ".gz", "zstd": ".zst"}[compression]
+    return StreamingResponse(
+        transfer_service.compress_stream(
+            transfer_service.export_lessons(after, batch_size, record_format=record_format), compression
+        ),
+        media_type=transfer_service.FORMAT_MEDIA_TYPES[record_format] if compression == "none" else transfer_service.MEDIA_TYPES[compression],
+        headers={"Content-Disposition": f'attachment; filename="lessons.{extension}"', "Vary": "Accept"},
+    )
+
+
+def _format_available(record_format: str) -> bool:
+    try:
+        transfer_service.require_format(record_format)
+    except ValueError:
+        return False
+    return True
+
+
+@router.post(
+    "/lessons/import",
+    summary="Import Lessons",
+    description="Upserts lessons from an NDJSON, MessagePack or CBOR-sequence request body (as produced by the export endpoint; "
+                "the format follows Content-Type), in batched multi-row writes. "
+                "On failure, the response reports how many lines were committed; resend with `skip` set to that number to resume.",
+)
+async def import_lessons_endpoint(
+    request: Request,
+    compression: Optional[str] = Query(None, pattern=COMPRESSION_PATTERN, description="Compression of the request body (defaults to Content-Encoding)"),
+    skip: int = Query(0, ge=0, description="Number of leading lines to skip (already imported)"),
+    batch_size: int = Query(transfer_service.TRANSFER_BATCH_SIZE, ge=1, le=5000, description="Rows per write"),
+):
+    if compression is None:
+        encoding = request.headers.get("content-encoding", "").lower()
+        compression = {"gzip": "gzip", "zstd": "zstd"}.get(encoding, "none")
+    record_format = RECORD_FORMATS.get(normalize_media_type(request.headers.get("content-type", "")), "ndjson")
+
+    progress = {"committed_lines": skip}
+    try:
+        imported = await transfer_service.import_lessons_async(
+            request.stream(),
+            compression,
+            record_format,
+            batch_size=batch_size,
+            skip=skip,
+            on_batch=lambda lines: progress.update(committed_lines=lines),
+        )
+    except ValueError as ve:
+        logger.error(f"Lesson import rejected: {ve}")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"error": str(ve), **progress},
+        )
+    except Exception as e:
+        logger.error(f"Lesson import failed: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"error": "An unexpected internal error occurred while importing lessons.", **progress},
+        )
+    return {"imported": imported, **progress}
+
+
+@router.get(
+    "/usage",
+    summary="LLM Usage Report",
+    description="Tokens, cost, latency, errors and cache hits of LLM calls from the usage ledger, aggregated per day, subject, "
+                "endpoint, model, pipeline, API key or cache status, for the UTC days `since` to `until` (inclusive).",
+)
+def usage_report_endpoint(
+    group_by: str = Query("day", pattern=USAGE_GROUP_PATTERN, description="Aggregate per this dimension"),
+    since: Optional[date] = Query(None, description="First day to include"),
+    until: Optional[date] = Query(None, description="Last day to include"),
+):
+    if not usage_ledger.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The usage ledger is disabled (USAGE_LEDGER_PATH is empty).")
+    rows = usage_ledger.report(
+        group_by, since.isoformat() if since else None, until.isoformat() if until else None
+    )
+    return {"group_by": group_by, "rows": rows, "totals": totals(rows)}
+
+
+@router.get(
+    "/keys",
+    summary="OpenRouter Key Pool",
+    description="State of each OpenRouter key in the pool, identified by a short hash: its rate-limit headroom (0-1), "
+                "until when it is quarantined (Unix time, if it is), and its requests in the last minute, over all workers.",
+)
+def key_pool_endpoint():
+    return {"keys": key_pool.status()}
@@ -1,41 +1,75 @@
 import logging
-from fastapi import APIRouter, HTTPException, status, Path, Body, Depends
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, Path, Body, Depends, Request, Response, Query
 
 # Adjust the import path based on the structure (app -> models -> lesson_models)
 from ..models.lesson_models import (
     LessonGenerationRequest,
     LessonGenerationResponse,
     LessonContinuationRequest,
+    LessonSearchResponse,
+    LessonVersionInfo,
     # LessonContinuationResponse # This model does not exist, reuse LessonGenerationResponse
 )
 # Import the service functions
-from ..services import lesson_service
+from ..services import lesson_service, search_service
+from services.utils.content_negotiation import NegotiatedRoute
+from services.utils.responses import ROUTER_RESPONSE_CLASS
+from services.utils.fieldsets import fieldset_query, project, projected_response
 
 logger = logging.getLogger(__name__)
 
+# `fields=` query parameter selecting LessonGenerationResponse fields
+lesson_fields = fieldset_query(LessonGenerationResponse)
+
 # Create the router instance. It will be included in main.py with the /api prefix.
 # So endpoints here will be accessible like /api/lessons/...
 router = APIRouter(
     prefix="/lessons",
     tags=["Lessons"], # Tag for OpenAPI documentation grouping
     responses={404: {"description": "Not found"}}, # Add default 404 response
+    default_response_class=ROUTER_RESPONSE_CLASS,
+    route_class=NegotiatedRoute, # JSON, or MessagePack/CBOR per the Accept header
 )
 
 @router.post(
     "/generate",
     response_model=LessonGenerationResponse,
+    response_model_exclude_none=True,
     summary="Generate a New Lesson",
     description="Creates a new educational lesson based on the provided parameters using an AI model, then saves it.",
     status_code=status.HTTP_201_CREATED, # Indicates resource creation
 )
 async def generate_lesson_endpoint(
-    request: LessonGenerationRequest = Body(...)
+    response: Response,
+    request: LessonGenerationRequest = Body(...),
+    fields: Optional[List[str]] = Depends(lesson_fields),
 ):
     """
     Endpoint to generate a new educational lesson and save it.
-    Receives lesson parameters and returns the generated lesson content.
+    Receives lesson parameters and returns the generated lesson content
+    (only the requested `fields`, if given).
+    If `reuse_similarity_threshold` is set and a similar lesson was saved before,
+    that lesson is returned instead (status 200, with X-Lesson-Reused-From set).
     """
     logger.info(f"Received lesson generation request: Subject='{request.subject}', Grade='{request.academic_grade}'")
+
+    if request.reuse_similarity_threshold is not None:
+        try:
+            match = await lesson_service.find_similar_lesson(request, request.reuse_similarity_threshold)
+        except Exception as e:
+            logger.warning(f"Similar-lesson lookup failed, generating a new lesson instead: {e}", exc_info=True)
+            match = None
+        if match is not None:
+            reused_lesson, similarity = match
+            logger.info(f"Reusing saved lesson {reused_lesson.id} (similarity {similarity:.2f})")
+            response.status_code = status.HTTP_200_OK
+            response.headers["X-Lesson-Reused-From"] = reused_lesson.id
+            response.headers["X-Lesson-Similarity"] = f"{similarity:.3f}"
+            if fields:
+                return projected_response(project(reused_lesson, fields), response)
+            return reused_lesson
+
     try:
         # Call the lesson generation service
         generated_lesson = await lesson_service.generate_new_lesson(request)
@@ -48,6 +82,8 @@ async def generate_lesson_endpoint(
         except Exception as db_error:
             logger.error(f"Failed to save generated lesson for topic {request.topic} to database: {db_error}", exc_info=True)
 
+        if fields:
+            return projected_response(project(generated_lesson, fields), response, status.HTTP_201_CREATED)
         return generated_lesson
 
     except ValueError as ve:
@@ -72,6 +108,7 @@ async def generate_lesson_endpoint(
 @router.post(
     "/continue", # Changed path, no longer needs lesson_id in path
     response_model=LessonGenerationResponse, # Reusing the same response model
+    response_model_exclude_none=True,
     status_code=status.HTTP_200_OK,
     summary="Continue or Modify an Existing Lesson",
     description="Takes the full previous lesson data and user instructions to regenerate the lesson content, then saves the result.",
@@ -128,12 +165,164 @@ async def continue_lesson_endpoint(request_body: LessonContinuationRequest = Bod
             detail=f"An unexpected internal error occurred while continuing the lesson."
         )
 
-# --- TODO: Add endpoints for getting lessons, saving, deleting, etc. ---
-# Example:
-# @router.get("/{lesson_id}", response_model=LessonGenerationResponse, ...)
-# async def get_lesson_endpoint(lesson_id: str = Path(...)):
-#     pass
+@router.get(
+    "/search",
+    response_model=LessonSearchResponse,
+    summary="Search Saved Lessons",
+    description="Ranked full-text search over lesson titles, content, summaries and vocabulary terms, with optional facet filters. Reusing an existing lesson is far cheaper than generating a new one.",
+)
+def search_lessons_endpoint(
+    q: Optional[str] = Query(None, max_length=200, description="Free-text search query"),
+    subject: Optional[str] = Query(None, description="Only lessons in this subject"),
+    grade: Optional[str] = Query(None, description="Only lessons for this academic grade"),
+    language: Optional[str] = Query(None, description="Only lessons in this language"),
+    teacher_style: Optional[str] = Query(None, description="Only lessons with this teaching style"),
+    limit: int = Query(20, ge=1, le=search_service.MAX_SEARCH_LIMIT, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+):
+    """
+    Searches saved lessons. Declared before /{lesson_id} so 'search' isn't taken as an ID,
+    and as a sync endpoint because both storage backends are synchronous.
+    """
+    try:
+        return search_service.search_lessons(
+            query=q,
+            subject=subject,
+            academic_grade=grade,
+            language=language,
+            teacher_style=teacher_style,
+            limit=limit,
+            offset=offset,
+        )
+    except Exception as e:
+        logger.error(f"Lesson search failed for query '{q}': {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected internal error occurred while searching lessons."
+        )
+
+@router.get(
+    "",
+    response_model=List[LessonGenerationResponse],
+    response_model_exclude_none=True,
+    summary="List Saved Lessons",
+    description="Lists saved lessons, newest first. Use `fields` (e.g. `fields=title,summary`) for previews: only those fields are read from the database.",
+)
+def list_lessons_endpoint(
+    limit: int = Query(20, ge=1, le=search_service.MAX_SEARCH_LIMIT, description="Maximum number of lessons"),
+    offset: int = Query(0, ge=0, description="Number of lessons to skip"),
+    fields: Optional[List[str]] = Depends(lesson_fields),
+):
+    """Lists saved lessons. Declared as a sync endpoint because both storage backends are synchronous."""
+    try:
+        lessons = lesson_service.list_lessons(limit=limit, offset=offset, fields=fields)
+    except Exception as e:
+        logger.error(f"Failed to list lessons: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected internal error occurred while listing lessons."
+        )
+    if fields:
+        return projected_response([project(lesson, fields) for lesson in lessons])
+    return lessons
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header (which may list several, possibly weak, ETags)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+@router.get(
+    "/{lesson_id}",
+    response_model=LessonGenerationResponse,
+    response_model_exclude_none=True,
+    summary="Get a Saved Lesson",
+    description="Returns a previously saved lesson. Supports conditional requests: send the ETag back in If-None-Match to get a 304 when the lesson is unchanged.",
+    responses={304: {"description": "Lesson unchanged since the given ETag"}},
+)
+def get_lesson_endpoint(
+    request: Request,
+    response: Response,
+    lesson_id: str = Path(..., description="The ID of the lesson to fetch"),
+    fields: Optional[List[str]] = Depends(lesson_fields),
+):
+    """
+    Fetches a saved lesson by ID through the read-through lesson cache, or
+    only the requested `fields` straight from the database.
+    Declared as a sync endpoint because the Supabase client is synchronous.
+    """
+    try:
+        if fields:
+            lesson, content_hash = lesson_service.get_lesson_fields(lesson_id, fields)
+        else:
+            lesson, content_hash = lesson_service.get_lesson(lesson_id)
+    except ValueError as ve:
+        logger.error(f"Lesson storage unavailable while fetching lesson {lesson_id}: {ve}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Lesson storage is not configured."
+        )
+    except Exception as e:
+        logger.error(f"Failed to fetch lesson {lesson_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected internal error occurred while fetching the lesson."
+        )
+
+    if lesson is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lesson not found.")
+
+    etag = f'"{content_hash}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    response.headers.update(cache_headers)
+    if fields:
+        return projected_response(project(lesson, fields), response)
+    return lesson
+
+@router.get(
+    "/{lesson_id}/versions",
+    response_model=List[LessonVersionInfo],
+    summary="List Lesson Versions",
+    description="Lists the stored versions of a lesson: the generated lesson is version 1 and each saved continuation adds one.",
+)
+def list_lesson_versions_endpoint(lesson_id: str = Path(..., description="The ID of the lesson")):
+    try:
+        versions = lesson_service.list_lesson_versions(lesson_id)
+    except Exception as e:
+        logger.error(f"Failed to list versions of lesson {lesson_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected internal error occurred while listing lesson versions."
+        )
+    if not versions:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lesson not found.")
+    return versions
+
+@router.get(
+    "/{lesson_id}/versions/{version}",
+    response_model=LessonGenerationResponse,
+    response_model_exclude_none=True,
+    summary="Get a Lesson Version",
+    description="Returns a lesson as it was at the given version.",
+)
+def get_lesson_version_endpoint(
+    lesson_id: str = Path(..., description="The ID of the lesson"),
+    version: int = Path(..., ge=1, description="The version number"),
+):
+    try:
+        lesson = lesson_service.get_lesson_version(lesson_id, version)
+    except Exception as e:
+        logger.error(f"Failed to fetch version {version} of lesson {lesson_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected internal error occurred while fetching the lesson version."
+        )
+    if lesson is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lesson version not found.")
+    return lesson
 
-# @router.get("/", response_model=List[LessonSummary], ...) # Need a LessonSummary model
-# async def list_lessons_endpoint(...):
-#     pass
+# --- TODO: Add endpoints for saving, deleting, etc. ---
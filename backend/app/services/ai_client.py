@@ -4,26 +4,32 @@ import httpx
 import logging
 from typing import Dict, Any, Optional
 
+from services.utils.cancellation import call_key, shared_llm_call
+from services.llm.key_pool import key_pool, post_completion
+from services.llm.rate_limiter import RateLimitExceeded
+from services.llm.usage_ledger import usage_ledger
+from services.utils.structured_logging import truncate
+
 logger = logging.getLogger(__name__)
 
 # API settings from environment variables (loaded in main.py, accessible via os.getenv)
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-1.5-flash-latest") # Default model
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")  # Or benchmarks/mock_openrouter.py
 # Determine Referer URL (useful for OpenRouter analytics/tracking)
 APP_URL = os.getenv("APP_URL", "http://localhost:8000") # Use backend URL or Render URL
 
-def _get_api_key() -> str:
-    """Get the API key and validate it exists."""
-    if not OPENROUTER_API_KEY:
+def _check_api_keys() -> None:
+    """Validate that at least one API key is configured (see services/llm/key_pool.py)."""
+    try:
+        key_pool.require_keys()
+    except ValueError:
         logger.error("OPENROUTER_API_KEY environment variable not set.")
         raise ValueError("API key for OpenRouter is missing.")
-    return OPENROUTER_API_KEY
 
 def _get_headers() -> Dict[str, str]:
-    """Build the common headers needed for API requests."""
+    """Build the common headers needed for API requests (the pool key's Authorization is added per request)."""
+    _check_api_keys()
     return {
-        "Authorization": f"Bearer {_get_api_key()}",
         "Content-Type": "application/json",
         "HTTP-Referer": APP_URL,
         "X-Title": "EasyLesson", # Application name for OpenRouter analytics
@@ -46,7 +52,8 @@ async def call_llm(
     system_prompt: str,
     user_prompt: str,
     model: Optional[str] = None,
-    timeout: float = 90.0 # Increased timeout for potentially long generations
+    timeout: float = 90.0, # Increased timeout for potentially long generations
+    request_key: Optional[str] = None
 ) -> str:
     """
     Sends a request to the OpenRouter API and returns the content of the response.
@@ -56,6 +63,9 @@ async def call_llm(
         user_prompt: The user prompt for the LLM.
         model: Optional override for the model defined in environment variables.
         timeout: Request timeout in seconds.
+        request_key: canonical_request_key of the request being served, so requests
+            that differ only in casing or spacing share one call (by default the
+            call is keyed on the exact payload).
 
     Returns:
         The string content of the LLM's response (expected to be JSON).
@@ -64,16 +74,29 @@ async def call_llm(
         ValueError: If API key is missing or response format is unexpected.
         ConnectionError: If the request to OpenRouter fails (network issue, status code error).
         TimeoutError: If the request times out.
+        ClientDisconnected: If the client of the current request disconnects first.
     """
     headers = _get_headers() # Raises ValueError if key is missing
     payload = _build_payload(system_prompt, user_prompt, model)
+    # Identical concurrent generations share one upstream request, which is
+    # cancelled once every client waiting for it has disconnected
+    key = call_key(payload["model"], request_key) if request_key else call_key(payload)
+    return await shared_llm_call(
+        key, lambda: _request_completion(headers, payload, timeout),
+        on_coalesced=lambda: usage_ledger.record_cache_hit("coalesced", model=payload["model"]),
+    )
+
+async def _request_completion(headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> str:
+    """Performs the OpenRouter request for call_llm and extracts the response content."""
     model_name = payload.get("model", "N/A")
 
     logger.info(f"Sending request to OpenRouter (Model: {model_name})...")
 
     async with httpx.AsyncClient(timeout=timeout) as client:
         try:
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
+            # Dispatched to the pool key with the most headroom; may wait for rate-limit capacity
+            # and raise RateLimitExceeded (a ConnectionError)
+            response = await post_completion(client, OPENROUTER_API_URL, headers, payload)
             response.raise_for_status() # Raises HTTPStatusError for 4xx/5xx responses
 
             logger.info(f"Received successful response from OpenRouter (Model: {model_name}).")
@@ -83,7 +106,7 @@ async def call_llm(
             content = response_data.get('choices', [{}])[0].get('message', {}).get('content')
             if content is None:
                 logger.error(f"Unexpected response structure from OpenRouter: 'content' field missing.")
-                logger.debug(f"Full OpenRouter response: {response_data}")
+                logger.debug("Full OpenRouter response: %s", truncate(response_data))
                 raise ValueError("Invalid response format received from AI service (missing content).")
 
             # The content is expected to be a JSON string based on our request
@@ -98,7 +121,7 @@ async def call_llm(
             logger.error(f"Request to OpenRouter timed out after {timeout}s: {e}")
             raise TimeoutError(f"AI service request timed out after {timeout} seconds.") from e
         except httpx.HTTPStatusError as e:
-            logger.error(f"OpenRouter request failed: {e.response.status_code} - {e.response.text}")
+            logger.error("OpenRouter request failed: %s - %s", e.response.status_code, truncate(e.response.text))
             # Provide specific feedback for common errors
             if e.response.status_code == 401:
                  raise ValueError("Authentication failed. Check your OpenRouter API key.") from e
@@ -108,6 +131,9 @@ async def call_llm(
                  raise ConnectionError("OpenRouter API call failed: Rate limit exceeded.") from e
             else:
                  raise ConnectionError(f"AI service request failed with status {e.response.status_code}.") from e
+        except RateLimitExceeded as e:
+            logger.warning(f"OpenRouter request not sent: {e}")
+            raise
         except httpx.RequestError as e:
             logger.error(f"Network error during OpenRouter request: {e}")
             raise ConnectionError(f"Could not connect to the AI service: {e}") from e
@@ -1,5 +1,9 @@
+import asyncio
 import logging
 import json
+import os
+import time
+import threading
 from typing import Dict, Any, Optional, List, Tuple
 import uuid # Added for quiz/option ID generation
 
@@ -16,31 +20,46 @@ from ..models.lesson_models import (
 # Import AI client and prompt builder
 from .ai_client import call_llm
 from .prompt_builder import build_generation_prompt, build_continuation_prompt
+from .similarity_index import similarity_index
+from services.utils.validators import canonical_request_key, canonicalize_request_fields
+from services.llm.instrumentation import PARSE_FAILURES, generation, stage, strip_code_fences, timed
+from services.llm.usage_ledger import label_usage, usage_ledger
+from services.utils.structured_logging import truncate
 
 # Import Supabase client getter and types
 from ..db.supabase_client import get_supabase_client 
+from ..db.lesson_cache import lesson_cache, compute_content_hash
+from ..db.local_store import get_local_store
+from ..db.lesson_versions import LessonVersionStore, SupabaseVersionBackend, get_local_version_store
+from ..database import db, lesson_select
 from supabase import Client 
 from postgrest import APIResponse 
 
 logger = logging.getLogger(__name__)
 
+# How many recent lessons to load into the similarity index on first use, and for how long
+SIMILARITY_WARMUP_LIMIT = int(os.getenv("SIMILARITY_WARMUP_LIMIT", "5000"))
+SIMILARITY_WARMUP_SECONDS = float(os.getenv("SIMILARITY_WARMUP_SECONDS", "10"))
+# What reuse lookups need: the request fields, and which optional components a lesson has
+SIMILARITY_WARMUP_FIELDS = ["id", "subject", "topic", "academic_grade", "language", "teacher_style",
+                            "summary", "vocabulary", "quiz"]
+_similarity_index_warmed = False
+_similarity_warmup_lock = threading.Lock()
+
 # --- Helper for Parsing ---
 
 def _parse_llm_json(json_string: str) -> Dict[str, Any]:
     """Attempts to parse the LLM's JSON string, handling potential issues."""
-    try:
-        # Basic cleaning: remove potential ```json ... ``` markers
-        cleaned_json_str = json_string.strip()
-        if cleaned_json_str.startswith("```json") and cleaned_json_str.endswith("```"):
-            cleaned_json_str = cleaned_json_str[7:-3].strip()
-        elif cleaned_json_str.startswith("```") and cleaned_json_str.endswith("```"):
-            cleaned_json_str = cleaned_json_str[3:-3].strip()
-
-        return json.loads(cleaned_json_str)
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to decode JSON response from LLM: {e}")
-        logger.debug(f"Raw JSON string: {json_string}")
-        raise ValueError("Received invalid JSON format from AI service.") from e
+    with stage("parse"):
+        try:
+            # Basic cleaning: remove potential ```json ... ``` markers
+            cleaned_json_str = strip_code_fences(json_string)
+            return json.loads(cleaned_json_str)
+        except json.JSONDecodeError as e:
+            PARSE_FAILURES.inc()
+            logger.error(f"Failed to decode JSON response from LLM: {e}")
+            logger.debug("Raw JSON string: %s", truncate(json_string))
+            raise ValueError("Received invalid JSON format from AI service.") from e
 
 def _parse_vocabulary(vocab_data: Optional[List[Dict[str, str]]]) -> Optional[List[VocabularyItem]]:
     """Safely parses vocabulary data into model objects."""
@@ -99,8 +118,22 @@ def _parse_quiz(quiz_data: Optional[List[Dict[str, Any]]]) -> Optional[List[Quiz
                 logger.warning(f"Skipping invalid quiz item {item_data}: {e}")
     return parsed_items if parsed_items else None
 
+# --- Request Canonicalization ---
+
+def canonicalize_request(request: LessonGenerationRequest) -> Tuple[LessonGenerationRequest, Dict[str, Dict[str, str]]]:
+    """
+    Maps the free-form grade, subject, language and topic of a request onto their
+    canonical forms, so identical requests build identical prompts and keys.
+
+    Returns:
+        Tuple of (canonical request, {field: {"original", "canonical"}} for changed fields)
+    """
+    canonical_fields, normalization = canonicalize_request_fields(request.model_dump())
+    return request.model_copy(update=canonical_fields), normalization
+
 # --- Lesson Generation Service ---
 
+@generation("lesson")
 async def generate_new_lesson(request: LessonGenerationRequest) -> LessonGenerationResponse:
     """
     Handles the business logic for generating a new lesson.
@@ -110,13 +143,16 @@ async def generate_new_lesson(request: LessonGenerationRequest) -> LessonGenerat
     4. Constructs and returns the LessonGenerationResponse object.
     """
     logger.info(f"Generating new lesson: Subject='{request.subject}', Grade='{request.academic_grade}'")
+    request, normalization = canonicalize_request(request)
+    label_usage(subject=request.subject)
 
     # 1. Build Prompt
-    user_prompt, system_prompt = build_generation_prompt(request)
+    with stage("prompt_build"):
+        system_prompt, user_prompt = build_generation_prompt(request)
 
     # 2. Call AI Model
     try:
-        raw_response_str = await call_llm(system_prompt, user_prompt)
+        raw_response_str = await call_llm(system_prompt, user_prompt, request_key=canonical_request_key(request.model_dump()))
     except (ValueError, ConnectionError, TimeoutError) as e:
         # Pass specific errors up to the router
         raise e
@@ -142,32 +178,35 @@ async def generate_new_lesson(request: LessonGenerationRequest) -> LessonGenerat
         lesson_content = parsed_data.get("lesson_content", "")
         actual_word_count = len(lesson_content.split())
 
-        response = LessonGenerationResponse(
-            # id is generated by default_factory
-            title=parsed_data.get("title", f"Generated Lesson: {request.subject}"), # Use default if missing
-            lesson_content=lesson_content,
-            academic_grade=request.academic_grade,
-            subject=request.subject,
-            topic=request.topic,
-            teacher_style=request.teacher_style,
-            word_count=actual_word_count,
-            language=request.language,
-            summary=parsed_data.get("summary") if request.include_summary else None,
-            vocabulary=_parse_vocabulary(parsed_data.get("vocabulary")) if request.include_vocabulary else None,
-            quiz=_parse_quiz(parsed_data.get("quiz")) if request.include_quiz else None,
-            learning_objectives=parsed_data.get("learning_objectives") # Assuming list of strings
-            # created_at is handled by default_factory
-        )
+        with stage("validate"):
+            response = LessonGenerationResponse(
+                # id is generated by default_factory
+                title=parsed_data.get("title", f"Generated Lesson: {request.subject}"), # Use default if missing
+                lesson_content=lesson_content,
+                academic_grade=request.academic_grade,
+                subject=request.subject,
+                topic=request.topic,
+                teacher_style=request.teacher_style,
+                word_count=actual_word_count,
+                language=request.language,
+                summary=parsed_data.get("summary") if request.include_summary else None,
+                vocabulary=_parse_vocabulary(parsed_data.get("vocabulary")) if request.include_vocabulary else None,
+                quiz=_parse_quiz(parsed_data.get("quiz")) if request.include_quiz else None,
+                learning_objectives=parsed_data.get("learning_objectives"), # Assuming list of strings
+                normalization=normalization or None
+                # created_at is handled by default_factory
+            )
         logger.info(f"Successfully processed generated lesson ID: {response.id}")
         return response
     except Exception as e: # Catch potential Pydantic validation errors or others during construction
          logger.exception(f"Error constructing LessonGenerationResponse object: {e}")
-         logger.debug(f"Parsed LLM data causing error: {parsed_data}")
+         logger.debug("Parsed LLM data causing error: %s", truncate(parsed_data))
          # Raise a generic internal server error if construction fails unexpectedly
          raise ValueError("Failed to process the generated lesson data.") from e
 
 # --- New Lesson Continuation Service ---
 
+@generation("lesson_continuation")
 async def continue_lesson_content(request_data: LessonContinuationRequest) -> LessonGenerationResponse:
     """
     Continues or modifies an existing lesson based on user instructions.
@@ -177,13 +216,15 @@ async def continue_lesson_content(request_data: LessonContinuationRequest) -> Le
     
     if not request_data.previous_lesson:
         raise ValueError("Previous lesson data is required for continuation.")
+    label_usage(subject=request_data.previous_lesson.subject)
 
     try:
         # 1. Build Prompt specifically for continuation
-        user_prompt, system_prompt = prompt_builder.build_continuation_prompt(
-            request_data.previous_lesson,
-            request_data.continuation_prompt
-        )
+        with stage("prompt_build"):
+            system_prompt, user_prompt = build_continuation_prompt(
+                request_data.previous_lesson,
+                request_data.continuation_prompt
+            )
 
         # 2. Call AI Model
         logger.debug("Sending prompts to AI client for lesson continuation.")
@@ -211,24 +252,25 @@ async def continue_lesson_content(request_data: LessonContinuationRequest) -> Le
         # The original request parameters (grade, subject, etc.) are implicitly part
         # of the `previous_lesson` context given to the LLM, but we construct
         # the new response *entirely* from the LLM's output JSON.
-        continued_lesson_response = LessonGenerationResponse(
-            # Generate a new ID or keep the old one? Let's assume new for now, or maybe reuse?
-            # Using previous ID might make sense if it's an edit/update in place.
-            id=request_data.previous_lesson.id, # Re-use the original ID
-            title=parsed_data.get("title", request_data.previous_lesson.title), # Fallback title
-            lesson_content=parsed_data.get("lesson_content", ""),
-            academic_grade=parsed_data.get("academic_grade", request_data.previous_lesson.academic_grade),
-            subject=parsed_data.get("subject", request_data.previous_lesson.subject),
-            topic=parsed_data.get("topic", request_data.previous_lesson.topic),
-            teacher_style=parsed_data.get("teacher_style", request_data.previous_lesson.teacher_style),
-            word_count=len(parsed_data.get("lesson_content", "").split()), # Recalculate word count
-            language=parsed_data.get("language", request_data.previous_lesson.language),
-            summary=parsed_data.get("summary"), # Optional, based on LLM output
-            vocabulary=_parse_vocabulary(parsed_data.get("vocabulary")),
-            quiz=_parse_quiz(parsed_data.get("quiz")),
-            learning_objectives=parsed_data.get("learning_objectives"),
-            created_at=request_data.previous_lesson.created_at # Keep original creation time? Or update? Let's keep original.
-        )
+        with stage("validate"):
+            continued_lesson_response = LessonGenerationResponse(
+                # Generate a new ID or keep the old one? Let's assume new for now, or maybe reuse?
+                # Using previous ID might make sense if it's an edit/update in place.
+                id=request_data.previous_lesson.id, # Re-use the original ID
+                title=parsed_data.get("title", request_data.previous_lesson.title), # Fallback title
+                lesson_content=parsed_data.get("lesson_content", ""),
+                academic_grade=parsed_data.get("academic_grade", request_data.previous_lesson.academic_grade),
+                subject=parsed_data.get("subject", request_data.previous_lesson.subject),
+                topic=parsed_data.get("topic", request_data.previous_lesson.topic),
+                teacher_style=parsed_data.get("teacher_style", request_data.previous_lesson.teacher_style),
+                word_count=len(parsed_data.get("lesson_content", "").split()), # Recalculate word count
+                language=parsed_data.get("language", request_data.previous_lesson.language),
+                summary=parsed_data.get("summary"), # Optional, based on LLM output
+                vocabulary=_parse_vocabulary(parsed_data.get("vocabulary")),
+                quiz=_parse_quiz(parsed_data.get("quiz")),
+                learning_objectives=parsed_data.get("learning_objectives"),
+                created_at=request_data.previous_lesson.created_at # Keep original creation time? Or update? Let's keep original.
+            )
 
         logger.info(f"Successfully continued lesson content for title: {request_data.previous_lesson.title}")
         return continued_lesson_response
@@ -248,47 +290,61 @@ async def continue_lesson_content(request_data: LessonContinuationRequest) -> Le
 # --- Database Interaction Function ---
 
 
+@timed("persist")
 async def save_lesson(lesson_response: LessonGenerationResponse) -> str:
     """
     Saves the generated lesson data to the Supabase 'lessons' table.
     Falls back to local storage if Supabase is unavailable.
 
+    The 'lessons' row is keyed by the lesson's own ID and always holds the latest
+    version, so continuations (which re-use the original ID) update it in place.
+    Every save also appends a compressed, deduplicated entry to the lesson's
+    version history (see db/lesson_versions.py). The row deliberately keeps
+    the full latest lesson: reads, fields= projections, search and exports
+    all use it. The version store only holds the history and serves /versions.
+
     Args:
         lesson_response: The complete lesson data object.
 
     Returns:
-        The UUID (as a string) of the newly saved lesson record.
+        The UUID (as a string) of the saved lesson record.
 
     Raises:
         RuntimeError: If saving to the database fails.
     """
+    # The Supabase client and SQLite are synchronous: keep them off the event loop
+    return await asyncio.to_thread(_save_lesson, lesson_response)
+
+def _save_lesson(lesson_response: LessonGenerationResponse) -> str:
+    """Blocking implementation of save_lesson."""
     logger.info(f"Attempting to save lesson: {lesson_response.title}")
+    # Use the structure defined in LessonGenerationResponse for data extraction
+    data_to_insert = {
+        'id': lesson_response.id,
+        # 'created_at' is handled by DB defaults
+        # 'user_id': get_current_user_id(), # Add this later if auth is implemented
+        'title': lesson_response.title,
+        'subject': lesson_response.subject, # Assuming subject is top-level in response model
+        'topic': lesson_response.topic,     # Assuming topic is top-level
+        'academic_grade': lesson_response.academic_grade, # Assuming grade is top-level
+        'language': lesson_response.language,           # Facet columns used by lesson search
+        'teacher_style': lesson_response.teacher_style,
+        'word_count': lesson_response.word_count,
+        # Store the entire lesson object as JSONB
+        'lesson_data': lesson_response.model_dump(mode='json')
+    }
+
     try:
         client = get_supabase_client(mock_if_unavailable=True)
         
         # Check if we're using a mock client (meaning Supabase is unavailable)
         is_mock = getattr(client, "is_mock", False)
         if is_mock:
-            # Just return the ID without attempting to save to Supabase
-            logger.warning("Using mock Supabase client. Lesson will not be saved to database.")
-            return str(lesson_response.id)
-        
-        # Use the structure defined in LessonGenerationResponse for data extraction
-        data_to_insert = {
-            # 'id' and 'created_at' are usually handled by DB defaults
-            # 'user_id': get_current_user_id(), # Add this later if auth is implemented
-            'title': lesson_response.title,
-            'subject': lesson_response.subject, # Assuming subject is top-level in response model
-            'topic': lesson_response.topic,     # Assuming topic is top-level
-            'academic_grade': lesson_response.academic_grade, # Assuming grade is top-level
-            'word_count': lesson_response.word_count,
-            # Store the entire lesson object as JSONB
-            # Use .dict() for Pydantic v1, model_dump() for v2+
-            'lesson_data': lesson_response.dict() if hasattr(lesson_response, 'dict') else lesson_response.model_dump(mode='json') 
-        }
-
-        # Execute the insert operation
-        response = await client.table('lessons').insert(data_to_insert).execute()
+            logger.warning("Using mock Supabase client. Lesson will be saved to local storage.")
+            return _save_lesson_locally(data_to_insert, lesson_response)
+
+        # Insert, or update the row of a continued lesson (the Supabase client is synchronous)
+        response = client.table('lessons').upsert(data_to_insert).execute()
 
         # Check for errors
         if response.data is None or not response.data:
@@ -307,15 +363,216 @@ async def save_lesson(lesson_response: LessonGenerationResponse) -> str:
 
 
         logger.info(f"Successfully saved lesson with ID: {new_lesson_id}")
+        _save_version(LessonVersionStore(SupabaseVersionBackend(client)), str(new_lesson_id), data_to_insert['lesson_data'])
+        lesson_cache.invalidate(str(new_lesson_id))
+        _index_lesson(str(new_lesson_id), data_to_insert['lesson_data'])
         return str(new_lesson_id) # Return ID as string
 
     except Exception as e:
         logger.error(f"Error saving lesson to Supabase: {e}", exc_info=True)
-        # Return the original ID rather than failing
-        logger.warning(f"Returning original lesson ID: {lesson_response.id}")
-        return str(lesson_response.id)
+        # Keep the lesson rather than failing the request
+        return _save_lesson_locally(data_to_insert, lesson_response)
+
+def _save_lesson_locally(data_to_insert: Dict[str, Any], lesson_response: LessonGenerationResponse) -> str:
+    """Saves a lesson to the local SQLite store; returns the lesson's own ID either way."""
+    lesson_id = str(lesson_response.id)
+    try:
+        get_local_store().save_lesson({**data_to_insert, 'id': lesson_id})
+        logger.info(f"Saved lesson {lesson_id} to local storage.")
+    except Exception as e:
+        logger.error(f"Error saving lesson {lesson_id} to local storage: {e}", exc_info=True)
+        return lesson_id
+    _save_version(get_local_version_store(), lesson_id, data_to_insert['lesson_data'])
+    lesson_cache.invalidate(lesson_id)
+    _index_lesson(lesson_id, data_to_insert['lesson_data'])
+    return lesson_id
+
+# --- Version History ---
+
+def _save_version(store: LessonVersionStore, lesson_id: str, lesson_data: Dict[str, Any]) -> Optional[int]:
+    """Appends a version to a lesson's history; the current row is already saved, so failures are only logged."""
+    try:
+        return store.save_version(lesson_id, lesson_data)
+    except Exception as e:
+        logger.error(f"Error saving version history for lesson {lesson_id}: {e}", exc_info=True)
+        return None
+
+def _version_store() -> LessonVersionStore:
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        return get_local_version_store()
+    return LessonVersionStore(SupabaseVersionBackend(client))
+
+def list_lesson_versions(lesson_id: str) -> List[Dict[str, Any]]:
+    """Returns the version history of a lesson, oldest first (empty if it has none)."""
+    return _version_store().list_versions(lesson_id)
+
+def get_lesson_version(lesson_id: str, version: int) -> Optional[LessonGenerationResponse]:
+    """Reconstructs a specific version of a lesson, or None if it doesn't exist."""
+    lesson_data = _version_store().get_version(lesson_id, version)
+    if lesson_data is None:
+        return None
+    return lesson_from_record({'id': lesson_id, 'lesson_data': lesson_data})
+
+# --- Near-Duplicate Detection ---
+
+def _index_lesson(lesson_id: str, lesson_data: Dict[str, Any]) -> None:
+    """Adds a saved lesson to the similarity index, logging near-duplicates of its content."""
+    try:
+        duplicates = similarity_index.add_lesson(lesson_id, lesson_data)
+    except Exception as e:
+        logger.warning(f"Could not add lesson {lesson_id} to the similarity index: {e}")
+        return
+    if duplicates and duplicates[0][1] >= 0.8:
+        logger.info(f"Lesson {lesson_id} is a near-duplicate of {duplicates[0][0]} (similarity {duplicates[0][1]:.2f})")
+
+def _warm_similarity_index() -> None:
+    """
+    Indexes the requests of recently saved lessons for reuse lookups (once
+    per process). Runs in a worker thread and stops after
+    SIMILARITY_WARMUP_SECONDS; a warmup that fails is retried on the next lookup.
+    """
+    global _similarity_index_warmed
+    if _similarity_index_warmed or not _similarity_warmup_lock.acquire(blocking=False):
+        return  # Done, or running for another request
+    try:
+        client = get_supabase_client(mock_if_unavailable=True)
+        if getattr(client, "is_mock", False):
+            records = get_local_store().recent_lesson_fields(SIMILARITY_WARMUP_FIELDS, limit=SIMILARITY_WARMUP_LIMIT)
+        else:
+            response = client.table('lessons').select(lesson_select(SIMILARITY_WARMUP_FIELDS)) \
+                .order('created_at', desc=True).limit(SIMILARITY_WARMUP_LIMIT).execute()
+            records = response.data or []
+        deadline = time.monotonic() + SIMILARITY_WARMUP_SECONDS
+        for count, record in enumerate(records):
+            if time.monotonic() > deadline:
+                logger.warning(f"Similarity index warmup stopped after {SIMILARITY_WARMUP_SECONDS:g}s ({count} lesson(s))")
+                break
+            similarity_index.add_request(str(record['id']), record)
+        _similarity_index_warmed = True
+        logger.info(f"Similarity index warmed with {len(similarity_index)} lesson(s)")
+    except Exception as e:
+        logger.warning(f"Could not warm the similarity index: {e}")
+    finally:
+        _similarity_warmup_lock.release()
+
+async def find_similar_lesson(request: LessonGenerationRequest, threshold: float) -> Optional[Tuple[LessonGenerationResponse, float]]:
+    """
+    Looks for a saved lesson that already satisfies a generation request.
+
+    Requests with free-form user instructions are never matched, since the
+    index only knows about the structured request parameters.
+
+    Returns:
+        Tuple of (stored lesson, estimated similarity), or None if there is no good match.
+    """
+    if request.user_prompt_addition:
+        return None
+    request, _ = canonicalize_request(request)
+    await asyncio.to_thread(_warm_similarity_index)
+
+    required_components = [
+        name for name, requested in (
+            ("summary", request.include_summary),
+            ("vocabulary", request.include_vocabulary),
+            ("quiz", request.include_quiz),
+        ) if requested
+    ]
+    match = similarity_index.find_similar_request(
+        subject=request.subject,
+        topic=request.topic,
+        academic_grade=request.academic_grade,
+        language=request.language,
+        teacher_style=request.teacher_style,
+        required_components=required_components,
+        threshold=threshold,
+    )
+    if match is None:
+        return None
+
+    lesson_id, similarity = match
+    lesson, _ = await asyncio.to_thread(get_lesson, lesson_id)
+    if lesson is None:
+        # Deleted since it was indexed
+        similarity_index.remove_lesson(lesson_id)
+        return None
+    usage_ledger.record_cache_hit("reused", pipeline="lesson", subject=request.subject)
+    return lesson, similarity
+
+def lesson_from_record(record: Dict[str, Any]) -> LessonGenerationResponse:
+    """Rebuilds a LessonGenerationResponse from a row of the 'lessons' table."""
+    lesson_data = dict(record.get('lesson_data') or record)
+    # Rows created by the original migration use different column names
+    if 'lesson_content' not in lesson_data and 'content' in lesson_data:
+        lesson_data['lesson_content'] = lesson_data['content']
+    if 'academic_grade' not in lesson_data and 'grade_level' in lesson_data:
+        lesson_data['academic_grade'] = lesson_data['grade_level']
+    lesson_data.setdefault('teacher_style', record.get('teacher_style') or 'Encouraging')
+    lesson_data['id'] = str(record.get('id') or lesson_data.get('id'))
+    return LessonGenerationResponse(**lesson_data)
+
+def get_lesson(lesson_id: str) -> Tuple[Optional[LessonGenerationResponse], Optional[str]]:
+    """
+    Fetches a saved lesson through the read-through lesson cache.
+
+    Args:
+        lesson_id: ID of the lesson to fetch.
+
+    Returns:
+        Tuple of (lesson or None if it does not exist, content hash for ETag use).
+    """
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        entry = lesson_cache.get_or_load(lesson_id, get_local_store().get_lesson)
+        record, etag = (entry.data, entry.etag) if entry else (None, None)
+    else:
+        record, etag = db.get_lesson_with_etag(lesson_id)
+    if record is None:
+        return None, None
+    return lesson_from_record(record), etag
+
+def get_lesson_fields(lesson_id: str, fields: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Fetches only some fields of a saved lesson. The projection is done by the
+    database select, so the rest of the lesson is never read or decoded; it
+    bypasses the lesson cache, which holds full lessons.
+
+    Returns:
+        Tuple of (projected lesson or None if it does not exist, content hash of the projection).
+    """
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        record = get_local_store().get_lesson_fields(lesson_id, fields)
+    else:
+        record = db.get_lesson_fields(lesson_id, fields)
+    if record is None:
+        return None, None
+    return record, compute_content_hash(record)
+
+def list_lessons(limit: int = 20, offset: int = 0, fields: Optional[List[str]] = None) -> List[Any]:
+    """
+    Lists saved lessons, newest first.
+
+    Args:
+        limit: Maximum number of lessons.
+        offset: Number of lessons to skip.
+        fields: Only read these fields (projected in the database select).
+
+    Returns:
+        LessonGenerationResponse objects, or projected dicts when ``fields`` is given.
+    """
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        store = get_local_store()
+        if fields:
+            return store.recent_lesson_fields(fields, limit=limit, offset=offset)
+        records = store.recent_lessons(limit=limit, offset=offset)
+    else:
+        records = db.list_lessons(limit=limit, offset=offset, fields=fields) or []
+        if fields:
+            return records
+    return [lesson_from_record(record) for record in records]
+
 # --- TODO: Add functions for other lesson operations ---
 # async def save_lesson_to_db(lesson_data: LessonGenerationResponse) -> str: ...
-# async def get_lesson_from_db(lesson_id: str) -> Optional[LessonGenerationResponse]: ...
-# async def list_lessons_from_db(...) -> List[LessonSummary]: ... # Requires LessonSummary model
 # async def delete_lesson_from_db(lesson_id: str) -> bool: ...
@@ -176,9 +176,9 @@ Here is the complete data of the PREVIOUS lesson in JSON format:
 ```
 
 The user's specific request for continuation/modification is:
-"""
+\"\"\"
 {continuation_request_prompt}
-"""
+\"\"\"
 
 Your task is to regenerate the ENTIRE lesson structure based on the user's request. Apply the requested changes or additions to the previous lesson content, summary, vocabulary, and quiz, while maintaining consistency with the original lesson's style and parameters (grade, subject, topic, style, language) unless the user explicitly asks to change them.
 
@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from ..models.lesson_models import LessonSearchResult, LessonSearchResponse
+from ..db.supabase_client import get_supabase_client
+from ..db.local_store import get_local_store
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_LIMIT = 50
+
+
+def _to_result(row: Dict[str, Any]) -> LessonSearchResult:
+    """Builds a search result from a Supabase RPC row or a local store row."""
+    lesson_data = row.get("lesson_data") or {}
+    return LessonSearchResult(
+        id=str(row["id"]),
+        title=row["title"],
+        subject=row["subject"],
+        topic=row.get("topic"),
+        academic_grade=row.get("academic_grade"),
+        language=row.get("language"),
+        teacher_style=row.get("teacher_style"),
+        summary=row.get("summary") or lesson_data.get("summary"),
+        word_count=row.get("word_count"),
+        created_at=row.get("created_at"),
+        rank=float(row.get("rank") or 0.0),
+    )
+
+
+def search_lessons(
+    query: Optional[str] = None,
+    subject: Optional[str] = None,
+    academic_grade: Optional[str] = None,
+    language: Optional[str] = None,
+    teacher_style: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> LessonSearchResponse:
+    """
+    Runs a ranked full-text search over saved lessons with optional facet filters.
+
+    Uses the `search_lessons` Postgres function (see migrations/002_add_lesson_search.sql)
+    when Supabase is configured, and the local SQLite FTS5 index otherwise.
+
+    Args:
+        query: Free-text query over title, content, summary and vocabulary terms.
+        subject, academic_grade, language, teacher_style: Exact-match facet filters.
+        limit: Maximum number of results (capped at MAX_SEARCH_LIMIT).
+        offset: Number of results to skip.
+
+    Returns:
+        The ranked search results.
+    """
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    offset = max(0, offset)
+    query = query.strip() if query else None
+
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        rows: List[Dict[str, Any]] = get_local_store().search(
+            query=query,
+            filters={
+                "subject": subject,
+                "academic_grade": academic_grade,
+                "language": language,
+                "teacher_style": teacher_style,
+            },
+            limit=limit,
+            offset=offset,
+        )
+    else:
+        response = client.rpc("search_lessons", {
+            "search_query": query,
+            "subject_filter": subject,
+            "grade_filter": academic_grade,
+            "language_filter": language,
+            "style_filter": teacher_style,
+            "result_limit": limit,
+            "result_offset": offset,
+        }).execute()
+        rows = response.data or []
+
+    logger.info(f"Lesson search for '{query}' returned {len(rows)} result(s)")
+    return LessonSearchResponse(
+        query=query,
+        results=[_to_result(row) for row in rows],
+        limit=limit,
+        offset=offset,
+    )
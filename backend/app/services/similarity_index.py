@@ -0,0 +1,232 @@
+import re
+import random
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from services.utils.validators import fold_text, normalize_grade, normalize_language, normalize_subject
+
+logger = logging.getLogger(__name__)
+
+# 128 permutations in 32 bands of 4 rows: pairs with Jaccard similarity of
+# ~0.6 or more almost always share a bucket, while unrelated lessons rarely do.
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 32
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+CONTENT_SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240501)  # Fixed seed: signatures must be comparable across processes
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {"a", "an", "and", "the", "of", "in", "on", "for", "to", "with", "about", "by", "at", "from"}
+
+
+def _normalize(value: Optional[str]) -> str:
+    return fold_text(value) or ""
+
+
+def _words(text: Optional[str]) -> List[str]:
+    return [word for word in _WORD_RE.findall(_normalize(text)) if word not in _STOPWORDS]
+
+
+def request_shingles(
+    subject: str,
+    topic: Optional[str],
+    academic_grade: str,
+    language: str,
+    teacher_style: Optional[str],
+) -> Set[str]:
+    """Field-tagged tokens (from the canonical field values) describing what a lesson was generated for."""
+    subject = normalize_subject(subject or "")
+    shingles = {
+        f"subject:{subject}",
+        f"grade:{normalize_grade(academic_grade or '')}",
+        f"language:{normalize_language(language or '')}",
+        f"style:{_normalize(teacher_style)}",
+    }
+    shingles.update(f"subject_word:{word}" for word in _words(subject))
+    shingles.update(f"topic:{word}" for word in _words(topic))
+    return shingles
+
+
+def content_shingles(text: str, size: int = CONTENT_SHINGLE_SIZE) -> Set[str]:
+    """Overlapping word n-grams of the lesson content."""
+    words = _WORD_RE.findall(_normalize(text))
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingles: Iterable[str]) -> Tuple[int, ...]:
+    """Computes a MinHash signature of NUM_PERMUTATIONS values."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingles
+    ]
+    if not hashes:
+        return tuple([_MAX_HASH] * NUM_PERMUTATIONS)
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERMUTATIONS
+
+
+def _band_keys(signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+    return [
+        (band, hash(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+        for band in range(NUM_BANDS)
+    ]
+
+
+class _LSHTable:
+    """Banded LSH buckets over MinHash signatures."""
+
+    def __init__(self):
+        self.signatures: Dict[str, Tuple[int, ...]] = {}
+        self.buckets: Dict[Tuple[int, int], Set[str]] = {}
+
+    def add(self, key: str, signature: Tuple[int, ...]) -> None:
+        self.remove(key)
+        self.signatures[key] = signature
+        for band_key in _band_keys(signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in _band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def query(self, signature: Tuple[int, ...], exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        candidates: Set[str] = set()
+        for band_key in _band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+        candidates.discard(exclude)
+        scored = [(key, estimate_similarity(signature, self.signatures[key])) for key in candidates]
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+@dataclass
+class IndexedLesson:
+    """What the index needs to know about a lesson besides its signatures."""
+    lesson_id: str
+    language: str
+    academic_grade: str
+    components: Set[str] = field(default_factory=set)
+
+
+class LessonSimilarityIndex:
+    """
+    In-memory near-duplicate index over saved lessons.
+
+    Two LSH tables are kept: one over the (normalized) request parameters, used
+    to find an existing lesson that satisfies a new generation request, and one
+    over content shingles, used to spot near-duplicate lessons as they are saved.
+    """
+
+    def __init__(self):
+        self._requests = _LSHTable()
+        self._contents = _LSHTable()
+        self._lessons: Dict[str, IndexedLesson] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lessons)
+
+    def add_lesson(self, lesson_id: str, lesson: Dict[str, Any]) -> List[Tuple[str, float]]:
+        """
+        Adds (or replaces) a lesson in the index.
+
+        Args:
+            lesson_id: ID the lesson is stored under.
+            lesson: The lesson as a dict (LessonGenerationResponse fields).
+
+        Returns:
+            Other indexed lessons whose content is similar, best first.
+        """
+        content_signature = minhash(content_shingles(lesson.get("lesson_content", "")))
+        self.add_request(lesson_id, lesson)
+        with self._lock:
+            self._contents.add(lesson_id, content_signature)
+            return self._contents.query(content_signature, exclude=lesson_id)
+
+    def add_request(self, lesson_id: str, lesson: Dict[str, Any]) -> None:
+        """
+        Indexes only what a lesson was generated for, so find_similar_request
+        can match it. Much cheaper than add_lesson: the content is not read,
+        only the request fields and which of summary, vocabulary and quiz are set.
+        """
+        request_signature = minhash(request_shingles(
+            lesson.get("subject", ""), lesson.get("topic"), lesson.get("academic_grade", ""),
+            lesson.get("language", ""), lesson.get("teacher_style"),
+        ))
+        components = {name for name in ("summary", "vocabulary", "quiz") if lesson.get(name)}
+        with self._lock:
+            self._requests.add(lesson_id, request_signature)
+            self._lessons[lesson_id] = IndexedLesson(
+                lesson_id=lesson_id,
+                language=normalize_language(lesson.get("language") or ""),
+                academic_grade=normalize_grade(lesson.get("academic_grade") or ""),
+                components=components,
+            )
+
+    def remove_lesson(self, lesson_id: str) -> None:
+        with self._lock:
+            self._requests.remove(lesson_id)
+            self._contents.remove(lesson_id)
+            self._lessons.pop(lesson_id, None)
+
+    def find_similar_request(
+        self,
+        subject: str,
+        topic: Optional[str],
+        academic_grade: str,
+        language: str,
+        teacher_style: Optional[str],
+        required_components: Iterable[str] = (),
+        threshold: float = 0.8,
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Finds the saved lesson that best matches a generation request.
+
+        Language and grade must match exactly, and the lesson must contain every
+        requested optional component (summary, vocabulary, quiz).
+
+        Returns:
+            Tuple of (lesson_id, estimated similarity), or None if nothing reaches ``threshold``.
+        """
+        signature = minhash(request_shingles(subject, topic, academic_grade, language, teacher_style))
+        language = normalize_language(language)
+        academic_grade = normalize_grade(academic_grade)
+        required = set(required_components)
+        with self._lock:
+            for lesson_id, similarity in self._requests.query(signature):
+                if similarity < threshold:
+                    break
+                indexed = self._lessons[lesson_id]
+                if indexed.language == language and indexed.academic_grade == academic_grade \
+                        and required <= indexed.components:
+                    return lesson_id, similarity
+        return None
+
+
+# Process-wide index, maintained by the lesson service as lessons are saved
+similarity_index = LessonSimilarityIndex()
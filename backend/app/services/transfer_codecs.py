@@ -0,0 +1,194 @@
+"""
+Compression and record formats of lesson export streams.
+"""
+
+import io
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency; zstd transfers are unavailable without it
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency; MessagePack transfers are unavailable without it
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # Optional dependency; CBOR transfers are unavailable without it
+    cbor2 = None
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+MEDIA_TYPES = {"none": "application/x-ndjson", "gzip": "application/gzip", "zstd": "application/zstd"}
+# Record formats: NDJSON lines, concatenated MessagePack maps, or a CBOR sequence (RFC 8742)
+FORMATS = ("ndjson", "msgpack", "cbor")
+FORMAT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "msgpack": "application/msgpack", "cbor": "application/cbor-seq"}
+FORMAT_EXTENSIONS = {"ndjson": "ndjson", "msgpack": "msgpack", "cbor": "cbors"}
+
+
+# --- Streaming compression ---
+
+class _Identity:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    decompress = compress
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def new_compressor(compression: str):
+    """Returns a streaming compressor (compress()/flush()) for the given compression."""
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == "zstd":
+        _require_zstd()
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return _Identity()
+
+
+def _require_zstd() -> None:
+    if zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package.")
+
+
+def require_format(record_format: str) -> None:
+    if record_format not in FORMATS:
+        raise ValueError(f"Unsupported format '{record_format}'. Use one of: {', '.join(FORMATS)}")
+    if record_format == "msgpack" and msgpack is None:
+        raise ValueError("The msgpack format requires the 'msgpack' package.")
+    if record_format == "cbor" and cbor2 is None:
+        raise ValueError("The cbor format requires the 'cbor2' package.")
+
+
+# --- Record formats ---
+
+def encode_record(row: Dict[str, Any], record_format: str = "ndjson") -> bytes:
+    """Encodes one exported row; the encoded rows of a stream are simply concatenated."""
+    if record_format == "msgpack":
+        return msgpack.packb(row, use_bin_type=True, default=str)
+    if record_format == "cbor":
+        return cbor2.dumps(row)
+    return json.dumps(row, default=str, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class _NdjsonSplitter:
+    """Splits a byte stream into NDJSON lines (parsed later, so errors can name the line)."""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> List[bytes]:
+        lines = (self._pending + data).split(b"\n")
+        self._pending = lines.pop()
+        return [line for line in lines if line.strip()]
+
+    def close(self) -> List[bytes]:
+        remainder, self._pending = self._pending, b""
+        return [remainder] if remainder.strip() else []
+
+
+class _MsgpackSplitter:
+    def __init__(self):
+        self._unpacker = msgpack.Unpacker(raw=False)
+        self._fed = 0
+
+    def feed(self, data: bytes) -> List[Any]:
+        self._unpacker.feed(data)
+        self._fed += len(data)
+        try:
+            return list(self._unpacker)
+        except ValueError as e:
+            raise ValueError(f"Malformed MessagePack stream: {e}") from e
+
+    def close(self) -> List[Any]:
+        if self._unpacker.tell() != self._fed:
+            raise ValueError("MessagePack stream ends with a truncated item.")
+        return []
+
+
+class _CborSplitter:
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> List[Any]:
+        self._pending += data
+        items, stream = [], io.BytesIO(self._pending)
+        while stream.tell() < len(self._pending):
+            start = stream.tell()
+            try:
+                items.append(cbor2.CBORDecoder(stream).decode())
+            except cbor2.CBORDecodeEOF:
+                stream.seek(start)  # Incomplete item: wait for more data
+                break
+            except cbor2.CBORDecodeError as e:
+                raise ValueError(f"Malformed CBOR sequence: {e}") from e
+        self._pending = self._pending[stream.tell():]
+        return items
+
+    def close(self) -> List[Any]:
+        if self._pending:
+            raise ValueError("CBOR sequence ends with a truncated item.")
+        return []
+
+
+_SPLITTERS = {"ndjson": _NdjsonSplitter, "msgpack": _MsgpackSplitter, "cbor": _CborSplitter}
+
+
+class StreamDecoder:
+    """
+    Incrementally decompresses a byte stream and splits it into records: NDJSON
+    lines (as bytes) or decoded MessagePack/CBOR items.
+
+    Concatenated gzip members / zstd frames are supported, which is what a
+    resumed export appends to an existing file.
+    """
+
+    def __init__(self, compression: str = "none", record_format: str = "ndjson"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported compression '{compression}'. Use one of: {', '.join(COMPRESSIONS)}")
+        if compression == "zstd":
+            _require_zstd()
+        require_format(record_format)
+        self.compression = compression
+        self._decompressor = self._new_decompressor()
+        self._splitter = _SPLITTERS[record_format]()
+
+    def _new_decompressor(self):
+        if self.compression == "gzip":
+            return zlib.decompressobj(47)
+        if self.compression == "zstd":
+            return zstandard.ZstdDecompressor().decompressobj()
+        return _Identity()
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        data = b""
+        while chunk:
+            data += self._decompressor.decompress(chunk)
+            chunk = b""
+            if getattr(self._decompressor, "eof", False):
+                chunk = self._decompressor.unused_data
+                self._decompressor = self._new_decompressor()
+        return self._splitter.feed(data)
+
+    def close(self) -> List[Any]:
+        return self._splitter.close()
+
+
+def compress_stream(chunks: Iterable[bytes], compression: str = "none") -> Iterator[bytes]:
+    """Compresses an iterable of byte chunks without buffering the whole stream."""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}'. Use one of: {', '.join(COMPRESSIONS)}")
+    compressor = new_compressor(compression)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    tail = compressor.flush()
+    if tail:
+        yield tail
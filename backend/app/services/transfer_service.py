@@ -0,0 +1,225 @@
+import os
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+from ..db.supabase_client import get_supabase_client
+from ..db.local_store import get_local_store
+from ..db.lesson_cache import lesson_cache
+from .transfer_codecs import (  # noqa: F401  (re-exported for the admin router and lesson_transfer.py)
+    COMPRESSIONS,
+    FORMAT_EXTENSIONS,
+    FORMAT_MEDIA_TYPES,
+    FORMATS,
+    MEDIA_TYPES,
+    StreamDecoder,
+    compress_stream,
+    encode_record,
+    new_compressor,
+    require_format,
+    zstandard,
+)
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_BATCH_SIZE = int(os.getenv("LESSON_TRANSFER_BATCH_SIZE", "500"))
+
+# Columns that are derived by the database and must not be written back
+_DERIVED_COLUMNS = ("search_vector", "rank")
+
+# --- Export ---
+
+def fetch_lesson_page(after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Reads the next page of lessons in ID order, starting after ``after_id`` (keyset pagination)."""
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        return get_local_store().lessons_after(after_id, limit)
+    query = client.table('lessons').select('*').order('id').limit(limit)
+    if after_id:
+        query = query.gt('id', after_id)
+    return query.execute().data or []
+
+
+def export_lessons(
+    after_id: Optional[str] = None,
+    batch_size: int = TRANSFER_BATCH_SIZE,
+    on_page: Optional[Callable[[str, int], None]] = None,
+    record_format: str = "ndjson",
+) -> Iterator[bytes]:
+    """
+    Streams every lesson as one encoded record (an NDJSON line by default),
+    holding a single page in memory.
+
+    Args:
+        after_id: Resume after this lesson ID (the last ID of a previous run).
+        batch_size: Rows read per page.
+        on_page: Called with (last lesson ID, rows exported so far) once a page
+            has been fully yielded; used for checkpointing.
+        record_format: 'ndjson', 'msgpack' or 'cbor'.
+    """
+    require_format(record_format)
+    exported = 0
+    while True:
+        page = fetch_lesson_page(after_id, batch_size)
+        if not page:
+            break
+        for row in page:
+            for column in _DERIVED_COLUMNS:
+                row.pop(column, None)
+            yield encode_record(row, record_format)
+        exported += len(page)
+        after_id = str(page[-1]["id"])
+        if on_page:
+            on_page(after_id, exported)
+        if len(page) < batch_size:
+            break
+    logger.info(f"Exported {exported} lesson(s)")
+
+
+# --- Import ---
+
+def _to_local_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps an exported row (from either backend, any schema version) onto the local store's shape."""
+    lesson_data = row.get("lesson_data")
+    if isinstance(lesson_data, str):
+        lesson_data = json.loads(lesson_data)
+    if not lesson_data:
+        lesson_data = {
+            "title": row.get("title"),
+            "lesson_content": row.get("content") or "",
+            "summary": row.get("summary"),
+            "vocabulary": row.get("vocabulary"),
+            "quiz": row.get("quiz"),
+        }
+    content = lesson_data.get("lesson_content") or lesson_data.get("content") or ""
+    return {
+        "id": str(row["id"]),
+        "title": row.get("title") or lesson_data.get("title") or "Untitled lesson",
+        "subject": row.get("subject") or lesson_data.get("subject") or "",
+        "topic": row.get("topic") or lesson_data.get("topic"),
+        "academic_grade": row.get("academic_grade") or row.get("grade_level") or lesson_data.get("academic_grade") or "",
+        "language": row.get("language") or lesson_data.get("language"),
+        "teacher_style": row.get("teacher_style") or lesson_data.get("teacher_style"),
+        "word_count": row.get("word_count") or len(content.split()),
+        "lesson_data": lesson_data,
+    }
+
+
+def write_lesson_batch(rows: List[Dict[str, Any]]) -> None:
+    """Upserts a batch of exported rows with one multi-row write."""
+    client = get_supabase_client(mock_if_unavailable=True)
+    if getattr(client, "is_mock", False):
+        get_local_store().save_lessons([_to_local_record(row) for row in rows])
+    else:
+        client.table('lessons').upsert(rows).execute()
+    lesson_cache.invalidate(*(str(row["id"]) for row in rows))
+
+
+class LessonImporter:
+    """
+    Buffers NDJSON lines into batches and writes each batch with a single upsert.
+
+    Imports are idempotent (rows are upserted by ID), so a resumed run may
+    safely replay the last, partially committed batch.
+
+    Args:
+        batch_size: Rows per multi-row write.
+        skip: Number of leading lines to skip (lines committed by a previous run).
+        on_batch: Called with the number of lines processed so far after each
+            committed batch; used for checkpointing.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = TRANSFER_BATCH_SIZE,
+        skip: int = 0,
+        on_batch: Optional[Callable[[int], None]] = None,
+    ):
+        self.batch_size = batch_size
+        self.skip = skip
+        self.on_batch = on_batch
+        self.lines_seen = 0
+        self.imported = 0
+        self._batch: List[Dict[str, Any]] = []
+
+    def add_line(self, line: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        Queues a record (an NDJSON line, or an already decoded MessagePack/CBOR
+        item; both count as a line); returns a full batch when one is ready to be written.
+        """
+        self.lines_seen += 1
+        if self.lines_seen <= self.skip:
+            return None
+        row = line
+        if isinstance(line, bytes):
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {self.lines_seen}: {e}") from e
+        if not isinstance(row, dict) or not row.get("id"):
+            raise ValueError(f"Line {self.lines_seen} is not a lesson row with an 'id'.")
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            return self.take_batch()
+        return None
+
+    def take_batch(self) -> List[Dict[str, Any]]:
+        batch, self._batch = self._batch, []
+        return batch
+
+    def committed(self, batch: List[Dict[str, Any]]) -> None:
+        """Records that ``batch`` was written."""
+        self.imported += len(batch)
+        if self.on_batch:
+            self.on_batch(self.lines_seen)
+
+    def write(self, batch: List[Dict[str, Any]]) -> None:
+        if batch:
+            write_lesson_batch(batch)
+            self.committed(batch)
+
+
+def import_lessons(chunks: Iterable[bytes], compression: str = "none", record_format: str = "ndjson", **importer_options) -> int:
+    """
+    Imports lessons from a (possibly compressed) export byte stream.
+
+    Args:
+        chunks: Raw bytes of the export, in arbitrary chunk sizes.
+        compression: 'none', 'gzip' or 'zstd'.
+        record_format: 'ndjson', 'msgpack' or 'cbor'.
+        **importer_options: Passed to LessonImporter (batch_size, skip, on_batch).
+
+    Returns:
+        Number of lessons imported.
+    """
+    decoder = StreamDecoder(compression, record_format)
+    importer = LessonImporter(**importer_options)
+    for chunk in chunks:
+        for line in decoder.feed(chunk):
+            importer.write(importer.add_line(line))
+    for line in decoder.close():
+        importer.write(importer.add_line(line))
+    importer.write(importer.take_batch())
+    logger.info(f"Imported {importer.imported} lesson(s)")
+    return importer.imported
+
+
+async def import_lessons_async(chunks: AsyncIterator[bytes], compression: str = "none", record_format: str = "ndjson", **importer_options) -> int:
+    """Like import_lessons, for a request body stream; database writes run in a worker thread."""
+    decoder = StreamDecoder(compression, record_format)
+    importer = LessonImporter(**importer_options)
+
+    async def write(batch: Optional[List[Dict[str, Any]]]) -> None:
+        if batch:
+            await asyncio.to_thread(write_lesson_batch, batch)
+            importer.committed(batch)
+
+    async for chunk in chunks:
+        for line in decoder.feed(chunk):
+            await write(importer.add_line(line))
+    for line in decoder.close():
+        await write(importer.add_line(line))
+    await write(importer.take_batch())
+    logger.info(f"Imported {importer.imported} lesson(s)")
+    return importer.imported
@@ -0,0 +1,168 @@
+"""
+Bulk export/import of the lessons table as NDJSON (or MessagePack / a CBOR sequence).
+
+Run from the backend directory (like init_db.py):
+
+    python lesson_transfer.py export lessons.ndjson.gz
+    python lesson_transfer.py import lessons.ndjson.gz
+
+Compression is picked from the file extension (.gz -> gzip, .zst -> zstd)
+unless --compression is given, and so is the format (.msgpack, .cbors;
+NDJSON otherwise) unless --format is given. Progress is checkpointed to <file>.checkpoint
+after every batch; pass --resume to continue an interrupted run.
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from app.services import transfer_service  # noqa: E402  (needs the environment loaded first)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1 << 16
+
+
+def _compression_for(path: str, requested: str) -> str:
+    if requested:
+        return requested
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+
+def _format_for(path: str, requested: str) -> str:
+    if requested:
+        return requested
+    stem = path.removesuffix(".gz").removesuffix(".zst")
+    for record_format, extension in transfer_service.FORMAT_EXTENSIONS.items():
+        if stem.endswith(f".{extension}"):
+            return record_format
+    return "ndjson"
+
+
+def _load_checkpoint(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def _save_checkpoint(path: Path, checkpoint: dict) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(checkpoint))
+    os.replace(tmp_path, path)
+
+
+def run_export(args) -> int:
+    """
+    Exports lessons page by page. Each page is written as its own gzip member /
+    zstd frame and fsynced before the checkpoint records its end offset, so a
+    resumed run truncates any partial page and appends a still-valid stream.
+    """
+    compression = _compression_for(args.file, args.compression)
+    record_format = _format_for(args.file, args.format)
+    checkpoint_path = Path(args.checkpoint or f"{args.file}.checkpoint")
+    checkpoint = _load_checkpoint(checkpoint_path) if args.resume else {}
+    # Checkpoints from before formats were supported have no "format": they are NDJSON
+    if checkpoint.get("compression", compression) != compression or \
+            (checkpoint and checkpoint.get("format", "ndjson") != record_format):
+        logger.error("Checkpoint was written with a different compression or format; refusing to resume.")
+        return 1
+
+    offset = checkpoint.get("offset", 0)
+    previously_exported = checkpoint.get("exported", 0)
+    if offset and (not os.path.exists(args.file) or os.path.getsize(args.file) < offset):
+        # Truncating up to the offset would pad the file with NUL bytes
+        logger.error(
+            f"{args.file} is missing or shorter than the {offset} bytes the checkpoint records; refusing to resume. "
+            f"Delete {checkpoint_path} to export from scratch."
+        )
+        return 1
+    with open(args.file, "r+b" if offset else "wb") as out:
+        out.truncate(offset)
+        out.seek(offset)
+        state = {"compressor": transfer_service.new_compressor(compression), "dirty": False}
+
+        def on_page(last_id: str, exported: int) -> None:
+            out.write(state["compressor"].flush())
+            out.flush()
+            os.fsync(out.fileno())
+            state.update(compressor=transfer_service.new_compressor(compression), dirty=False)
+            _save_checkpoint(checkpoint_path, {
+                "after_id": last_id,
+                "exported": previously_exported + exported,
+                "offset": out.tell(),
+                "compression": compression,
+                "format": record_format,
+            })
+            logger.info(f"Exported {previously_exported + exported} lesson(s) so far")
+
+        for line in transfer_service.export_lessons(checkpoint.get("after_id"), args.batch_size, on_page, record_format):
+            out.write(state["compressor"].compress(line))
+            state["dirty"] = True
+        if state["dirty"]:
+            out.write(state["compressor"].flush())
+
+    logger.info(f"Export to {args.file} complete")
+    return 0
+
+
+def run_import(args) -> int:
+    """Imports lessons in batches, checkpointing the number of committed lines after each one."""
+    compression = _compression_for(args.file, args.compression)
+    checkpoint_path = Path(args.checkpoint or f"{args.file}.checkpoint")
+    checkpoint = _load_checkpoint(checkpoint_path) if args.resume else {}
+    skip = checkpoint.get("committed_lines", 0)
+    if skip:
+        logger.info(f"Resuming import after line {skip}")
+
+    def on_batch(lines: int) -> None:
+        _save_checkpoint(checkpoint_path, {"committed_lines": lines})
+        logger.info(f"Committed {lines} line(s)")
+
+    def read_chunks():
+        with open(args.file, "rb") as source:
+            while chunk := source.read(READ_CHUNK_SIZE):
+                yield chunk
+
+    imported = transfer_service.import_lessons(
+        read_chunks(), compression, _format_for(args.file, args.format),
+        batch_size=args.batch_size, skip=skip, on_batch=on_batch,
+    )
+    logger.info(f"Import from {args.file} complete: {imported} lesson(s)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stream the lessons table to or from an NDJSON file.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("file", help="NDJSON file (.gz / .zst for compressed)")
+    parser.add_argument("--compression", choices=transfer_service.COMPRESSIONS, help="Override compression detection")
+    parser.add_argument("--format", choices=transfer_service.FORMATS, help="Override format detection")
+    parser.add_argument("--batch-size", type=int, default=transfer_service.TRANSFER_BATCH_SIZE, help="Rows per page/write")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <file>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an interrupted run")
+    args = parser.parse_args()
+
+    try:
+        return run_export(args) if args.command == "export" else run_import(args)
+    except Exception as e:
+        logger.error("Lesson %s failed: %s", args.command, str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
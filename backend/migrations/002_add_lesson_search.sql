@@ -0,0 +1,70 @@
+-- Full-text and faceted search over saved lessons
+
+-- Columns written by the lesson service that the original table lacks
+ALTER TABLE lessons ADD COLUMN IF NOT EXISTS academic_grade TEXT;
+ALTER TABLE lessons ADD COLUMN IF NOT EXISTS topic TEXT;
+ALTER TABLE lessons ADD COLUMN IF NOT EXISTS teacher_style TEXT;
+ALTER TABLE lessons ADD COLUMN IF NOT EXISTS lesson_data JSONB;
+
+-- Weighted search document: title (A), summary and vocabulary terms (B), content (C).
+-- Uses the 'simple' configuration because lessons are generated in many languages.
+ALTER TABLE lessons ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(summary, lesson_data->>'summary', '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(
+            jsonb_path_query_array(coalesce(vocabulary, lesson_data->'vocabulary', '[]'::jsonb), '$[*].term')::text,
+            ''
+        )), 'B') ||
+        setweight(to_tsvector('simple', coalesce(content, lesson_data->>'lesson_content', '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_lessons_search_vector ON lessons USING GIN (search_vector);
+
+-- Facet filters (case-insensitive equality; rows from before this migration only have grade_level)
+CREATE INDEX IF NOT EXISTS idx_lessons_facets ON lessons (
+    lower(subject), lower(coalesce(academic_grade, grade_level)), lower(language), lower(teacher_style)
+);
+CREATE INDEX IF NOT EXISTS idx_lessons_created_at ON lessons (created_at DESC);
+
+-- Ranked search, exposed to the API through PostgREST RPC
+CREATE OR REPLACE FUNCTION search_lessons(
+    search_query TEXT DEFAULT NULL,
+    subject_filter TEXT DEFAULT NULL,
+    grade_filter TEXT DEFAULT NULL,
+    language_filter TEXT DEFAULT NULL,
+    style_filter TEXT DEFAULT NULL,
+    result_limit INTEGER DEFAULT 20,
+    result_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    subject TEXT,
+    topic TEXT,
+    academic_grade TEXT,
+    language TEXT,
+    teacher_style TEXT,
+    summary TEXT,
+    word_count INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE,
+    rank REAL
+) AS $$
+    SELECT
+        l.id, l.title, l.subject, l.topic, coalesce(l.academic_grade, l.grade_level), l.language,
+        l.teacher_style, coalesce(l.summary, l.lesson_data->>'summary'), l.word_count, l.created_at,
+        CASE WHEN q.query IS NULL THEN 0 ELSE ts_rank_cd(l.search_vector, q.query) END AS rank
+    FROM lessons l
+    CROSS JOIN (
+        SELECT CASE WHEN coalesce(trim(search_query), '') = '' THEN NULL
+                    ELSE websearch_to_tsquery('simple', search_query) END AS query
+    ) q
+    WHERE (q.query IS NULL OR l.search_vector @@ q.query)
+      AND (subject_filter IS NULL OR lower(l.subject) = lower(subject_filter))
+      AND (grade_filter IS NULL OR lower(coalesce(l.academic_grade, l.grade_level)) = lower(grade_filter))
+      AND (language_filter IS NULL OR lower(l.language) = lower(language_filter))
+      AND (style_filter IS NULL OR lower(l.teacher_style) = lower(style_filter))
+    ORDER BY rank DESC, l.created_at DESC
+    LIMIT least(result_limit, 100)
+    OFFSET result_offset;
+$$ LANGUAGE sql STABLE;
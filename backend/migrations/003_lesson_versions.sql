@@ -0,0 +1,20 @@
+-- Versioned lesson storage (see backend/app/db/lesson_versions.py)
+
+-- Content-addressed, compressed lesson fragments (paragraphs, summary, vocabulary/quiz items).
+-- The first byte of `data` is a codec tag: 'z' zstd, 'd' zlib, 'r' uncompressed.
+CREATE TABLE IF NOT EXISTS lesson_blobs (
+    hash TEXT PRIMARY KEY,                     -- SHA-256 of the uncompressed fragment
+    data BYTEA NOT NULL
+);
+
+-- One row per saved version of a lesson. Snapshot rows hold a full manifest of
+-- blob hashes; the others hold a delta against parent_version.
+CREATE TABLE IF NOT EXISTS lesson_versions (
+    lesson_id UUID NOT NULL,
+    version INTEGER NOT NULL,
+    parent_version INTEGER,
+    is_snapshot BOOLEAN NOT NULL DEFAULT FALSE,
+    manifest BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (lesson_id, version)
+);
@@ -0,0 +1,139 @@
+"""
+Parsing, repair and validation throughput on recorded LLM responses.
+
+Reads cassettes recorded with LLM_CASSETTE_MODE=record (see
+services/llm/cassettes.py) and runs every successful response through the
+steps the pipelines apply to it:
+
+- repair: strip_code_fences;
+- parse: json.loads;
+- validate: the vocabulary and quiz parsers of the app whose schema the
+  response follows. The backend's quizzes have option IDs; the main app's
+  have a ``correct_answer`` index.
+
+It reports the time and throughput of each step, and how often the quirks
+of real models turn up: fenced JSON, string ``correct_answer`` values,
+vocabulary lists longer than 5, truncated responses and unparseable JSON.
+
+Usage (from the repository root):
+    python benchmarks/cassette_benchmark.py [data/cassettes] [--repeat 20]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm.cassettes import DEFAULT_CASSETTE_DIR, read_cassettes
+from services.llm.instrumentation import strip_code_fences
+from services.lesson import parser as main_parser
+from backend.app.services import lesson_service
+
+
+def responses(path: Path) -> Tuple[List[str], Counter]:
+    """The assistant messages of the successful exchanges, and the quirks seen in all of them."""
+    contents, quirks = [], Counter()
+    for exchange in read_cassettes(path):
+        quirks["exchanges"] += 1
+        if exchange["status"] != 200:
+            quirks[f"status {exchange['status']}"] += 1
+            continue
+        try:
+            choice = json.loads(exchange["body"])["choices"][0]
+        except (ValueError, KeyError, IndexError):
+            quirks["unreadable body"] += 1
+            continue
+        if choice.get("finish_reason") == "length":
+            quirks["truncated (finish_reason length)"] += 1
+        contents.append(choice["message"]["content"])
+    return contents, quirks
+
+
+def count_quirks(data: Dict[str, Any], raw: str, quirks: Counter) -> None:
+    if raw.strip().startswith("```"):
+        quirks["fenced JSON"] += 1
+    quiz = data.get("quiz") if isinstance(data.get("quiz"), list) else []
+    if any(isinstance(item, dict) and isinstance(item.get("correct_answer"), str) for item in quiz):
+        quirks["string correct_answer"] += 1
+    vocabulary = data.get("vocabulary")
+    if isinstance(vocabulary, list) and len(vocabulary) > 5:
+        quirks["vocabulary longer than 5"] += 1
+
+
+def validate(data: Dict[str, Any]) -> None:
+    quiz = data.get("quiz") if isinstance(data.get("quiz"), list) else []
+    if any(isinstance(item, dict) and "correct_option_id" in item for item in quiz):
+        lesson_service._parse_vocabulary(data.get("vocabulary"))
+        lesson_service._parse_quiz(quiz)
+    else:
+        main_parser.parse_vocabulary(data.get("vocabulary"))
+        main_parser.parse_quiz([dict(item) for item in quiz if isinstance(item, dict)])
+
+
+def time_step(step: Callable[[Any], Any], inputs: List[Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in inputs:
+            step(value)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time parsing, repair and validation of recorded LLM responses")
+    parser.add_argument("cassettes", nargs="?", default=str(DEFAULT_CASSETTE_DIR), help="Cassette file or directory")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the responses per step")
+    args = parser.parse_args()
+
+    path = Path(args.cassettes)
+    if not path.exists():
+        print(f"No cassettes at {path}; record some with LLM_CASSETTE_MODE=record", file=sys.stderr)
+        return 1
+    contents, quirks = responses(path)
+    repaired = [strip_code_fences(content) for content in contents]
+    parsed = []
+    for raw, text in zip(contents, repaired):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            quirks["unparseable JSON"] += 1
+            continue
+        if isinstance(data, dict):
+            count_quirks(data, raw, quirks)
+            parsed.append(data)
+    if not parsed:
+        print(f"No parseable responses among {quirks['exchanges']} exchange(s) in {path}", file=sys.stderr)
+        return 1
+
+    megabytes = sum(len(content.encode("utf-8")) for content in contents) / 1e6
+    print(f"{len(contents)} responses ({megabytes:.2f} MB) from {quirks['exchanges']} exchanges in {path}\n")
+    print(f"{'step':<10} {'per pass':>10} {'responses/s':>12} {'MB/s':>8}")
+
+    def parse_quietly(text: str) -> None:
+        try:
+            json.loads(text)
+        except ValueError:
+            pass
+
+    for name, step, inputs in (
+        ("repair", strip_code_fences, contents),
+        ("parse", parse_quietly, repaired),
+        ("validate", validate, parsed),
+    ):
+        seconds = time_step(step, inputs, args.repeat)
+        print(f"{name:<10} {seconds * 1000:>8.2f}ms {len(inputs) / seconds:>12,.0f} {megabytes / seconds:>8.1f}")
+
+    print("\nQuirks:")
+    for quirk, count in sorted(quirks.items()):
+        if quirk != "exchanges":
+            print(f"  {quirk:<34} {count:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,498 @@
+"""
+End-to-end load test of either app against the simulated LLM backend.
+
+Starts benchmarks/mock_openrouter.py and the app under test (``main:app`` or
+``backend.app.main:app``) as uvicorn processes. The app uses throwaway
+storage and points at the mock. The test then sends a weighted mix of
+requests, either:
+
+- closed loop: ``--concurrency`` clients, each sending its next request when
+  the last one finished; or
+- open loop (``--rate``): Poisson arrivals at that many requests per second,
+  at most ``--concurrency`` in flight. Latency then counts from the planned
+  arrival, so time spent queued behind a slow server is not hidden.
+
+The report has, per scenario and in total: throughput, p50/p95/p99/max
+latency, error rate and status codes. It also has the app's resident memory
+at the start, peak and end. ``--slo lesson=p95:8`` checks latency targets.
+``--baseline`` compares the run with a stored one (``--save-baseline``
+writes it). The exit status is 1 when an SLO is missed or a metric regressed
+by more than ``--tolerance``. With ``--cassettes`` the app answers from
+recorded real exchanges instead of the mock's synthetic ones.
+
+Usage (from the repository root):
+    python benchmarks/load_test.py --app backend --duration 60 --concurrency 20
+    python benchmarks/load_test.py --app main --rate 5 --mix lesson=3,continue=1 --ttfb 1.5 --rate-429 0.05
+    python benchmarks/load_test.py --app backend --save-baseline      # then, after a change:
+    python benchmarks/load_test.py --app backend --baseline
+    python benchmarks/load_test.py --app backend --cassettes data/cassettes --time-scale 0.5
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.mock_openrouter import MockConfig  # noqa: E402
+
+APPS = {"main": "main:app", "backend": "backend.app.main:app"}
+DEFAULT_MIX = "lesson=6,story=2,continue=2,list=4"
+SUBJECTS = [("Biology", "Photosynthesis"), ("Biology", "Cells"), ("History", "The Roman Empire"),
+            ("Mathematics", "Fractions"), ("Physics", "Forces and motion"), ("Geography", "Volcanoes")]
+STORY_TEXT = "Mia looked at the leaf under the microscope and saw hundreds of tiny green cells. " * 20
+
+
+# --- Scenarios ---
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    build: Callable[[random.Random, "RunState"], Tuple[str, Optional[Dict[str, Any]]]]  # (URL path, JSON body)
+
+
+class RunState:
+    """Responses later requests build on, e.g. lessons to continue."""
+
+    def __init__(self):
+        self.lessons: List[Dict[str, Any]] = []
+
+    def remember(self, scenario: str, response: httpx.Response) -> None:
+        if scenario == "lesson" and response.status_code < 300 and len(self.lessons) < 50:
+            self.lessons.append(response.json())
+
+
+def _lesson_topic(rng: random.Random) -> Tuple[str, str, str]:
+    subject, topic = rng.choice(SUBJECTS)
+    return subject, topic, rng.choice(["3", "5", "7", "9", "11"])
+
+
+def _backend_lesson(rng: random.Random, state: RunState):
+    subject, topic, grade = _lesson_topic(rng)
+    return "/api/lessons/generate", {
+        "subject": subject, "topic": topic, "academic_grade": grade, "language": "English",
+        "teacher_style": rng.choice(["Encouraging", "Structured", "Creative", "Direct"]),
+        "word_count": rng.choice([300, 500, 800]),
+    }
+
+
+def _backend_continue(rng: random.Random, state: RunState):
+    if not state.lessons:
+        return _backend_lesson(rng, state)
+    return "/api/lessons/continue", {
+        "previous_lesson": rng.choice(state.lessons),
+        "continuation_prompt": "Add a worked example and two more quiz questions.",
+    }
+
+
+def _main_lesson(rng: random.Random, state: RunState):
+    subject, topic, grade = _lesson_topic(rng)
+    return "/api/lessons/generate", {
+        "subject": subject, "subject_specification": topic, "academic_grade": grade,
+        "word_count": rng.choice([300, 500, 800]), "generate_vocabulary": True, "generate_quiz": rng.random() < 0.5,
+    }
+
+
+def _main_continue(rng: random.Random, state: RunState):
+    return f"/api/lessons/bench-{rng.randint(1, 20)}/continue", {"original_lesson_content": STORY_TEXT, "length": 300}
+
+
+def _story(rng: random.Random, state: RunState):
+    subject, topic, grade = _lesson_topic(rng)
+    return "/api/stories/generate", {
+        "subject": subject, "subject_specification": topic, "academic_grade": grade,
+        "word_count": 500, "generate_vocabulary": True, "generate_quiz": True,
+    }
+
+
+SCENARIOS = {
+    "backend": [
+        Scenario("lesson", "POST", _backend_lesson),
+        Scenario("continue", "POST", _backend_continue),
+        Scenario("list", "GET", lambda rng, state: (f"/api/lessons?limit=20&offset={rng.choice([0, 0, 20])}", None)),
+        Scenario("story", "POST", _story),
+    ],
+    "main": [
+        Scenario("lesson", "POST", _main_lesson),
+        Scenario("continue", "POST", _main_continue),
+        Scenario("story", "POST", _story),
+    ],
+}
+
+
+def served_routes(base_url: str) -> List[Tuple[str, re.Pattern]]:
+    """The (method, path pattern) pairs in the app's OpenAPI schema."""
+    response = httpx.get(base_url + "/openapi.json", timeout=30.0)
+    response.raise_for_status()
+    routes = []
+    for template, operations in response.json().get("paths", {}).items():
+        parts = re.split(r"(\{[^}]+\})", template)
+        pattern = re.compile("".join("[^/]+" if part.startswith("{") else re.escape(part) for part in parts) + "$")
+        routes.extend((method.upper(), pattern) for method in operations)
+    return routes
+
+
+def served(routes: List[Tuple[str, re.Pattern]], scenario: Scenario) -> bool:
+    path, _ = scenario.build(random.Random(0), RunState())
+    path = path.partition("?")[0]
+    return any(method == scenario.method and pattern.match(path) for method, pattern in routes)
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# --- Processes ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_servers(
+    app: str, mock_args: List[str], workdir: Path, extra_env: Optional[Dict[str, str]] = None
+) -> Tuple[str, List[subprocess.Popen]]:
+    """Starts the mock and the app (with throwaway storage, pointed at the mock); returns the app's URL."""
+    mock_port, app_port = free_port(), free_port()
+    mock = subprocess.Popen([sys.executable, str(BENCHMARKS_DIR / "mock_openrouter.py"), "--port", str(mock_port), *mock_args])
+    processes = [mock]
+    try:
+        wait_until_up(f"http://127.0.0.1:{mock_port}/mock/config", mock)
+        env = dict(
+            os.environ,
+            OPENROUTER_API_URL=f"http://127.0.0.1:{mock_port}/api/v1/chat/completions",
+            OPENROUTER_API_KEY="load-test", OPENROUTER_API_KEYS="", OPENROUTER_RPM="0", OPENROUTER_TPM="0",
+            SUPABASE_URL="", SUPABASE_KEY="", SUPABASE_SERVICE_KEY="",  # Set empty so .env files cannot point at a real database
+            LOCAL_LESSON_DB_PATH=str(workdir / "lessons.sqlite3"),
+            USAGE_LEDGER_PATH=str(workdir / "usage.sqlite3"),
+            TRACE_EXPORTER="none", LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+            PYTHONPATH=str(ROOT_DIR),
+            **(extra_env or {}),
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", APPS[app], "--port", str(app_port), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT_DIR, env=env,
+        )
+        processes.append(server)
+        wait_until_up(f"http://127.0.0.1:{app_port}/metrics", server)
+    except BaseException:
+        stop_servers(processes)
+        raise
+    return f"http://127.0.0.1:{app_port}", processes
+
+
+def stop_servers(processes: List[subprocess.Popen]) -> None:
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process (Linux /proc; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# --- Load ---
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of values; 0 for none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, scenario: str, latency: float, status: str) -> None:
+        self.latencies.setdefault(scenario, []).append(latency)
+        counts = self.statuses.setdefault(scenario, {})
+        counts[status] = counts.get(status, 0) + 1
+        if not status.startswith(("2", "3")):
+            self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        def stats(latencies: List[float], errors: int) -> Dict[str, Any]:
+            return {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+                "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+                **{f"p{q}_s": round(percentile(latencies, q), 4) for q in (50, 95, 99)},
+                "max_s": round(max(latencies, default=0.0), 4),
+            }
+
+        scenarios = {name: {**stats(values, self.errors.get(name, 0)), "statuses": self.statuses[name]}
+                     for name, values in sorted(self.latencies.items())}
+        everything = [latency for values in self.latencies.values() for latency in values]
+        return {"scenarios": scenarios, "total": stats(everything, sum(self.errors.values()))}
+
+
+async def run_load(
+    base_url: str, scenarios: List[Scenario], weights: List[float], args: argparse.Namespace, recorder: Recorder
+) -> float:
+    rng = random.Random(args.seed)
+    state = RunState()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def one(scenario: Scenario, planned: float) -> None:
+            path, body = scenario.build(rng, state)
+            try:
+                response = await client.request(scenario.method, path, json=body)
+                status = str(response.status_code)
+                state.remember(scenario.name, response)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            recorder.record(scenario.name, time.perf_counter() - planned, status)
+
+        # One lesson up front, so continuations have something to continue
+        if any(scenario.name == "continue" for scenario in scenarios):
+            lesson = next((scenario for scenario in scenarios if scenario.name == "lesson"), None)
+            if lesson is not None:
+                await one(lesson, time.perf_counter())
+                recorder.reset()
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        sent = 0
+
+        def more() -> bool:
+            return time.perf_counter() < deadline and (not args.requests or sent < args.requests)
+
+        if args.rate:
+            slots = asyncio.Semaphore(args.concurrency)
+            pending = set()
+
+            async def arrival(scenario: Scenario, planned: float) -> None:
+                async with slots:
+                    await one(scenario, planned)
+
+            planned = started
+            while more():
+                planned += rng.expovariate(args.rate)
+                await asyncio.sleep(max(0.0, planned - time.perf_counter()))
+                sent += 1
+                task = asyncio.create_task(arrival(rng.choices(scenarios, weights)[0], planned))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        else:
+            async def client_loop() -> None:
+                nonlocal sent
+                while more():
+                    sent += 1
+                    await one(rng.choices(scenarios, weights)[0], time.perf_counter())
+
+            await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+        return time.perf_counter() - started
+
+
+# --- Checks ---
+
+def check_slos(results: Dict[str, Any], slos: List[str]) -> List[str]:
+    """SLOs like "lesson=p95:8" (seconds); "total" covers all requests."""
+    failures = []
+    for slo in slos:
+        name, _, target = slo.partition("=")
+        metric, _, limit = target.partition(":")
+        stats = results["total"] if name == "total" else results["scenarios"].get(name)
+        if stats is None:
+            continue
+        value = stats.get(f"{metric}_s")
+        if value is None:
+            failures.append(f"{slo}: unknown metric {metric}")
+        elif value > float(limit):
+            failures.append(f"{name} {metric} {value:.3f}s > {float(limit):.3f}s")
+    return failures
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Latency or throughput worse than the baseline by more than tolerance, or the error rate up by more than a point."""
+    regressions = []
+    for name, before in {**baseline["scenarios"], "total": baseline["total"]}.items():
+        after = results["total"] if name == "total" else results["scenarios"].get(name)
+        if after is None:
+            continue
+        for metric in ("p50_s", "p95_s", "p99_s"):
+            if before[metric] > 0 and after[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric[:-2]}: {before[metric]:.3f}s -> {after[metric]:.3f}s")
+        if before["throughput_rps"] > 0 and after["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name} throughput: {before['throughput_rps']:.2f} -> {after['throughput_rps']:.2f} req/s")
+        if after["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(f"{name} error rate: {before['error_rate']:.1%} -> {after['error_rate']:.1%}")
+    before_peak, after_peak = baseline.get("memory", {}).get("rss_peak_mb"), results.get("memory", {}).get("rss_peak_mb")
+    if before_peak and after_peak and after_peak > before_peak * (1 + tolerance):
+        regressions.append(f"peak memory: {before_peak:.0f}MB -> {after_peak:.0f}MB")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    header = ("scenario", "requests", "req/s", "errors", "p50", "p95", "p99", "max")
+    rows = []
+    for name, stats in [*results["scenarios"].items(), ("total", results["total"])]:
+        rows.append([name, str(stats["requests"]), f"{stats['throughput_rps']:.2f}", f"{stats['error_rate']:.1%}",
+                     *(f"{stats[key] * 1000:.0f}ms" for key in ("p50_s", "p95_s", "p99_s", "max_s"))])
+    widths = [max(len(header[i]), *(len(row[i]) for row in rows)) for i in range(len(header))]
+    for row in [list(header), *rows]:
+        print("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths))))
+    for name, stats in results["scenarios"].items():
+        print(f"  {name} statuses: " + ", ".join(f"{status}={count}" for status, count in sorted(stats["statuses"].items())))
+    memory = results.get("memory") or {}
+    if memory.get("rss_peak_mb"):
+        print(f"App memory (RSS): {memory['rss_start_mb']:.0f}MB at start, {memory['rss_peak_mb']:.0f}MB peak, {memory['rss_end_mb']:.0f}MB at end")
+
+
+async def sample_memory(pid: int, samples: List[float]) -> None:
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(0.5)
+
+
+async def measure(base_url: str, scenarios: List[Scenario], weights: List[float], args, pid: Optional[int]) -> Dict[str, Any]:
+    recorder = Recorder()
+    memory: List[float] = []
+    sampler = asyncio.create_task(sample_memory(pid, memory)) if pid else None
+    try:
+        elapsed = await run_load(base_url, scenarios, weights, args, recorder)
+    finally:
+        if sampler:
+            sampler.cancel()
+    results = {"elapsed_s": round(elapsed, 2), **recorder.summary(elapsed)}
+    if memory:
+        results["memory"] = {"rss_start_mb": round(memory[0], 1), "rss_peak_mb": round(max(memory), 1), "rss_end_mb": round(memory[-1], 1)}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test an app end to end against the simulated LLM backend")
+    parser.add_argument("--app", choices=list(APPS), default="backend", help="App to start (default: backend)")
+    parser.add_argument("--url", help="Test an app that is already running at this URL instead (its LLM backend is up to you)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=10, help="Clients, or with --rate the most requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open loop: arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to send requests for")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the request mix (and of the mock)")
+    parser.add_argument("--slo", action="append", default=[], help='Latency objective, e.g. "lesson=p95:8" or "total=p99:12"')
+    parser.add_argument("--baseline", nargs="?", const="", help="Compare with this results file (default: benchmarks/baselines/load_<app>.json)")
+    parser.add_argument("--save-baseline", nargs="?", const="", help="Store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a regression is flagged (default 0.2)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--cassettes", help="Replay these recorded LLM exchanges instead of the mock's (services/llm/cassettes.py)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="With --cassettes: multiplier of the recorded timing")
+    mock = parser.add_argument_group("simulated LLM (see benchmarks/mock_openrouter.py)")
+    for field in fields(MockConfig):
+        if field.name != "seed":
+            mock.add_argument(f"--{field.name.replace('_', '-')}", type=float, default=getattr(MockConfig(), field.name))
+    args = parser.parse_args()
+
+    default_baseline = BENCHMARKS_DIR / "baselines" / f"load_{args.app}.json"
+    mock_args = [f"--seed={args.seed}"] + [
+        f"--{field.name.replace('_', '-')}={getattr(args, field.name)}" for field in fields(MockConfig) if field.name != "seed"
+    ]
+
+    with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+        processes: List[subprocess.Popen] = []
+        try:
+            if args.url:
+                base_url, pid = args.url.rstrip("/"), None
+            else:
+                replay = {"LLM_CASSETTE_MODE": "replay", "LLM_CASSETTE_DIR": str(Path(args.cassettes).resolve()),
+                          "LLM_CASSETTE_TIME_SCALE": str(args.time_scale)} if args.cassettes else None
+                base_url, processes = start_servers(args.app, mock_args, Path(workdir), replay)
+                pid = processes[-1].pid
+            mix = parse_mix(args.mix)
+            routes = served_routes(base_url)
+            scenarios = [s for s in SCENARIOS[args.app] if s.name in mix and served(routes, s)]
+            for name in sorted(set(mix) - {s.name for s in scenarios}):
+                print(f"Skipping '{name}': the {args.app} app does not serve it", file=sys.stderr)
+            if not scenarios:
+                print("Nothing to run.", file=sys.stderr)
+                return 2
+            mode = f"{args.rate:g} req/s (max {args.concurrency} in flight)" if args.rate else f"{args.concurrency} clients"
+            print(f"Load testing {base_url} ({args.app}) for {args.duration:g}s at {mode}: "
+                  + ", ".join(f"{s.name}={mix[s.name]:g}" for s in scenarios), file=sys.stderr)
+            results = asyncio.run(measure(base_url, scenarios, [mix[s.name] for s in scenarios], args, pid))
+        finally:
+            stop_servers(processes)
+
+    results["config"] = {"app": args.app, "mix": args.mix, "concurrency": args.concurrency, "rate": args.rate,
+                         "duration": args.duration, "mock": mock_args, "cassettes": args.cassettes}
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    failures = check_slos(results, args.slo)
+    if args.baseline is not None:
+        path = Path(args.baseline or default_baseline)
+        if path.exists():
+            failures += compare(results, json.loads(path.read_text()), args.tolerance)
+            print(f"Compared with the baseline in {path}")
+        else:
+            print(f"No baseline at {path}; run with --save-baseline first", file=sys.stderr)
+    if args.save_baseline is not None:
+        path = Path(args.save_baseline or default_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {path}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Microbenchmarks of the CPU-bound work done on every generation request.
+
+Covers prompt building (story, lesson and continuation prompts, the latter
+embedding a whole lesson as indented JSON), parsing of the LLM's JSON, the
+quiz and vocabulary parsers, and construction of LessonGenerationResponse
+with its QuizItem validators. Payloads are realistic: lessons of --words words
+(default 1500) with 5 quiz questions and 10 vocabulary items.
+
+Each benchmark reports calls per second (median of --rounds) and the memory
+allocated per call (tracemalloc peak). Timings depend on the machine, so
+checks compare "relative cost" instead: the time per call divided by the time
+of a fixed pure-Python calibration workload, timed in rounds alternating
+with the benchmark's own (the median of the per-round ratios).
+
+    python benchmarks/micro_benchmark.py                   # report
+    python benchmarks/micro_benchmark.py --save-baseline   # store benchmarks/baselines/micro.json
+    python benchmarks/micro_benchmark.py --check           # exit 1 on a regression (for CI)
+
+--check flags a benchmark whose relative cost grew by more than --threshold
+(default 0.25) and by more than --min-delta (default 0.05) in absolute terms,
+or whose allocations grew by more than --alloc-threshold (default 0.10). The
+absolute floor keeps run-to-run noise of the cheapest benchmarks (relative
+cost around 0.05) from failing the check. Allocations hardly vary between
+machines and runs, so their threshold can be tighter.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.serialization_benchmark import WORDS, sample_lesson
+from backend.app.models.lesson_models import LessonGenerationRequest, LessonGenerationResponse
+from backend.app.services.prompt_builder import build_continuation_prompt, build_generation_prompt
+from models.story import StoryContinuationRequest, StoryGenerationRequest
+from services.lesson.parser import parse_json_response, parse_quiz, parse_vocabulary
+from services.llm import prompting
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "micro.json"
+TARGET_SECONDS = 0.05  # Per timing round
+
+
+def _text(words: int) -> str:
+    return " ".join(WORDS[index % len(WORDS)] for index in range(words))
+
+
+def benchmarks(words: int) -> List[Tuple[str, Callable[[], Any]]]:
+    lesson = sample_lesson(words)
+    lesson_data = lesson.model_dump(mode="json")
+    # The LLM's answer as the main app receives it: fenced JSON with string correct_answer values
+    main_quiz = [{"question": f"Question {n}?", "options": [f"Option {letter}" for letter in "ABCD"], "correct_answer": str(n % 4)}
+                 for n in range(5)]
+    vocabulary = [{"term": word, "definition": f"Definition of {word}."} for word in WORDS[:10]]
+    raw_response = "```json\n" + json.dumps({
+        "title": lesson.title, "lesson_content": lesson.lesson_content, "summary": lesson.summary,
+        "vocabulary": vocabulary, "quiz": main_quiz,
+    }, indent=2) + "\n```"
+
+    story_request = StoryGenerationRequest(
+        academic_grade="7", subject="Biology", subject_specification="Photosynthesis", setting="A greenhouse",
+        main_character="Mia", word_count=words, generate_vocabulary=True, generate_summary=True, generate_quiz=True,
+    )
+    lesson_request = LessonGenerationRequest(
+        academic_grade="7", subject="Biology", topic="Photosynthesis", teacher_style="Encouraging", word_count=min(words, 2000),
+        user_prompt_addition="Use examples from a school garden.",
+    )
+    story_continuation = StoryContinuationRequest(original_story_content=_text(words), length=500, focus="chlorophyll")
+
+    return [
+        ("prompt.story_generation", lambda: prompting.build_story_generation_prompt(story_request)),
+        ("prompt.story_continuation", lambda: prompting.build_continuation_prompt("story-1", story_continuation)),
+        ("prompt.lesson_generation", lambda: build_generation_prompt(lesson_request)),
+        ("prompt.lesson_continuation", lambda: build_continuation_prompt(lesson, "Add a worked example about leaves.")),
+        ("parse.json_response", lambda: parse_json_response(raw_response)),
+        # parse_quiz converts string answers in place, so each call gets fresh items
+        ("parse.quiz", lambda: parse_quiz([dict(item) for item in main_quiz])),
+        ("parse.vocabulary", lambda: parse_vocabulary(vocabulary)),
+        ("model.lesson_response", lambda: LessonGenerationResponse(**lesson_data)),
+    ]
+
+
+def calibration() -> None:
+    """Fixed pure-Python work (dict building, sorting, string joins) that timings are expressed in."""
+    items = {f"key{index}": [index, str(index) * 3, index / 7] for index in range(200)}
+    ordered = sorted(items.items(), key=lambda item: item[1][2], reverse=True)
+    "".join(f"{key}={value[1]};" for key, value in ordered)
+
+
+def _loops(func: Callable[[], Any]) -> int:
+    """Calls of func that take about TARGET_SECONDS."""
+    loops, start = 1, time.perf_counter()
+    func()
+    while (elapsed := time.perf_counter() - start) < TARGET_SECONDS / 10:
+        loops *= 2
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+    return max(1, int(loops * TARGET_SECONDS / max(elapsed, 1e-9)))
+
+
+def _round(func: Callable[[], Any], loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return (time.perf_counter() - start) / loops
+
+
+def timings(func: Callable[[], Any], rounds: int) -> Tuple[float, float]:
+    """
+    Median seconds per call of func, and median relative cost: the ratio of
+    func's time to the calibration's over ``rounds`` rounds that alternate
+    between the two, so that both see the same machine load and clock speed.
+    """
+    loops, reference_loops = _loops(func), _loops(calibration)
+    seconds, ratios = [], []
+    for _ in range(rounds):
+        reference = _round(calibration, reference_loops)
+        seconds.append(_round(func, loops))
+        ratios.append(seconds[-1] / reference)
+    return statistics.median(seconds), statistics.median(ratios)
+
+
+def allocated_per_call(func: Callable[[], Any]) -> int:
+    """Peak bytes allocated during one call."""
+    func()  # Warm caches first
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def run(words: int, rounds: int, name_filter: str) -> Dict[str, Any]:
+    results = {}
+    for name, func in benchmarks(words):
+        if name_filter and name_filter not in name:
+            continue
+        seconds, relative_cost = timings(func, rounds)
+        results[name] = {
+            "ops_per_sec": round(1 / seconds, 1),
+            "us_per_call": round(seconds * 1e6, 2),
+            "relative_cost": relative_cost,  # Unrounded, for --check
+            "alloc_kib": round(allocated_per_call(func) / 1024, 1),
+        }
+    calibration_us = round(timings(calibration, rounds)[0] * 1e6, 2)
+    return {"words": words, "python": sys.version.split()[0], "calibration_us": calibration_us, "benchmarks": results}
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float, alloc_threshold: float
+) -> List[str]:
+    regressions = []
+    if baseline.get("words") != results["words"]:
+        return [f"baseline was measured with --words {baseline.get('words')}, not {results['words']}"]
+    for name, now in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        growth = now["relative_cost"] - before["relative_cost"]
+        if growth > before["relative_cost"] * threshold and growth > min_delta:
+            regressions.append(f"{name}: relative cost {before['relative_cost']:.3f} -> {now['relative_cost']:.3f}")
+        if before["alloc_kib"] > 0 and now["alloc_kib"] > before["alloc_kib"] * (1 + alloc_threshold):
+            regressions.append(f"{name}: allocations {before['alloc_kib']:.1f} -> {now['alloc_kib']:.1f} KiB per call")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=1500, help="Words of lesson and story content")
+    parser.add_argument("--rounds", type=int, default=15, help="Timing rounds per benchmark (the median counts)")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--check", nargs="?", const=str(DEFAULT_BASELINE), help="Compare with a baseline; exit 1 on regressions")
+    parser.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), help="Store the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed growth of relative cost (default 0.25)")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="Relative cost a benchmark must also grow by, absolutely, to fail (default 0.05)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.10, help="Allowed growth of allocations (default 0.10)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.words, args.rounds, args.filter)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Payloads of {args.words} words; calibration {results['calibration_us']:.1f}us\n")
+        print(f"{'benchmark':<28} {'ops/s':>10} {'us/call':>10} {'rel. cost':>10} {'KiB/call':>10}")
+        for name, stats in results["benchmarks"].items():
+            print(f"{name:<28} {stats['ops_per_sec']:>10,.0f} {stats['us_per_call']:>10.1f} "
+                  f"{stats['relative_cost']:>10.3f} {stats['alloc_kib']:>10.1f}")
+
+    failures = []
+    if args.check:
+        path = Path(args.check)
+        if not path.exists():
+            print(f"No baseline at {path}; run with --save-baseline first", file=sys.stderr)
+            return 1
+        failures = compare(results, json.loads(path.read_text()), args.threshold, args.min_delta, args.alloc_threshold)
+        print(f"\nCompared with {path}: {len(failures) or 'no'} regression(s)", file=sys.stderr)
+    if args.save_baseline:
+        path = Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline saved to {path}", file=sys.stderr)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Deterministic local stand-in for the OpenRouter chat completions API.
+
+Serves POST /api/v1/chat/completions like OpenRouter does: a JSON completion
+with ``usage``, or with ``"stream": true`` an SSE stream of chunks ending in
+one that carries the usage, then ``data: [DONE]``. The content is fake but
+fits the prompt. The JSON output schema embedded in the prompts (lesson,
+story or continuation) is filled in with text of about the requested word
+count, vocabulary and quizzes whose option IDs match. So every generation
+pipeline runs offline, through parsing, validation and persistence.
+
+Latency is simulated as a lognormal time to first byte around --ttfb, then
+completion tokens at --tokens-per-second. A share of the requests
+(--tail-rate) takes --tail-latency seconds longer. Faults can be injected:
+
+- --rate-429: 429 with a Retry-After of --retry-after seconds;
+- --rate-5xx: 500, 502 or 503;
+- --rate-truncated: content cut off mid-JSON, finish_reason "length";
+- --rate-malformed: invalid JSON (a trailing comma);
+- --rate-fenced: valid JSON wrapped in Markdown code fences and prose.
+
+Every request draws from a random generator seeded with --seed, the request
+body and how many times that body was sent before. The same sequence of
+requests therefore always gets the same latencies, faults and content.
+A retried request gets a fresh draw.
+
+Point the apps at it with OPENROUTER_API_URL (any API key will do):
+
+    python benchmarks/mock_openrouter.py --port 8090 --ttfb 0.8 --rate-429 0.05
+    OPENROUTER_API_URL=http://127.0.0.1:8090/api/v1/chat/completions OPENROUTER_API_KEY=mock python main.py
+
+GET /mock/config shows the settings and POST /mock/config changes them
+(JSON with any of the fields), so one server can run several scenarios.
+GET /mock/stats counts the requests and faults served.
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "energy light plants water cells oxygen growth system process change matter force motion heat "
+    "pattern evidence model structure function cycle balance reaction example result question idea "
+    "student explore observe measure compare explain discover connect describe predict understand"
+).split()
+_WORD_COUNT_RE = re.compile(r"(\d{2,5})\s+(?:more\s+)?words")
+DEFAULT_WORDS = 300
+STREAM_CHUNK_TOKENS = 8
+
+
+@dataclass
+class MockConfig:
+    ttfb: float = 0.5  # Median seconds to the first byte
+    ttfb_sigma: float = 0.3  # Spread of the lognormal TTFB
+    tokens_per_second: float = 80.0
+    tail_rate: float = 0.0
+    tail_latency: float = 5.0
+    rate_429: float = 0.0
+    retry_after: float = 1.0
+    rate_5xx: float = 0.0
+    rate_truncated: float = 0.0
+    rate_malformed: float = 0.0
+    rate_fenced: float = 0.0
+    seed: int = 0
+
+    def update(self, changes: Dict[str, Any]) -> None:
+        unknown = set(changes) - {field.name for field in fields(self)}
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        for name, value in changes.items():
+            setattr(self, name, int(value) if name == "seed" else float(value))
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+# --- Content ---
+
+def find_schema(messages: List[Dict[str, Any]]) -> Dict[str, str]:
+    """The output schema description in the prompts: a JSON object of field name to description."""
+    for message in messages:
+        content = str(message.get("content", ""))
+        for match in re.finditer(r"^\{", content, re.MULTILINE):
+            try:
+                candidate, _ = json.JSONDecoder().raw_decode(content, match.start())
+            except ValueError:
+                continue
+            if isinstance(candidate, dict) and candidate and all(isinstance(v, str) for v in candidate.values()):
+                return candidate
+    return {}
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _text(rng: random.Random, words: int) -> str:
+    paragraphs = []
+    for index in range(0, words, 120):
+        sentences = [_sentence(rng) for _ in range(max(1, min(120, words - index) // 12))]
+        paragraphs.append(f"## Part {index // 120 + 1}\n\n" + " ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def _fill(template: Any, key: str, rng: random.Random) -> Any:
+    """A value for one item of a list template such as [{"term": "string", ...}]."""
+    if isinstance(template, dict):
+        item = {name: _fill(value, name, rng) for name, value in template.items() if name != "correct_option_id"}
+        if "correct_option_id" in template:
+            item["correct_option_id"] = rng.choice(item["options"])["id"]
+        return item
+    if isinstance(template, list):
+        return [_fill(template[0], key, rng) for _ in range(4 if key == "options" else rng.randint(3, 5))]
+    if template == "uuid_string":
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if isinstance(template, int):
+        return rng.randint(0, 3)
+    if key == "term":
+        return rng.choice(WORDS)
+    return _sentence(rng, 6 if key in ("text", "question") else 12)
+
+
+def fake_content(messages: List[Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+    """A JSON object filling in the requested output schema (a story-like one when there is none)."""
+    schema = find_schema(messages) or {"title": "string", "content": "string"}
+    prompt = "\n".join(str(message.get("content", "")) for message in messages if message.get("role") != "system")
+    match = _WORD_COUNT_RE.search(prompt)
+    words = int(match.group(1)) if match else DEFAULT_WORDS
+
+    data: Dict[str, Any] = {}
+    for key, description in schema.items():
+        if "Echo" in description:
+            continue  # The apps fall back to the request's values
+        if "Optional" in description and f"'{key}'" not in prompt:
+            continue
+        kind, _, _ = description.partition(" (")
+        if kind == "string":
+            data[key] = _text(rng, words) if key.endswith(("content", "text")) else _sentence(rng, 6 if key == "title" else 30)
+        elif kind == "[string]":
+            data[key] = [_sentence(rng, 8) for _ in range(4)]
+        elif kind.startswith("[{"):
+            data[key] = _fill(json.loads(re.sub(r"\bint\b", "0", kind)), key, rng)
+        elif kind in ("integer", "int"):
+            data[key] = words
+        else:
+            data[key] = _sentence(rng)
+    return data
+
+
+def render_content(data: Dict[str, Any], fault: Optional[str], rng: random.Random) -> str:
+    text = json.dumps(data, ensure_ascii=False)
+    if fault == "truncated":
+        return text[: rng.randint(len(text) // 4, len(text) * 3 // 4)]
+    if fault == "malformed":
+        return text[:-1] + ",}"
+    if fault == "fenced":
+        return f"Here is the lesson you asked for:\n```json\n{json.dumps(data, indent=2, ensure_ascii=False)}\n```\nLet me know if you need changes."
+    return text
+
+
+# --- Server ---
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    config = config or MockConfig()
+    app = FastAPI(title="Mock OpenRouter")
+    seen: Counter = Counter()
+    stats: Counter = Counter()
+
+    def draw(body: bytes) -> random.Random:
+        digest = hashlib.sha256(body).hexdigest()
+        seen[digest] += 1
+        return random.Random(f"{config.seed}:{digest}:{seen[digest]}")
+
+    def pick_fault(rng: random.Random) -> Optional[str]:
+        roll = rng.random()
+        for fault in ("429", "5xx", "truncated", "malformed", "fenced"):
+            rate = getattr(config, f"rate_{fault}")
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not JSON")
+        rng = draw(body)
+        fault = pick_fault(rng)
+        stats["requests"] += 1
+        stats[fault or "ok"] += 1
+        ttfb = rng.lognormvariate(math.log(max(config.ttfb, 1e-6)), config.ttfb_sigma) if config.ttfb > 0 else 0.0
+        if rng.random() < config.tail_rate:
+            ttfb += config.tail_latency
+
+        if fault == "429":
+            await asyncio.sleep(ttfb / 4)
+            return JSONResponse(
+                {"error": {"code": 429, "message": "Rate limit exceeded (mock)"}},
+                status_code=429, headers={"Retry-After": f"{config.retry_after:g}"},
+            )
+        if fault == "5xx":
+            await asyncio.sleep(ttfb)
+            status = rng.choice((500, 502, 503))
+            return JSONResponse({"error": {"code": status, "message": "Upstream error (mock)"}}, status_code=status)
+
+        messages = payload.get("messages", [])
+        content = render_content(fake_content(messages, rng), fault, rng)
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(str(m.get("content", ""))) for m in messages),
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"gen-mock-{rng.getrandbits(48):012x}"
+        model = payload.get("model", "mock/model")
+        finish_reason = "length" if fault == "truncated" else "stop"
+        generation_seconds = usage["completion_tokens"] / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if not payload.get("stream"):
+            await asyncio.sleep(ttfb + generation_seconds)
+            return {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+                "usage": usage,
+            }
+
+        async def events():
+            await asyncio.sleep(ttfb)
+            step = STREAM_CHUNK_TOKENS * 4  # Characters per chunk
+            chunks = [content[i:i + step] for i in range(0, len(content), step)]
+            for index, piece in enumerate(chunks):
+                delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(generation_seconds / len(chunks))
+            final = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/mock/config")
+    async def get_config():
+        return asdict(config)
+
+    @app.post("/mock/config")
+    async def set_config(request: Request):
+        try:
+            config.update(await request.json())
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        seen.clear()
+        return asdict(config)
+
+    @app.get("/mock/stats")
+    async def get_stats():
+        return dict(stats)
+
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve a deterministic mock of the OpenRouter chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    defaults = MockConfig()
+    for field in fields(MockConfig):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=int if field.name == "seed" else float,
+                            default=getattr(defaults, field.name))
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockConfig(**{field.name: getattr(args, field.name) for field in fields(MockConfig)})
+    print(f"Mock OpenRouter on http://{args.host}:{args.port}/api/v1/chat/completions", file=sys.stderr)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Serialization and compression cost of a lesson response.
+
+Builds a representative LessonGenerationResponse (about 3,000 words of Markdown,
+vocabulary and quiz) and times each way of turning it into response bytes,
+then the size and cost of compressing the result.
+
+Usage (from the repository root):
+    python benchmarks/serialization_benchmark.py [--words 3000] [--repeat 200]
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.app.models.lesson_models import LessonGenerationResponse, QuizItem, QuizOption, VocabularyItem
+from services.utils.compression import BROTLI_QUALITY, GZIP_LEVEL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = ("photosynthesis converts light energy into chemical energy stored in glucose while plants "
+         "release oxygen through small openings called stomata on the underside of their leaves").split()
+
+
+def sample_lesson(words: int) -> LessonGenerationResponse:
+    paragraphs = []
+    for index in range(0, words, 120):
+        text = " ".join(WORDS[(index + offset) % len(WORDS)] for offset in range(min(120, words - index)))
+        paragraphs.append(f"## Section {index // 120 + 1}\n\n{text.capitalize()}.")
+    quiz = []
+    for number in range(5):
+        options = [QuizOption(text=f"Answer {letter} to question {number + 1}") for letter in "ABCD"]
+        quiz.append(QuizItem(question=f"Question {number + 1} about photosynthesis?", options=options,
+                             correct_option_id=options[0].id))
+    return LessonGenerationResponse(
+        title="How Plants Make Their Food",
+        lesson_content="\n\n".join(paragraphs),
+        academic_grade="Grade 7",
+        subject="Biology",
+        teacher_style="Socratic",
+        word_count=words,
+        language="English",
+        summary="Plants use sunlight, water and carbon dioxide to make glucose and oxygen.",
+        vocabulary=[VocabularyItem(term=word, definition=f"Definition of {word}.") for word in WORDS[:10]],
+        quiz=quiz,
+    )
+
+
+def measure(func: Callable[[], bytes], repeat: int) -> Tuple[float, int]:
+    """Returns (microseconds per call, output size)."""
+    output = func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6, len(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=3000, help="Words of lesson content")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    lesson = sample_lesson(args.words)
+    serializers: List[Tuple[str, Callable[[], bytes]]] = [
+        # What FastAPI does without a response class override: encoder walk, then the stdlib json
+        ("jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(lesson), ensure_ascii=False,
+                                                       separators=(",", ":")).encode("utf-8")),
+        ("model_dump_json", lambda: lesson.model_dump_json().encode("utf-8")),
+        ("model_dump_json(exclude_none)", lambda: lesson.model_dump_json(exclude_none=True).encode("utf-8")),
+    ]
+    if orjson is not None:
+        serializers.append(("model_dump + orjson", lambda: orjson.dumps(lesson.model_dump(mode="json"))))
+        serializers.append(("model_dump(exclude_none) + orjson",
+                            lambda: orjson.dumps(lesson.model_dump(mode="json", exclude_none=True))))
+
+    print(f"Lesson with {args.words} words, {args.repeat} iterations\n")
+    print(f"{'serializer':<36} {'us/response':>12} {'bytes':>9}")
+    for name, func in serializers:
+        micros, size = measure(func, args.repeat)
+        print(f"{name:<36} {micros:>12.1f} {size:>9}")
+
+    body = lesson.model_dump_json(exclude_none=True).encode("utf-8")
+    codecs: List[Tuple[str, Callable[[], bytes]]] = [
+        ("identity", lambda: body),
+        (f"gzip (level {GZIP_LEVEL})", lambda: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)),
+    ]
+    if brotli is not None:
+        codecs.append((f"br (quality {BROTLI_QUALITY})", lambda: brotli.compress(body, quality=BROTLI_QUALITY)))
+
+    print(f"\n{'encoding':<36} {'us/response':>12} {'bytes':>9}")
+    for name, func in codecs:
+        micros, size = measure(func, args.repeat)
+        print(f"{name:<36} {micros:>12.1f} {size:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+JSON vs MessagePack vs CBOR for lesson payloads, on both sides of the wire.
+
+Encodes and decodes a single lesson (as returned by GET /api/lessons/{id}) and
+a page of lessons (GET /api/lessons?limit=50), starting from the serialized
+response model, which is what the response classes receive.
+
+Usage (from the repository root):
+    python benchmarks/wire_format_benchmark.py [--words 3000] [--page 50] [--repeat 200]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Any, Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.serialization_benchmark import measure, sample_lesson
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def codecs() -> List[Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    available = [("json (stdlib)", lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8"), json.loads)]
+    if orjson is not None:
+        available.append(("json (orjson)", orjson.dumps, orjson.loads))
+    if msgpack is not None:
+        available.append(("msgpack", lambda obj: msgpack.packb(obj, use_bin_type=True),
+                          lambda data: msgpack.unpackb(data, raw=False)))
+    if cbor2 is not None:
+        available.append(("cbor", cbor2.dumps, cbor2.loads))
+    return available
+
+
+def run(label: str, payload: Any, repeat: int) -> None:
+    print(f"\n{label}")
+    print(f"{'format':<16} {'encode us':>10} {'decode us':>10} {'bytes':>9}")
+    for name, encode, decode in codecs():
+        encode_micros, size = measure(lambda: encode(payload), repeat)
+        encoded = encode(payload)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decode(encoded)
+        decode_micros = (time.perf_counter() - start) / repeat * 1e6
+        print(f"{name:<16} {encode_micros:>10.1f} {decode_micros:>10.1f} {size:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=3000, help="Words of lesson content")
+    parser.add_argument("--page", type=int, default=50, help="Lessons per list page")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    lesson = sample_lesson(args.words).model_dump(mode="json", exclude_none=True)
+    run(f"One lesson ({args.words} words)", lesson, args.repeat)
+    run(f"Page of {args.page} lessons", [lesson] * args.page, max(1, args.repeat // args.page))
+    if msgpack is None or cbor2 is None:
+        print("\nInstall msgpack and cbor2 to compare the binary formats.")
+
+
+if __name__ == "__main__":
+    main()
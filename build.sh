@@ -4,4 +4,7 @@
 echo "Installing dependencies..."
 pip install -r requirements.txt
 
+echo "Building static assets..."
+python build_assets.py
+
 echo "Build completed successfully!" 
\ No newline at end of file
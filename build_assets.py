@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Build Assets - Fingerprint and pre-compress the files in public/.
+
+Writes build/static/ (or --build-dir): CSS/script/module bundles for index.html,
+every asset under its original and its content-hashed name, gzip/brotli
+variants, an index.html that references the hashed names, and
+asset-manifest.json. main.py serves this directory.
+"""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+from services.assets.pipeline import DEFAULT_BUILD_DIR, DEFAULT_SOURCE_DIR, build_assets
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fingerprint and pre-compress static assets")
+    parser.add_argument("--source-dir", type=Path, default=DEFAULT_SOURCE_DIR, help="Source assets (default: public/)")
+    parser.add_argument("--build-dir", type=Path, default=DEFAULT_BUILD_DIR, help="Output directory (default: build/static/)")
+    parser.add_argument("--no-bundle", action="store_true", help="Keep index.html's stylesheets and scripts as separate files")
+    args = parser.parse_args()
+
+    manifest = build_assets(args.source_dir, args.build_dir, bundle=not args.no_bundle)
+    compressed = sum(1 for entry in manifest["files"].values() if entry["encodings"])
+    print(f"Built {len(manifest['files'])} assets ({compressed} pre-compressed) into {args.build_dir}")
+    for bundle in manifest["bundles"].values():
+        print(f"  {bundle['path']}: {len(bundle['members'])} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -128,9 +128,9 @@ class AppRoot extends LitElement {
           // focus_topic: continuationPrompt, // Or parse from prompt
           user_prompt_addition: continuationPrompt, // Sending raw prompt for now
           // Include flags based on original lesson or continuation form
-          include_summary: this._lessonToContinue.summary !== null,
-          include_vocabulary: this._lessonToContinue.vocabulary !== null,
-          include_quiz: this._lessonToContinue.quiz !== null,
+          include_summary: this._lessonToContinue.summary != null,
+          include_vocabulary: this._lessonToContinue.vocabulary != null,
+          include_quiz: this._lessonToContinue.quiz != null,
       };
 
       try {
@@ -3,6 +3,16 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from routers import lesson # Import the lesson router
+from services.assets import PrecompressedStaticFiles, ensure_assets_built
+from services.assets.pipeline import DEFAULT_BUILD_DIR
+from services.utils.compression import CompressionMiddleware
+from services.utils.cancellation import DisconnectMiddleware
+from services.utils.tracing import TracingMiddleware
+from services.utils.profiling import ProfilingMiddleware
+from services.utils.loop_watchdog import LoopWatchdogMiddleware
+from services.utils.shared_state import run_once, worker_count
+from services.utils import metrics_endpoint
+from services.utils.structured_logging import configure_logging
 import uvicorn
 import logging
 import os # Import os for environment variables
@@ -12,14 +22,28 @@ import pathlib # To work with paths
 # Load .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configure logging: JSON lines (LOG_FORMAT=text for the classic format), written from a
+# background thread so the event loop never waits on stdout
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Define the path to the public directory (assuming main.py is in the root)
 PUBLIC_DIR = pathlib.Path(__file__).parent / "public"
 INDEX_HTML = PUBLIC_DIR / "index.html"
 
+# Serve the fingerprinted, pre-compressed build of public/ (see build_assets.py).
+# The build is refreshed at startup when public/ changed (by one worker when there are
+# several); set STATIC_BUILD_ON_STARTUP=false when build.sh already ran it.
+STATIC_DIR = pathlib.Path(os.getenv("STATIC_BUILD_DIR", DEFAULT_BUILD_DIR))
+try:
+    if os.getenv("STATIC_BUILD_ON_STARTUP", "true").lower() == "true":
+        bundle = os.getenv("STATIC_BUNDLE", "true").lower() == "true"
+        run_once("static-assets", lambda: ensure_assets_built(PUBLIC_DIR, STATIC_DIR, bundle=bundle))
+    if (STATIC_DIR / "index.html").exists():
+        INDEX_HTML = STATIC_DIR / "index.html"
+except Exception as e:
+    logger.error(f"Static asset build failed, serving public/ unprocessed: {e}", exc_info=True)
+
 app = FastAPI(
     title="EasyLesson API",
     description="API for generating and managing educational lessons",
@@ -35,12 +59,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for API responses above API_COMPRESSION_MIN_BYTES; pre-compressed static files pass through
+app.add_middleware(CompressionMiddleware)
+
+# Stop waiting on OpenRouter (and cancel the call if nobody else needs it) when the client disconnects
+app.add_middleware(DisconnectMiddleware)
+
+# Admin-only sampling profile of single requests (X-Profile + X-Admin-Token); a no-op otherwise
+app.add_middleware(ProfilingMiddleware)
+
+# Event loop lag metrics, and stacks of blocking callbacks with LOOP_WATCHDOG=true
+app.add_middleware(LoopWatchdogMiddleware)
+
+# Spans per request and generation stage, summarised in a Server-Timing header (outermost, so it times everything)
+app.add_middleware(TracingMiddleware)
+
+def static_files(**kwargs) -> StaticFiles:
+    """Pre-compressed, cache-friendly static files when a build exists, plain public/ otherwise."""
+    if INDEX_HTML.parent == STATIC_DIR:
+        return PrecompressedStaticFiles(directory=STATIC_DIR, **kwargs)
+    return StaticFiles(directory=PUBLIC_DIR, **kwargs)
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="public"), name="static")
+app.mount("/static", static_files(), name="static")
 
 # Include routers
 app.include_router(lesson.router, prefix="/api/lessons", tags=["lessons"])
 
+# Prometheus metrics (summed over all workers in multi-worker mode)
+app.include_router(metrics_endpoint.router)
+metrics_endpoint.start_worker_snapshots()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to EasyLesson API"}
@@ -48,7 +97,7 @@ async def root():
 # --- Static Files --- 
 # Mount the entire public directory to be served at the root
 # This will automatically handle requests for /js/app.js, /css/styles.css, etc.
-app.mount("/", StaticFiles(directory=PUBLIC_DIR, html=True), name="static-root")
+app.mount("/", static_files(html=True), name="static-root")
 
 # --- Catch-all for SPA --- 
 # This should come AFTER API routes and specific static file mounts (if any)
@@ -56,7 +105,7 @@ app.mount("/", StaticFiles(directory=PUBLIC_DIR, html=True), name="static-root")
 @app.get("/{full_path:path}", include_in_schema=False)
 async def serve_index(full_path: str):
     """Serve index.html for SPA routing"""
-    logger.info(f"Catch-all route triggered for path: {full_path}, serving index.html")
+    logger.debug(f"Catch-all route triggered for path: {full_path}, serving index.html")
     if INDEX_HTML.exists():
         return FileResponse(INDEX_HTML)
     else:
@@ -68,7 +117,9 @@ if __name__ == "__main__":
     # Render provides PORT, Uvicorn reads it automatically if passed via command line
     port = int(os.getenv("PORT", 8080))
     reload_flag = os.getenv("UVICORN_RELOAD", "false").lower() == "true"
+    workers = 1 if reload_flag else worker_count()
     
-    logger.info(f"Starting EasyStory combined server on port {port}... Reload: {reload_flag}")
-    # Render start command should be: uvicorn main:app --host 0.0.0.0 --port $PORT
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload_flag) 
\ No newline at end of file
+    logger.info(f"Starting EasyStory combined server on port {port}... Reload: {reload_flag}, Workers: {workers}")
+    # Render start command should be: ./start.sh (uvicorn main:app with WEB_CONCURRENCY workers)
+    # log_config=None keeps uvicorn's own logs on the queued handler set up above
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload_flag, workers=workers, log_config=None) 
\ No newline at end of file
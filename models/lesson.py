@@ -23,6 +23,10 @@ class QuizItem(BaseModel):
     options: List[str]
     correct_answer: int  # Index of the correct answer in options list
 
+class FieldNormalization(BaseModel):
+    original: str = Field(..., description="The value as it was sent")
+    canonical: str = Field(..., description="The canonical value that was used")
+
 class LessonGenerationResponse(BaseModel):
     id: Optional[str] = Field(None, description="Unique ID if saved") # Assuming ID generation/saving happens elsewhere
     title: str = Field(..., description="Generated title for the lesson")
@@ -35,6 +39,7 @@ class LessonGenerationResponse(BaseModel):
     vocabulary: Optional[List[VocabularyItem]] = Field(None, description="Generated vocabulary list, if requested")
     quiz: Optional[List[QuizItem]] = Field(None, description="Generated comprehension quiz, if requested")
     learning_objectives: Optional[List[str]] = Field(None, description="Potential learning objectives derived from the lesson")
+    normalization: Optional[Dict[str, FieldNormalization]] = Field(None, description="Request fields that were canonicalized before generation")
 
 class LessonContinuationRequest(BaseModel):
     original_lesson_content: Optional[str] = Field(None, description="Content of the original lesson to continue")
@@ -1,58 +1,45 @@
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, status, Depends, Path
 from models.lesson import LessonGenerationRequest, LessonGenerationResponse, LessonContinuationRequest, LessonContinuationResponse
-from services import generate_lesson_content, continue_lesson_content, parse_lesson_content
-from pydantic import BaseModel
-from typing import Optional
+from services import generate_lesson_content, continue_lesson_content
+from services.utils.content_negotiation import NegotiatedRoute
+from services.utils.responses import ROUTER_RESPONSE_CLASS
+from services.utils.fieldsets import fieldset_query, project, projected_response
 import logging
 
+# Mounted under /api/lessons in main.py
 router = APIRouter(
-    prefix="/lessons",
     tags=["lessons"],
+    default_response_class=ROUTER_RESPONSE_CLASS,
+    route_class=NegotiatedRoute,  # JSON, or MessagePack/CBOR per the Accept header
 )
 
 logger = logging.getLogger(__name__)
 
-class LessonRequest(BaseModel):
-    grade_level: str
-    subject: str
-    language: str = "en"
-    word_count: int = 500
-    generate_vocabulary: bool = True
-    generate_summary: bool = True
-    generate_quiz: bool = True
-    custom_elements: Optional[dict] = None
-
-class LessonContinuationRequest(BaseModel):
-    lesson_id: str
-    continuation_prompt: Optional[str] = None
-
 @router.post(
     "/generate",
     response_model=LessonGenerationResponse,
+    response_model_exclude_none=True,
     summary="Generate a new educational lesson",
     status_code=status.HTTP_201_CREATED, # Use 201 Created for successful POST
 )
-async def generate_lesson(request: LessonRequest):
-    """Generate a new educational lesson based on the provided parameters."""
+async def generate_lesson(
+    request: LessonGenerationRequest,
+    fields: Optional[List[str]] = Depends(fieldset_query(LessonGenerationResponse)),
+):
+    """Generate a new educational lesson based on the provided parameters (only the requested `fields`, if given)."""
+    logger.info(f"Generating lesson for grade {request.academic_grade} in {request.subject}")
     try:
-        logger.info(f"Generating lesson for grade {request.grade_level} in {request.subject}")
-        
-        # Generate the lesson content
-        lesson_content = generate_lesson_content(
-            grade_level=request.grade_level,
-            subject=request.subject,
-            language=request.language,
-            word_count=request.word_count,
-            generate_vocabulary=request.generate_vocabulary,
-            generate_summary=request.generate_summary,
-            generate_quiz=request.generate_quiz,
-            custom_elements=request.custom_elements
+        lesson = await generate_lesson_content(request)
+        if fields:
+            return projected_response(project(lesson, fields), status_code=status.HTTP_201_CREATED)
+        return lesson
+    except ValueError as ve:
+        logger.error(f"Validation error during lesson generation: {ve}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve),
         )
-        
-        # Parse the lesson content
-        parsed_lesson = parse_lesson_content(lesson_content)
-        
-        return parsed_lesson
     except Exception as e:
         logger.error(f"Error generating lesson: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -60,26 +47,29 @@ async def generate_lesson(request: LessonRequest):
 @router.post(
     "/{lesson_id}/continue",
     response_model=LessonContinuationResponse,
+    response_model_exclude_none=True,
     summary="Continue an existing educational lesson",
     status_code=status.HTTP_201_CREATED,
 )
-async def continue_lesson(request: LessonContinuationRequest):
+async def continue_lesson(
+    lesson_id: str = Path(..., description="The ID of the lesson to continue"),
+    request: LessonContinuationRequest = None,
+):
     """Continue an existing lesson with additional content."""
+    if request is None:
+        request = LessonContinuationRequest()  # Use defaults if no request body
+
+    logger.info(f"Continuing lesson {lesson_id}")
     try:
-        logger.info(f"Continuing lesson {request.lesson_id}")
-        
-        # Continue the lesson content
-        continued_content = continue_lesson_content(
-            lesson_id=request.lesson_id,
-            continuation_prompt=request.continuation_prompt
+        return await continue_lesson_content(lesson_id, request)
+    except ValueError as ve:
+        logger.error(f"Validation error during lesson continuation: {ve}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve),
         )
-        
-        # Parse the continued content
-        parsed_lesson = parse_lesson_content(continued_content)
-        
-        return parsed_lesson
     except Exception as e:
         logger.error(f"Error continuing lesson: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# You can add other lesson-related endpoints here (e.g., get, save, delete) later 
\ No newline at end of file
+# You can add other lesson-related endpoints here (e.g., get, save, delete) later
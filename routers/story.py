@@ -1,11 +1,15 @@
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, status, Depends, Path
 from models.story import StoryGenerationRequest, StoryGenerationResponse, StoryContinuationRequest, StoryContinuationResponse
 from services.story_generator import generate_story_content, continue_story_content
+from services.utils.responses import ROUTER_RESPONSE_CLASS
+from services.utils.fieldsets import fieldset_query, project, projected_response
 import logging
 
 router = APIRouter(
     prefix="/stories",
     tags=["stories"],
+    default_response_class=ROUTER_RESPONSE_CLASS,
 )
 
 logger = logging.getLogger(__name__)
@@ -13,19 +17,24 @@ logger = logging.getLogger(__name__)
 @router.post(
     "/generate",
     response_model=StoryGenerationResponse,
+    response_model_exclude_none=True,
     summary="Generate a new educational story",
     status_code=status.HTTP_201_CREATED, # Use 201 Created for successful POST
 )
 async def generate_new_story(
     request: StoryGenerationRequest,
+    fields: Optional[List[str]] = Depends(fieldset_query(StoryGenerationResponse)),
 ):
     """
     Takes story requirements and generates a new educational story using an LLM.
+    With `fields` (e.g. `fields=title,content` for the story grid), only those fields are returned.
     """
     logger.info(f"Received story generation request for subject: {request.subject}, grade: {request.academic_grade}")
     try:
         generated_story = await generate_story_content(request)
         logger.info(f"Successfully generated story titled: {generated_story.title}")
+        if fields:
+            return projected_response(project(generated_story, fields), status_code=status.HTTP_201_CREATED)
         return generated_story
     except ValueError as ve:
         logger.error(f"Validation error during story generation: {ve}")
@@ -43,6 +52,7 @@ async def generate_new_story(
 @router.post(
     "/{story_id}/continue",
     response_model=StoryContinuationResponse,
+    response_model_exclude_none=True,
     summary="Continue an existing educational story",
     status_code=status.HTTP_201_CREATED,
 )
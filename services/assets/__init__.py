@@ -0,0 +1,13 @@
+"""
+Static asset pipeline: fingerprinting, pre-compression and serving of public/.
+"""
+
+from services.assets.pipeline import build_assets, ensure_assets_built, load_manifest
+from services.assets.static_files import PrecompressedStaticFiles
+
+__all__ = [
+    'build_assets',
+    'ensure_assets_built',
+    'load_manifest',
+    'PrecompressedStaticFiles'
+]
@@ -0,0 +1,300 @@
+"""
+Bundles the assets referenced by index.html into a few files.
+
+- Local stylesheets are concatenated into bundles/styles.css.
+- Consecutive local classic scripts are concatenated into bundles/core.js.
+- The ES module graph reachable from the local module scripts is linked into
+  bundles/app.js: every module becomes a function scope that returns its
+  exports, in dependency order, so each module still runs exactly once.
+
+Modules the linker can't handle safely (import.meta, dynamic import, re-exports,
+import cycles) are left as separate files, together with everything they
+import, and the bundle imports them by URL (so they run before the bundled
+modules, as imported dependencies always do).
+
+No minification is done: the bundles are served pre-compressed, which removes
+most of what minifying whitespace and comments would save.
+"""
+
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from .references import CSS_REF_RE, JS_REF_RE, resolve_reference
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = "bundles"
+STYLES_BUNDLE = f"{BUNDLE_DIR}/styles.css"
+CLASSIC_BUNDLE = f"{BUNDLE_DIR}/core.js"
+MODULE_BUNDLE = f"{BUNDLE_DIR}/app.js"
+
+_IMPORT_RE = re.compile(
+    r"""^[ \t]*import\s+(?:(?P<clause>[\w*{}\s,$]+?)\s+from\s+)?(?P<q>['"])(?P<spec>[^'"\n]+)(?P=q)[ \t]*;?""",
+    re.MULTILINE,
+)
+_EXPORT_DECL_RE = re.compile(
+    r"^(?P<indent>[ \t]*)export\s+(?P<default>default\s+)?(?P<kind>(?:async\s+)?function\*?|class|const|let|var)\s+(?P<name>[\w$]+)",
+    re.MULTILINE,
+)
+_EXPORT_DEFAULT_EXPR_RE = re.compile(r"^(?P<indent>[ \t]*)export\s+default\s+", re.MULTILINE)
+_EXPORT_LIST_RE = re.compile(r"^[ \t]*export\s*\{(?P<names>[^}]*)\}[ \t]*;?[ \t]*$", re.MULTILINE)
+_UNSUPPORTED_RE = re.compile(r"\bimport\.meta\b|\bimport\s*\(|^[ \t]*export\s*\*|^[ \t]*export\s*\{[^}]*\}\s*from\b", re.MULTILINE)
+
+_STYLESHEET_RE = re.compile(r"""<link\b[^>]*\brel=["']stylesheet["'][^>]*>""", re.IGNORECASE)
+_SCRIPT_TAG_RE = re.compile(r"""<script\b(?P<attrs>[^>]*)>(?P<body>.*?)</script>""", re.IGNORECASE | re.DOTALL)
+_SRC_RE = re.compile(r"""\b(?:src|href)=["']([^"']+)["']""", re.IGNORECASE)
+
+
+@dataclass
+class _Module:
+    path: str
+    imports: List[Tuple[str, str]] = field(default_factory=list)   # (resolved path or URL, import clause)
+    exports: List[Tuple[str, str]] = field(default_factory=list)   # (exported name, local name)
+    body: str = ""
+
+
+def _parse_clause(clause: Optional[str]) -> Tuple[Optional[str], Optional[str], List[Tuple[str, str]]]:
+    """Splits an import clause into (default binding, namespace binding, [(imported, local)])."""
+    if not clause:
+        return None, None, []
+    default = namespace = None
+    named: List[Tuple[str, str]] = []
+    braces = re.search(r"\{([^}]*)\}", clause)
+    if braces:
+        for item in braces.group(1).split(","):
+            parts = item.split()
+            if len(parts) == 3 and parts[1] == "as":
+                named.append((parts[0], parts[2]))
+            elif len(parts) == 1:
+                named.append((parts[0], parts[0]))
+        clause = clause[:braces.start()] + clause[braces.end():]
+    for part in (p.strip() for p in clause.split(",")):
+        if part.startswith("*"):
+            namespace = part.split()[-1]
+        elif part:
+            default = part
+    return default, namespace, named
+
+
+def _destructure(source: str, clause: Optional[str]) -> str:
+    default, namespace, named = _parse_clause(clause)
+    lines = []
+    if namespace:
+        lines.append(f"const {namespace} = {source};")
+    if default:
+        lines.append(f"const {default} = {source}.default;")
+    if named:
+        bindings = ", ".join(name if name == local else f"{name}: {local}" for name, local in named)
+        lines.append(f"const {{ {bindings} }} = {source};")
+    return "\n".join(lines)
+
+
+def _parse_module(path: str, text: str) -> Optional[_Module]:
+    """Parses a module for linking; returns None if it uses syntax the linker doesn't support."""
+    if _UNSUPPORTED_RE.search(text):
+        return None
+    module = _Module(path)
+
+    def strip_import(match: re.Match) -> str:
+        spec = match.group("spec")
+        module.imports.append((resolve_reference(path, spec) or spec, match.group("clause")))
+        return ""
+
+    body = _IMPORT_RE.sub(strip_import, text)
+
+    def strip_declaration(match: re.Match) -> str:
+        name = match.group("name")
+        module.exports.append(("default" if match.group("default") else name, name))
+        return f"{match.group('indent')}{match.group('kind')} {name}"
+
+    body = _EXPORT_DECL_RE.sub(strip_declaration, body)
+
+    def strip_default(match: re.Match) -> str:
+        module.exports.append(("default", "__bundle_default__"))
+        return f"{match.group('indent')}const __bundle_default__ = "
+
+    body = _EXPORT_DEFAULT_EXPR_RE.sub(strip_default, body)
+
+    def strip_list(match: re.Match) -> str:
+        for item in match.group("names").split(","):
+            parts = item.split()
+            if len(parts) == 3 and parts[1] == "as":
+                module.exports.append((parts[2], parts[0]))
+            elif len(parts) == 1:
+                module.exports.append((parts[0], parts[0]))
+        return ""
+
+    module.body = _EXPORT_LIST_RE.sub(strip_list, body)
+    return module
+
+
+def link_modules(entries: List[str], contents: Dict[str, bytes]) -> Tuple[str, List[str]]:
+    """
+    Links the module graph reachable from ``entries`` into a single module.
+
+    Args:
+        entries: Asset paths of the entry modules, in execution order.
+        contents: All assets, {relpath: bytes}.
+
+    Returns:
+        Tuple of (bundle source, paths of the modules inlined into it).
+    """
+    parsed: Dict[str, Optional[_Module]] = {}
+    order: List[str] = []
+    stack: List[str] = []
+    excluded: Set[str] = set()
+
+    def visit(path: str) -> None:
+        if path in stack:
+            excluded.update(stack[stack.index(path):])
+            return
+        if path in parsed:
+            return
+        module = _parse_module(path, contents[path].decode("utf-8"))
+        parsed[path] = module
+        if module is None:
+            excluded.add(path)
+            return
+        stack.append(path)
+        for target, _ in module.imports:
+            if target in contents:
+                visit(target)
+        stack.pop()
+        order.append(path)
+
+    for entry in entries:
+        visit(entry)
+    # Modules imported by an excluded module must stay separate too, or they would run twice
+    excluded.update(_local_imports(excluded, contents))
+
+    inlined = [path for path in order if path not in excluded]
+    variables = {path: f"__bundle_m{index}__" for index, path in enumerate(inlined)}
+    externals: Dict[str, str] = {}
+    header: List[str] = []
+    sections: List[str] = []
+
+    def source_for(target: str) -> str:
+        if target in variables:
+            return variables[target]
+        url = f"/{target}" if target in contents else target
+        if url not in externals:
+            externals[url] = f"__bundle_ext{len(externals)}__"
+            header.append(f"import * as {externals[url]} from '{url}';")
+        return externals[url]
+
+    for path in inlined:
+        module = parsed[path]
+        preamble = [_destructure(source_for(target), clause) for target, clause in module.imports]
+        exports = ", ".join(f"{name}: {local}" if name != local else name for name, local in module.exports)
+        sections.append(
+            f"// {path}\nconst {variables[path]} = (() => {{\n"
+            + "\n".join(line for line in preamble if line)
+            + f"\n{module.body.strip()}\nreturn {{ {exports} }};\n}})();\n"
+        )
+    for entry in entries:
+        if entry in excluded:
+            source_for(entry)
+    if excluded:
+        logger.warning(f"Left {len(excluded)} module(s) out of {MODULE_BUNDLE}: {', '.join(sorted(excluded))}")
+    return "\n".join(header + [""] + sections), inlined
+
+
+def _local_imports(paths: Set[str], contents: Dict[str, bytes]) -> Set[str]:
+    """Local modules imported, directly or transitively, by ``paths``."""
+    found: Set[str] = set()
+    pending = list(paths)
+    while pending:
+        path = pending.pop()
+        for match in JS_REF_RE.finditer(contents[path].decode("utf-8")):
+            target = resolve_reference(path, match.group(3))
+            if target in contents and target not in paths and target not in found:
+                found.add(target)
+                pending.append(target)
+    return found
+
+
+def _concat_styles(paths: List[str], contents: Dict[str, bytes]) -> bytes:
+    """Concatenates stylesheets, making their relative url()/@import references absolute."""
+    parts = []
+    for path in paths:
+        def rebase(match: re.Match, path=path) -> str:
+            prefix, quote, reference = match.groups()
+            target = resolve_reference(path, reference)
+            return f"{prefix}{quote}/{target}{quote}" if target in contents else match.group(0)
+
+        parts.append(f"/* {path} */\n" + CSS_REF_RE.sub(rebase, contents[path].decode("utf-8")))
+    return "\n".join(parts).encode("utf-8")
+
+
+def _local_target(tag: str, contents: Dict[str, bytes]) -> Optional[str]:
+    match = _SRC_RE.search(tag)
+    target = resolve_reference("index.html", match.group(1)) if match else None
+    return target if target in contents else None
+
+
+def bundle_html(html: str, contents: Dict[str, bytes]) -> Tuple[str, Dict[str, bytes], Dict[str, List[str]]]:
+    """
+    Replaces the local stylesheets and scripts of an HTML page with bundles.
+
+    Args:
+        html: The page (index.html).
+        contents: All assets, {relpath: bytes}.
+
+    Returns:
+        Tuple of (rewritten page, {bundle path: bytes}, {bundle path: bundled asset paths}).
+    """
+    bundles: Dict[str, bytes] = {}
+    members: Dict[str, List[str]] = {}
+    replacements: List[Tuple[str, str]] = []   # (original tag, replacement), applied in order
+
+    def replace_tags(tags: List[str], bundle_path: str, new_tag: str, paths: List[str], content: bytes) -> None:
+        if len(paths) < 2:  # Nothing to gain from a bundle of one file
+            return
+        bundles[bundle_path] = content
+        members[bundle_path] = paths
+        replacements.append((tags[0], new_tag))
+        replacements.extend((tag, "") for tag in tags[1:])
+
+    stylesheets = [(tag, _local_target(tag, contents)) for tag in _STYLESHEET_RE.findall(html)]
+    stylesheets = [(tag, path) for tag, path in stylesheets if path and "media=" not in tag.lower()]
+    replace_tags(
+        [tag for tag, _ in stylesheets], STYLES_BUNDLE, f'<link rel="stylesheet" href="/{STYLES_BUNDLE}">',
+        [path for _, path in stylesheets], _concat_styles([path for _, path in stylesheets], contents),
+    )
+
+    # Classic scripts: only the first run of consecutive local scripts, so execution order is unchanged
+    classic_run: List[Tuple[str, str]] = []
+    classic_run_ended = False
+    module_tags: List[Tuple[str, str]] = []
+    for match in _SCRIPT_TAG_RE.finditer(html):
+        tag, attrs = match.group(0), match.group("attrs").lower()
+        path = _local_target(f"<script{match.group('attrs')}>", contents) if "src=" in attrs else None
+        if "module" in attrs:
+            if path:
+                module_tags.append((tag, path))
+            continue
+        bundleable = path and "async" not in attrs and "defer" not in attrs \
+            and not contents[path].lstrip().startswith((b"'use strict'", b'"use strict"'))
+        if bundleable and not classic_run_ended:
+            classic_run.append((tag, path))
+        elif classic_run:
+            classic_run_ended = True
+    replace_tags(
+        [tag for tag, _ in classic_run], CLASSIC_BUNDLE, f'<script src="/{CLASSIC_BUNDLE}"></script>',
+        [path for _, path in classic_run],
+        b"\n;\n".join(f"/* {path} */\n".encode() + contents[path] for _, path in classic_run),
+    )
+
+    if module_tags:
+        source, inlined = link_modules([path for _, path in module_tags], contents)
+        if inlined:
+            replace_tags(
+                [tag for tag, _ in module_tags], MODULE_BUNDLE,
+                f'<script type="module" src="/{MODULE_BUNDLE}"></script>', inlined, source.encode("utf-8"),
+            )
+
+    for original, replacement in replacements:
+        html = html.replace(original, replacement, 1)
+    return html, bundles, members
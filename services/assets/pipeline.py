@@ -0,0 +1,226 @@
+"""
+Static asset pipeline for the files in public/.
+
+Builds a copy of public/ in which the stylesheets and scripts of index.html are
+bundled (bundler.py) and every asset also exists under a content-fingerprinted
+name (css/base.3f2a9c1e0b.css), with gzip and brotli variants next to each
+compressible file. References between assets (ES module
+imports, CSS url()/@import) and in index.html are rewritten to the fingerprinted
+names, so everything but index.html can be cached forever.
+"""
+
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import posixpath
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from .bundler import bundle_html
+from .references import reference_pattern, resolve_reference
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; only gzip variants are produced without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_SOURCE_DIR = PROJECT_ROOT / "public"
+DEFAULT_BUILD_DIR = PROJECT_ROOT / "build" / "static"
+MANIFEST_NAME = "asset-manifest.json"
+ENTRY_HTML = "index.html"
+
+HASH_LENGTH = 10
+COMPRESSIBLE_SUFFIXES = {".js", ".mjs", ".css", ".html", ".json", ".svg", ".txt", ".map"}
+MIN_COMPRESS_BYTES = 512
+IGNORED_SUFFIXES = {".bak", ".orig", ".swp"}
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+_FINGERPRINT_RE = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}(?=\.[^.]+$)")
+
+
+def is_fingerprinted(path: str) -> bool:
+    """Whether a path has the <name>.<hash>.<ext> form produced by the pipeline."""
+    return bool(_FINGERPRINT_RE.search(path))
+
+
+def fingerprinted_name(relpath: str, digest: str) -> str:
+    stem, ext = posixpath.splitext(relpath)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def source_digest(source_dir: Path) -> str:
+    """Cheap fingerprint of the source tree (paths, sizes, mtimes) used to detect stale builds."""
+    digest = hashlib.sha256()
+    for path in sorted(_iter_sources(source_dir)):
+        stat = (source_dir / path).stat()
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _iter_sources(source_dir: Path) -> List[str]:
+    sources = []
+    for path in source_dir.rglob("*"):
+        relpath = path.relative_to(source_dir).as_posix()
+        if path.is_file() and not any(part.startswith(".") for part in path.parts) \
+                and path.suffix not in IGNORED_SUFFIXES and not is_fingerprinted(relpath):
+            sources.append(relpath)
+    return sources
+
+
+class _Build:
+    """
+    Fingerprints the assets of one build in dependency order.
+
+    Files in an import cycle can't be named after a hash that covers each
+    other's names, so they keep their original (revalidated) names. That also
+    keeps each module loaded under a single URL, which custom elements need.
+    """
+
+    def __init__(self, contents: Dict[str, bytes]):
+        self.contents = contents
+        self.hashed: Dict[str, str] = {}      # relpath -> fingerprinted relpath
+        self.digests: Dict[str, str] = {}
+        self.cyclic: Set[str] = set()
+        self._stack: List[str] = []
+
+    def rewrite(self, relpath: str) -> bytes:
+        """Rewrites the references of a file to the fingerprinted names of already processed assets."""
+        content = self.contents[relpath]
+        pattern = reference_pattern(relpath)
+        if pattern is None:
+            return content
+        text = content.decode("utf-8")
+
+        def replace(match: re.Match) -> str:
+            prefix, quote, reference = match.groups()
+            target = resolve_reference(relpath, reference)
+            if target not in self.contents or target == relpath:
+                return match.group(0)
+            self.process(target)
+            if target not in self.hashed:  # Part of an import cycle
+                return match.group(0)
+            basename = posixpath.basename(target)
+            if reference.endswith(basename):  # Keep the reference's own (relative or absolute) form
+                hashed_reference = reference[:-len(basename)] + posixpath.basename(self.hashed[target])
+            else:
+                hashed_reference = "/" + self.hashed[target]
+            return f"{prefix}{quote}{hashed_reference}{quote}"
+
+        return pattern.sub(replace, text).encode("utf-8")
+
+    def process(self, relpath: str) -> None:
+        if relpath in self.digests:
+            return
+        if relpath in self._stack:
+            self.cyclic.update(self._stack[self._stack.index(relpath):])
+            return
+        self._stack.append(relpath)
+        content = self.rewrite(relpath)
+        self._stack.pop()
+        self.contents[relpath] = content
+        digest = hashlib.sha256(content).hexdigest()
+        self.digests[relpath] = digest
+        if relpath != ENTRY_HTML and relpath not in self.cyclic:
+            self.hashed[relpath] = fingerprinted_name(relpath, digest)
+
+
+def _compressed_variants(relpath: str, content: bytes) -> Dict[str, bytes]:
+    if posixpath.splitext(relpath)[1] not in COMPRESSIBLE_SUFFIXES or len(content) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, quality=11)
+    # Only keep variants that are actually smaller
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def build_assets(source_dir: Path = DEFAULT_SOURCE_DIR, build_dir: Path = DEFAULT_BUILD_DIR, bundle: bool = True) -> dict:
+    """
+    Builds the fingerprinted, pre-compressed copy of ``source_dir`` into ``build_dir``.
+
+    Each asset is written under its original name and its fingerprinted name,
+    plus .gz/.br variants. The build happens in a temporary directory that then
+    replaces ``build_dir``, so a running server never sees a half-written tree.
+
+    Args:
+        source_dir: Directory with the source assets (public/).
+        build_dir: Output directory.
+        bundle: Whether to replace the stylesheets and scripts of index.html
+            with bundles (see bundler.py).
+
+    Returns:
+        The manifest; its "files" map every asset to {"path", "hash", "encodings"}
+        and its "bundles" map every bundle to the assets it contains.
+    """
+    contents = {path: (source_dir / path).read_bytes() for path in _iter_sources(source_dir)}
+    bundle_members: Dict[str, List[str]] = {}
+    if bundle and ENTRY_HTML in contents:
+        html, bundles, bundle_members = bundle_html(contents[ENTRY_HTML].decode("utf-8"), contents)
+        contents.update(bundles)
+        contents[ENTRY_HTML] = html.encode("utf-8")
+
+    build = _Build(contents)
+    for relpath in sorted(build.contents):
+        build.process(relpath)
+    if build.cyclic:
+        logger.warning(f"Not fingerprinting {len(build.cyclic)} asset(s) in import cycles: {', '.join(sorted(build.cyclic))}")
+
+    tmp_dir = build_dir.with_name(f"{build_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    files: Dict[str, dict] = {}
+    for relpath, content in build.contents.items():
+        variants = _compressed_variants(relpath, content)
+        names = {relpath, build.hashed.get(relpath, relpath)}
+        for name in names:
+            target = tmp_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+            for encoding, data in variants.items():
+                target.with_name(target.name + ENCODING_SUFFIXES[encoding]).write_bytes(data)
+        files[relpath] = {
+            "path": build.hashed.get(relpath, relpath),
+            "hash": build.digests[relpath][:16],
+            "encodings": sorted(variants),
+        }
+
+    manifest = {
+        "source_digest": source_digest(source_dir),
+        "bundled": bundle,
+        "files": files,
+        "bundles": {path: {"path": files[path]["path"], "members": members} for path, members in bundle_members.items()},
+    }
+    (tmp_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    _swap_into_place(tmp_dir, build_dir)
+    logger.info(f"Built {len(files)} static asset(s) into {build_dir}")
+    return manifest
+
+
+def _swap_into_place(tmp_dir: Path, build_dir: Path) -> None:
+    old_dir = build_dir.with_name(f"{build_dir.name}.old-{os.getpid()}")
+    if build_dir.exists():
+        os.replace(build_dir, old_dir)
+    os.replace(tmp_dir, build_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_manifest(build_dir: Path = DEFAULT_BUILD_DIR) -> Optional[dict]:
+    try:
+        return json.loads((build_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_assets_built(source_dir: Path = DEFAULT_SOURCE_DIR, build_dir: Path = DEFAULT_BUILD_DIR, bundle: bool = True) -> dict:
+    """Returns the current manifest, rebuilding first if ``source_dir`` or the bundling setting changed since the last build."""
+    manifest = load_manifest(build_dir)
+    if manifest is None or manifest.get("source_digest") != source_digest(source_dir) \
+            or manifest.get("bundled") != bundle:
+        manifest = build_assets(source_dir, build_dir, bundle)
+    return manifest
@@ -0,0 +1,36 @@
+"""
+Finding and resolving references between static assets.
+"""
+
+import re
+import posixpath
+from typing import Optional
+
+# Static references inside JS modules: import ... from '...', import '...', export ... from '...', import('...')
+JS_REF_RE = re.compile(r"""(\bimport\s*(?:[\w*{}\s,$]+\s*from\s*)?\(?\s*|\bexport\s*[\w*{}\s,$]+\s*from\s*)(['"])([^'"\n]+)\2""")
+CSS_REF_RE = re.compile(r"""(url\(\s*|@import\s+)(['"]?)([^'")\s]+)\2""")
+HTML_REF_RE = re.compile(r"""(\s(?:src|href)\s*=\s*)(['"])([^'"]+)\2""", re.IGNORECASE)
+
+
+def reference_pattern(relpath: str) -> Optional[re.Pattern]:
+    """The pattern matching references in a file of this type; groups are (prefix, quote, reference)."""
+    suffix = posixpath.splitext(relpath)[1]
+    if suffix in (".js", ".mjs"):
+        return JS_REF_RE
+    if suffix == ".css":
+        return CSS_REF_RE
+    if suffix == ".html":
+        return HTML_REF_RE
+    return None
+
+
+def resolve_reference(from_relpath: str, reference: str) -> Optional[str]:
+    """Maps a URL found in ``from_relpath`` onto a path relative to the asset root, or None if external."""
+    if reference.startswith(("http:", "https:", "data:", "//", "#", "mailto:")) or "${" in reference:
+        return None
+    reference = reference.split("#", 1)[0].split("?", 1)[0]
+    if not reference:
+        return None
+    if reference.startswith("/"):
+        return posixpath.normpath(reference.lstrip("/"))
+    return posixpath.normpath(posixpath.join(posixpath.dirname(from_relpath), reference))
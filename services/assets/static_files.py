@@ -0,0 +1,77 @@
+import os
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from services.utils.compression import choose_encoding
+
+from .pipeline import ENCODING_SUFFIXES, load_manifest
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles for a directory built by services.assets.pipeline.
+
+    Serves the .br/.gz variant of a file when the client accepts it (with
+    Vary: Accept-Encoding), uses the content hash from the asset manifest as a
+    strong ETag per representation, and marks fingerprinted files immutable.
+    Everything else, notably index.html, is revalidated on every use.
+    """
+
+    def __init__(self, *, directory: Path, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.root = Path(directory).resolve()
+        self.reload_manifest()
+
+    def reload_manifest(self) -> None:
+        manifest = load_manifest(self.root) or {"files": {}}
+        self.entries: Dict[str, dict] = {}
+        self.fingerprinted = set()
+        for relpath, entry in manifest["files"].items():
+            self.entries[relpath] = entry
+            self.entries[entry["path"]] = entry
+            if entry["path"] != relpath:
+                self.fingerprinted.add(entry["path"])
+        logger.info(f"Loaded asset manifest with {len(manifest['files'])} file(s) from {self.root}")
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        relpath = Path(full_path).resolve().relative_to(self.root).as_posix()
+        entry = self.entries.get(relpath)
+        if entry is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""), entry["encodings"])
+        served_path = f"{full_path}{ENCODING_SUFFIXES[encoding]}" if encoding else full_path
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        response = FileResponse(served_path, status_code=status_code, media_type=media_type,
+                                stat_result=os.stat(served_path) if encoding else stat_result)
+
+        response.headers["etag"] = f'"{entry["hash"]}-{encoding or "identity"}"'
+        response.headers["cache-control"] = (
+            IMMUTABLE_CACHE_CONTROL if relpath in self.fingerprinted else REVALIDATE_CACHE_CONTROL
+        )
+        if entry["encodings"]:
+            response.headers["vary"] = "Accept-Encoding"
+        if encoding:
+            response.headers["content-encoding"] = encoding
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -14,7 +14,9 @@ from services.lesson.parser import (
     extract_continuation_content
 )
 import logging
+from services.llm.instrumentation import generation, stage
 
+@generation("lesson_continuation")
 async def continue_lesson_content(lesson_id: str, request: LessonContinuationRequest) -> LessonContinuationResponse:
     """
     Generate a continuation for an existing educational lesson.
@@ -35,8 +37,9 @@ async def continue_lesson_content(lesson_id: str, request: LessonContinuationReq
         raise ValueError("Original lesson content must be provided if lesson retrieval is not implemented.")
         
     # Build the prompt and schema for the LLM
-    prompt, output_format_description = build_continuation_prompt(lesson_id, request)
-    system_prompt = get_system_prompt(output_format_description)
+    with stage("prompt_build"):
+        prompt, output_format_description = build_continuation_prompt(lesson_id, request)
+        system_prompt = get_system_prompt(output_format_description)
     
     # Generate content using the LLM
     result_json_str = await generate_content(
@@ -47,10 +50,11 @@ async def continue_lesson_content(lesson_id: str, request: LessonContinuationReq
     
     # Parse and validate the response
     generated_data = parse_json_response(result_json_str)
-    validate_continuation_response(generated_data)
-    
-    # Extract content from the response
-    continuation_text, word_count, vocabulary_list, summary, quiz = extract_continuation_content(generated_data)
+    with stage("validate"):
+        validate_continuation_response(generated_data)
+        
+        # Extract content from the response
+        continuation_text, word_count, vocabulary_list, summary, quiz = extract_continuation_content(generated_data)
     
     # Debug response data
     logger = logging.getLogger(__name__)
@@ -59,16 +63,17 @@ async def continue_lesson_content(lesson_id: str, request: LessonContinuationReq
     logger.info(f"Quiz questions: {len(quiz) if quiz else 0}")
     
     # Build the final response object
-    response = LessonContinuationResponse(
-        lesson_id=lesson_id,
-        continuation_text=continuation_text,
-        word_count=word_count,
-        difficulty=request.difficulty,
-        focus=request.focus or "general",
-        vocabulary=vocabulary_list,
-        summary=summary,
-        quiz=quiz
-    )
+    with stage("validate"):
+        response = LessonContinuationResponse(
+            lesson_id=lesson_id,
+            continuation_text=continuation_text,
+            word_count=word_count,
+            difficulty=request.difficulty,
+            focus=request.focus or "general",
+            vocabulary=vocabulary_list,
+            summary=summary,
+            quiz=quiz
+        )
     
     # Verify response structure
     logger.info(f"Response structure check: vocabulary={response.vocabulary is not None}, quiz={response.quiz is not None}")
@@ -8,12 +8,16 @@ the LLM client and prompt generators.
 from models.lesson import LessonGenerationRequest, LessonGenerationResponse
 from services.llm.client import generate_content
 from services.llm.prompting import build_lesson_generation_prompt, get_system_prompt
+from services.utils.validators import canonical_request_key, canonicalize_request_fields
+from services.llm.instrumentation import generation, stage
+from services.llm.usage_ledger import label_usage
 from services.lesson.parser import (
     parse_json_response, 
     validate_lesson_response,
     extract_lesson_content
 )
 
+@generation("lesson")
 async def generate_lesson_content(request: LessonGenerationRequest) -> LessonGenerationResponse:
     """
     Generate a complete educational lesson based on the provided parameters.
@@ -28,36 +32,45 @@ async def generate_lesson_content(request: LessonGenerationRequest) -> LessonGen
         ValueError: For validation or parsing errors
         Exception: For API or network errors
     """
+    # Canonicalize free-form fields so identical requests produce identical prompts
+    canonical_fields, normalization = canonicalize_request_fields(request.model_dump())
+    request = request.model_copy(update=canonical_fields)
+    label_usage(subject=request.subject)
+
     # Build the prompt and schema for the LLM
-    prompt, output_format_description = build_lesson_generation_prompt(request)
-    system_prompt = get_system_prompt(output_format_description)
+    with stage("prompt_build"):
+        prompt, output_format_description = build_lesson_generation_prompt(request)
+        system_prompt = get_system_prompt(output_format_description)
     
     # Generate content using the LLM
     result_json_str = await generate_content(
         system_prompt=system_prompt,
         user_prompt=prompt,
-        timeout=90.0  # Longer timeout for lesson generation
+        timeout=90.0,  # Longer timeout for lesson generation
+        request_key=canonical_request_key(request.model_dump())
     )
     
     # Parse and validate the response
     generated_data = parse_json_response(result_json_str)
-    validate_lesson_response(generated_data)
-    
-    # Extract content from the response
-    lesson_content, word_count, vocabulary_list, quiz_list = extract_lesson_content(
-        generated_data, request
-    )
-    
-    # Build the final response object
-    return LessonGenerationResponse(
-        title=generated_data.get("title", "Generated Lesson"),
-        content=lesson_content,
-        academic_grade=request.academic_grade,
-        subject=request.subject,
-        word_count=word_count,
-        language=request.language,
-        summary=generated_data.get("summary") if request.generate_summary else None,
-        vocabulary=vocabulary_list,
-        quiz=quiz_list,
-        learning_objectives=generated_data.get("learning_objectives")
-    ) 
\ No newline at end of file
+    with stage("validate"):
+        validate_lesson_response(generated_data)
+        
+        # Extract content from the response
+        lesson_content, word_count, vocabulary_list, quiz_list = extract_lesson_content(
+            generated_data, request
+        )
+        
+        # Build the final response object
+        return LessonGenerationResponse(
+            title=generated_data.get("title", "Generated Lesson"),
+            content=lesson_content,
+            academic_grade=request.academic_grade,
+            subject=request.subject,
+            word_count=word_count,
+            language=request.language,
+            summary=generated_data.get("summary") if request.generate_summary else None,
+            vocabulary=vocabulary_list,
+            quiz=quiz_list,
+            learning_objectives=generated_data.get("learning_objectives"),
+            normalization=normalization or None
+        ) 
\ No newline at end of file
@@ -6,8 +6,13 @@ for lesson generation and continuation.
 """
 
 import json
+import logging
 from typing import Dict, Any, List, Optional, Tuple
 from models.lesson import VocabularyItem, QuizItem, LessonGenerationRequest
+from services.llm.instrumentation import PARSE_FAILURES, stage, strip_code_fences
+from services.utils.structured_logging import truncate
+
+logger = logging.getLogger(__name__)
 
 def parse_json_response(json_str: str) -> Dict[str, Any]:
     """
@@ -22,18 +27,14 @@ def parse_json_response(json_str: str) -> Dict[str, Any]:
     Raises:
         ValueError: If the JSON is invalid
     """
-    try:
-        # Fix common JSON issues
-        cleaned_json_str = json_str.strip()
-        # If the string is wrapped in code block markers, remove them
-        if cleaned_json_str.startswith("```json") and cleaned_json_str.endswith("```"):
-            cleaned_json_str = cleaned_json_str[7:-3].strip()
-        elif cleaned_json_str.startswith("```") and cleaned_json_str.endswith("```"):
-            cleaned_json_str = cleaned_json_str[3:-3].strip()
-        
-        return json.loads(cleaned_json_str)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON response from LLM: {e}") from e
+    with stage("parse"):
+        try:
+            # Fix common JSON issues (code block markers around the JSON)
+            cleaned_json_str = strip_code_fences(json_str)
+            return json.loads(cleaned_json_str)
+        except json.JSONDecodeError as e:
+            PARSE_FAILURES.inc()
+            raise ValueError(f"Invalid JSON response from LLM: {e}") from e
 
 def validate_lesson_response(data: Dict[str, Any]) -> None:
     """
@@ -105,7 +106,8 @@ def parse_vocabulary(vocab_data: Any) -> Optional[List[VocabularyItem]]:
         
         return vocabulary_list if vocabulary_list else None
     except Exception as e:
-        print(f"Warning: Could not parse vocabulary list: {e}")
+        logger.warning(f"Could not parse vocabulary list: {e}")
+        logger.debug("Vocabulary data: %s", truncate(vocab_data))
         return None
 
 def parse_quiz(quiz_data: Any) -> Optional[List[QuizItem]]:
@@ -134,7 +136,8 @@ def parse_quiz(quiz_data: Any) -> Optional[List[QuizItem]]:
         
         return quiz_list if quiz_list else None
     except Exception as e:
-        print(f"Warning: Could not parse quiz list: {e}")
+        logger.warning(f"Could not parse quiz list: {e}")
+        logger.debug("Quiz data: %s", truncate(quiz_data))
         return None
 
 def calculate_word_count(text: str) -> int:
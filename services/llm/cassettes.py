@@ -0,0 +1,201 @@
+"""
+Record and replay of real OpenRouter exchanges ("cassettes").
+
+With LLM_CASSETTE_MODE=record, post_completion writes each exchange to a
+cassette in LLM_CASSETTE_DIR (default data/cassettes). An exchange is the
+request payload plus the response status, a few headers, the body, the time
+to first byte and the total time. Cassettes are gzipped JSON lines, one file
+per worker process. The Authorization header is never stored, and any
+configured API key found in a payload or body is replaced with
+``[REDACTED]``.
+
+With LLM_CASSETTE_MODE=replay, no request leaves the process. Each request
+is answered from the recorded exchanges, with the recorded timing multiplied
+by LLM_CASSETTE_TIME_SCALE (0 answers at once). The recording is looked up
+by the exact payload, or else by the same model and system prompt, so
+requests that differ only in their user prompt still get realistic
+responses. Several recordings for one request are served in turn, so a 429
+followed by a success replays that way. A request with no recording fails
+like an unreachable server.
+
+Real responses keep the quirks of real models: fenced JSON, string
+``correct_answer`` values, oversized lists. benchmarks/cassette_benchmark.py
+times parsing, repair and validation over them, and replay mode runs whole
+pipelines or production incidents again offline.
+"""
+
+import os
+import gzip
+import atexit
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CASSETTE_DIR = Path(__file__).parent.parent.parent / "data" / "cassettes"
+# Response headers worth keeping: rate limiting and content type
+RECORDED_HEADERS = ("content-type", "retry-after", "x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset")
+REDACTED = "[REDACTED]"
+
+
+def payload_key(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _system_key(payload: Dict[str, Any]) -> str:
+    system = next((m.get("content", "") for m in payload.get("messages", []) if m.get("role") == "system"), "")
+    return hashlib.sha256(f"{payload.get('model')}\n{system}".encode("utf-8")).hexdigest()
+
+
+def read_cassettes(path: Path) -> Iterator[Dict[str, Any]]:
+    """The exchanges in a cassette file, or in every cassette of a directory (oldest first)."""
+    files = sorted(path.glob("*.jsonl.gz"), key=lambda f: f.stat().st_mtime) if path.is_dir() else [path]
+    for file in files:
+        try:
+            with gzip.open(file, "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            # A worker killed mid-write leaves a truncated last entry; the rest is still good
+            logger.warning(f"Stopped reading cassette {file.name} early: {e}")
+
+
+class _ReplayBody(httpx.AsyncByteStream):
+    """A recorded body, delivered after the recorded time between first byte and end."""
+
+    def __init__(self, body: bytes, delay: float):
+        self.body = body
+        self.delay = delay
+
+    async def __aiter__(self):
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        yield self.body
+
+
+class CassetteStore:
+    def __init__(self, mode: str = "off", directory: Optional[str] = None, time_scale: float = 1.0):
+        self.mode = mode if mode in ("record", "replay") else "off"
+        self.directory = Path(directory or DEFAULT_CASSETTE_DIR)
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._file = None
+        self._exact: Dict[str, List[Dict[str, Any]]] = {}
+        self._similar: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self._loaded = False
+        if mode not in ("off", "record", "replay", ""):
+            logger.warning(f"Unknown LLM_CASSETTE_MODE '{mode}'; cassettes are off")
+
+    @classmethod
+    def from_env(cls) -> "CassetteStore":
+        return cls(
+            os.getenv("LLM_CASSETTE_MODE", "off").lower(),
+            os.getenv("LLM_CASSETTE_DIR"),
+            float(os.getenv("LLM_CASSETTE_TIME_SCALE", "1.0")),
+        )
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # --- Replay ---
+
+    def load(self, exchanges: Iterable[Dict[str, Any]]) -> int:
+        self._loaded = True
+        count = 0
+        for exchange in exchanges:
+            self._exact.setdefault(exchange["key"], []).append(exchange)
+            self._similar.setdefault(_system_key(exchange["request"]), []).append(exchange)
+            count += 1
+        return count
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        count = self.load(read_cassettes(self.directory)) if self.directory.exists() else 0
+        logger.info(f"Replaying {count} recorded LLM exchange(s) from {self.directory}")
+
+    def find(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The next recording for the payload (exact match first, then same model and system prompt)."""
+        self._ensure_loaded()
+        for index, key in ((self._exact, payload_key(payload)), (self._similar, _system_key(payload))):
+            candidates = index.get(key)
+            if candidates:
+                turn = self._served.get(key, 0)
+                self._served[key] = turn + 1
+                return candidates[turn % len(candidates)]
+        return None
+
+    async def replay(self, request: httpx.Request, payload: Dict[str, Any]) -> httpx.Response:
+        exchange = self.find(payload)
+        if exchange is None:
+            raise httpx.ConnectError("No recorded LLM exchange matches this request", request=request)
+        await asyncio.sleep(exchange["ttfb"] * self.time_scale)
+        body = exchange["body"].encode("utf-8")
+        return httpx.Response(
+            exchange["status"], headers=exchange["headers"], request=request,
+            stream=_ReplayBody(body, max(0.0, exchange["total"] - exchange["ttfb"]) * self.time_scale),
+        )
+
+    async def send(self, client: httpx.AsyncClient, request: httpx.Request, payload: Dict[str, Any]) -> httpx.Response:
+        """Sends the request (streamed, unread), or answers it from the cassettes when replaying."""
+        if self.replaying:
+            return await self.replay(request, payload)
+        return await client.send(request, stream=True)
+
+    # --- Record ---
+
+    def record(
+        self, payload: Dict[str, Any], response: httpx.Response, ttfb: float, total: float, secrets: Iterable[str] = ()
+    ) -> None:
+        """Appends an exchange whose response has been read (when recording)."""
+        if self.mode != "record":
+            return
+        request_json = json.dumps(payload, ensure_ascii=False)
+        body = response.text
+        for secret in secrets:
+            request_json = request_json.replace(secret, REDACTED)
+            body = body.replace(secret, REDACTED)
+        payload = json.loads(request_json)
+        exchange = {
+            "key": payload_key(payload),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "request": payload,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "body": body,
+            "ttfb": round(ttfb, 4),
+            "total": round(total, 4),
+        }
+        line = json.dumps(exchange, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self._file is None:
+                    self.directory.mkdir(parents=True, exist_ok=True)
+                    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl.gz"
+                    self._file = gzip.open(self.directory / name, "at", encoding="utf-8")
+                    atexit.register(self.close)  # Writes the gzip trailer
+                    logger.info(f"Recording LLM exchanges to {self.directory / name}")
+                self._file.write(line)
+                self._file.flush()  # A sync flush: everything written so far is readable
+        except OSError as e:
+            logger.warning(f"Could not record LLM exchange in {self.directory}: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+cassettes = CassetteStore.from_env()
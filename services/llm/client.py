@@ -8,27 +8,32 @@ which gives access to various LLM models.
 import os
 import json
 import httpx
+import logging
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+from services.utils.cancellation import call_key, shared_llm_call
+from services.llm.key_pool import key_pool, post_completion
+from services.llm.usage_ledger import usage_ledger
+from services.utils.structured_logging import truncate
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
 # API settings
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-001")
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")  # Or benchmarks/mock_openrouter.py
 
 def get_api_key() -> str:
-    """Get the API key and validate it exists."""
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY environment variable not set.")
-    return OPENROUTER_API_KEY
+    """Get the first API key of the pool and validate one exists."""
+    return key_pool.require_keys()[0]
 
 def get_headers() -> Dict[str, str]:
-    """Build the common headers needed for API requests."""
+    """Build the common headers needed for API requests (post_completion adds the pool key's Authorization)."""
+    key_pool.require_keys()
     return {
-        "Authorization": f"Bearer {get_api_key()}",
         "Content-Type": "application/json",
         "HTTP-Referer": "http://localhost",  # Optional, replace with your site URL
         "X-Title": "EasyStory",  # Optional, replace with your app name
@@ -65,23 +70,24 @@ async def send_request(payload: Dict[str, Any], timeout: float = 60.0) -> Dict[s
     async with httpx.AsyncClient(timeout=timeout) as client:
         try:
             model_name = payload.get("model", OPENROUTER_MODEL)
-            print(f"--- Sending request to OpenRouter (Model: {model_name}) ---")
+            logger.debug(f"Sending request to OpenRouter (Model: {model_name})")
             
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
+            response = await post_completion(client, OPENROUTER_API_URL, headers, payload)
             response.raise_for_status()
             
-            print("--- Received response from OpenRouter ---")
+            logger.debug("Received response from OpenRouter")
             return response.json()
             
         except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+            logger.error("OpenRouter request failed: %s - %s", e.response.status_code, truncate(e.response.text))
             raise Exception(f"LLM API request failed with status {e.response.status_code}.") from e
         except httpx.RequestError as e:
-            print(f"An error occurred while requesting {e.request.url!r}.")
+            logger.error(f"Network error while requesting {e.request.url!r}: {e}")
             raise Exception("Could not connect to the LLM API.") from e
 
 async def generate_content(system_prompt: str, user_prompt: str, 
-                           model: Optional[str] = None, timeout: float = 60.0) -> str:
+                           model: Optional[str] = None, timeout: float = 60.0,
+                           request_key: Optional[str] = None) -> str:
     """
     Generate content using the LLM.
     
@@ -90,6 +96,9 @@ async def generate_content(system_prompt: str, user_prompt: str,
         user_prompt: The user prompt/request
         model: Optional model override
         timeout: Request timeout in seconds
+        request_key: canonical_request_key of the request being served, so
+            requests that differ only in casing or spacing share one call
+            (by default the call is keyed on the exact payload)
         
     Returns:
         The generated content as a string
@@ -97,17 +106,23 @@ async def generate_content(system_prompt: str, user_prompt: str,
     Raises:
         ValueError: For content parsing issues
         Exception: For API or network errors
+        ClientDisconnected: If the client of the current request disconnects first
     """
     payload = build_payload(system_prompt, user_prompt, model)
-    response_data = await send_request(payload, timeout)
+    # Shared with identical generations in flight; cancelled once no client waits for it
+    key = call_key(payload["model"], request_key) if request_key else call_key(payload)
+    response_data = await shared_llm_call(
+        key, lambda: send_request(payload, timeout),
+        on_coalesced=lambda: usage_ledger.record_cache_hit("coalesced", model=payload["model"]),
+    )
     
     try:
         result_json_str = response_data['choices'][0]['message']['content']
         return result_json_str
     except (KeyError, IndexError) as e:
-        print(f"Error extracting content from response: {e}")
-        print(f"Response structure: {response_data}")
+        logger.error(f"Error extracting content from response: {e}")
+        logger.debug("Response structure: %s", truncate(response_data))
         raise ValueError("Unexpected response format from OpenRouter API")
     except Exception as e:
-        print(f"Unexpected error processing response: {e}")
+        logger.error(f"Unexpected error processing response: {e}")
         raise 
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Metrics for the generation pipelines (lessons, continuations and stories).
+
+Each pipeline times its stages with ``stage()`` (``timed()`` for a whole
+coroutine function) and marks itself in flight with ``generation()``:
+
+    @generation("lesson")
+    async def generate(...):
+        with stage("parse"):
+            data = parse_json_response(raw)
+
+Stages: prompt_build, llm_ttfb (until OpenRouter's response headers arrive),
+llm_total (until its body is read), parse, validate (building the response
+models) and persist. Each stage and each generation is also a tracing span
+(services/utils/tracing.py).
+"""
+
+import functools
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from services.utils import metrics, tracing
+from .usage_ledger import usage_scope
+
+STAGE_SECONDS = metrics.histogram(
+    "generation_stage_seconds",
+    "Time spent in each stage of a generation pipeline.",
+    ("stage",),
+)
+PARSE_FAILURES = metrics.counter(
+    "llm_parse_failures_total",
+    "LLM responses that were not valid JSON.",
+)
+JSON_REPAIRS = metrics.counter(
+    "llm_json_repairs_total",
+    "LLM responses that needed cleaning (such as stripping code fences) before they parsed.",
+)
+RETRIES = metrics.counter(
+    "llm_retries_total",
+    "OpenRouter requests retried with another API key after the first one refused them.",
+)
+IN_FLIGHT = metrics.gauge(
+    "generations_in_flight",
+    "Generations currently in progress, by pipeline.",
+    ("pipeline",),
+)
+QUEUED = metrics.gauge(
+    "llm_calls_queued",
+    "LLM calls waiting for rate-limit capacity.",
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Times the enclosed block as pipeline stage ``name``, in a span of that name."""
+    with tracing.span(name), STAGE_SECONDS.time(stage=name):
+        yield
+
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator timing every call of a coroutine function as pipeline stage ``name``."""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def generation(pipeline: str) -> Callable[[F], F]:
+    """
+    Decorator counting calls of a coroutine function as in-progress
+    generations of ``pipeline`` (each in a span of that name), and
+    attributing their LLM usage to it.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracing.span(pipeline), IN_FLIGHT.track(pipeline=pipeline), usage_scope(pipeline=pipeline):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def strip_code_fences(text: str) -> str:
+    """Removes a ```json ... ``` wrapper from an LLM response, counting it as a repair."""
+    cleaned = text.strip()
+    if cleaned.startswith("```json") and cleaned.endswith("```"):
+        cleaned = cleaned[7:-3].strip()
+    elif cleaned.startswith("```") and cleaned.endswith("```"):
+        cleaned = cleaned[3:-3].strip()
+    else:
+        return cleaned
+    JSON_REPAIRS.inc()
+    tracing.add_event("json_repair", {"repair": "strip_code_fences"})
+    return cleaned
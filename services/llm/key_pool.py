@@ -0,0 +1,244 @@
+"""
+A pool of OpenRouter API keys, so throughput is not capped by one key's limits.
+
+Keys come from OPENROUTER_API_KEYS (comma-separated), or OPENROUTER_API_KEY
+when that is not set. Each request goes to the key with the most headroom in
+its rate-limit buckets; among equals, to the one that served the fewest
+requests in the last minute. Both are tracked in the shared state, so every
+worker balances the same way. Keys that run out of credit (402) or are
+rejected (401/403) are quarantined for a while; a 429 pauses the key for its
+Retry-After. Keys are identified in logs and metrics by a short hash, never
+by their value.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from services.utils import metrics, tracing
+from services.utils.shared_state import SharedState, shared_state
+from .cassettes import cassettes
+from .instrumentation import QUEUED, RETRIES, STAGE_SECONDS
+from .rate_limiter import WAIT_SECONDS, RateLimiter, RateLimitExceeded, estimate_tokens, rate_limiter
+from .usage_ledger import usage_ledger
+
+logger = logging.getLogger(__name__)
+
+KEY_REQUESTS = metrics.counter(
+    "llm_key_requests_total",
+    "OpenRouter requests per API key, by response status ('error' for network errors).",
+    ("key", "status"),
+)
+KEY_TOKENS = metrics.counter(
+    "llm_key_tokens_total",
+    "Tokens OpenRouter reported using, per API key.",
+    ("key",),
+)
+KEY_QUARANTINES = metrics.counter(
+    "llm_key_quarantines_total",
+    "Times an API key was taken out of rotation, by reason.",
+    ("key", "reason"),
+)
+
+# Statuses that take a key out of rotation for quarantine_seconds
+QUARANTINE_REASONS = {401: "unauthorized", 402: "payment_required", 403: "forbidden"}
+# Statuses caused by the key rather than the request, worth retrying with another key
+KEY_REFUSALS = {429, *QUARANTINE_REASONS}
+
+
+def key_id(api_key: str) -> str:
+    """Short, non-reversible identifier of a key for logs and metrics."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class KeyPool:
+    def __init__(
+        self,
+        keys: Optional[List[str]] = None,
+        limiter: RateLimiter = rate_limiter,
+        quarantine_seconds: float = 600.0,
+        state: SharedState = shared_state,
+    ):
+        self._keys = keys
+        self.limiter = limiter
+        self.quarantine_seconds = quarantine_seconds
+        self.state = state
+
+    @classmethod
+    def from_env(cls) -> "KeyPool":
+        """Builds the pool; the keys themselves are read on first use, once .env has been loaded."""
+        return cls(quarantine_seconds=float(os.getenv("OPENROUTER_KEY_QUARANTINE_SECONDS", "600")))
+
+    @property
+    def keys(self) -> List[str]:
+        if self._keys is None:
+            value = os.getenv("OPENROUTER_API_KEYS") or os.getenv("OPENROUTER_API_KEY") or ""
+            self._keys = list(dict.fromkeys(key.strip() for key in value.split(",") if key.strip()))
+        return self._keys
+
+    def require_keys(self) -> List[str]:
+        """Raises ValueError when no key is configured."""
+        if not self.keys:
+            raise ValueError("OPENROUTER_API_KEY (or OPENROUTER_API_KEYS) environment variable not set.")
+        return self.keys
+
+    def _recent_key(self, api_key: str) -> str:
+        return f"keypool:recent:{key_id(api_key)}"
+
+    def ranked(self) -> List[str]:
+        """Keys in dispatch order: most headroom first, then fewest requests in the last minute."""
+        return sorted(
+            self.require_keys(),
+            key=lambda api_key: (-self.limiter.headroom(api_key), self.state.get(self._recent_key(api_key), 0)),
+        )
+
+    def try_acquire(self, estimated_tokens: int) -> Tuple[Optional[str], List[float]]:
+        """
+        Takes capacity for a request from the first key in dispatch order that
+        has it. Returns that key (None if none has any) and the waits of the
+        keys passed over. Blocks on the shared state, so run it off the event loop.
+        """
+        waits = []
+        for api_key in self.ranked():
+            wait = self.limiter.try_acquire(api_key, estimated_tokens)
+            if wait <= 0:
+                self.state.incr(self._recent_key(api_key), ttl=60)
+                return api_key, waits
+            waits.append(wait)
+        return None, waits
+
+    async def acquire(self, estimated_tokens: int) -> str:
+        """
+        Picks a key for a request of ``estimated_tokens`` tokens, taking its
+        rate-limit capacity, and waits when no key has any.
+
+        Raises:
+            ValueError: If no key is configured.
+            RateLimitExceeded: If no key has capacity within the limiter's max_wait.
+        """
+        waited = 0.0
+        while True:
+            # The shared state is a SQLite file that other workers may hold locked
+            api_key, waits = await asyncio.to_thread(self.try_acquire, estimated_tokens)
+            if api_key is not None:
+                return api_key
+            wait = min(waits)
+            if waited + wait > self.limiter.max_wait:
+                raise RateLimitExceeded(
+                    f"OpenRouter rate limit reached on all {len(waits)} key(s); "
+                    f"no capacity within {self.limiter.max_wait:.0f} seconds."
+                )
+            logger.info(f"All OpenRouter keys are at their rate limit; waiting {wait:.1f}s")
+            WAIT_SECONDS.inc(wait)
+            with QUEUED.track(), tracing.span("rate_limit_wait"):
+                await asyncio.sleep(wait)
+            waited += wait
+
+    def quarantine(self, api_key: str, seconds: float, reason: str) -> None:
+        """Takes the key out of rotation for ``seconds`` in every worker."""
+        logger.warning(f"Quarantining OpenRouter key {key_id(api_key)} for {seconds:.0f}s ({reason})")
+        KEY_QUARANTINES.inc(key=key_id(api_key), reason=reason)
+        self.limiter.block(api_key, seconds)
+
+    def observe(self, api_key: str, estimated_tokens: int, response: httpx.Response) -> None:
+        """Records a response for the key: usage, rate limiting and quarantine."""
+        KEY_REQUESTS.inc(key=key_id(api_key), status=str(response.status_code))
+        used = self.limiter.observe(api_key, estimated_tokens, response)
+        if used:
+            KEY_TOKENS.inc(used, key=key_id(api_key))
+        if response.status_code == 429:
+            KEY_QUARANTINES.inc(key=key_id(api_key), reason="rate_limited")
+        elif response.status_code in QUARANTINE_REASONS:
+            self.quarantine(api_key, self.quarantine_seconds, QUARANTINE_REASONS[response.status_code])
+
+    def observe_error(self, api_key: str, estimated_tokens: int) -> None:
+        """Records a request that got no response (network error or timeout)."""
+        KEY_REQUESTS.inc(key=key_id(api_key), status="error")
+        self.limiter.record_usage(api_key, estimated_tokens, 0)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-key state, for the admin API (GET /api/admin/keys)."""
+        return [
+            {
+                "key": key_id(api_key),
+                "headroom": round(self.limiter.headroom(api_key), 3),
+                "blocked_until": self.limiter.blocked_until(api_key) or None,
+                "requests_last_minute": self.state.get(self._recent_key(api_key), 0),
+            }
+            for api_key in self.keys
+        ]
+
+
+key_pool = KeyPool.from_env()
+
+
+async def post_completion(
+    client: httpx.AsyncClient, url: str, headers: Dict[str, str], payload: Dict[str, Any]
+) -> httpx.Response:
+    """
+    POSTs a chat completion with a key from the pool, within its rate limits,
+    and records the outcome for the key and in the usage ledger. A request
+    refused because of its key (401/402/403/429) is retried with another key
+    while there are untried ones.
+
+    Raises:
+        ValueError: If no key is configured.
+        RateLimitExceeded: If no key has capacity in time.
+    """
+    estimated_tokens = estimate_tokens(payload)
+    attempts = len(key_pool.require_keys())
+    for attempt in range(1, attempts + 1):
+        api_key = await key_pool.acquire(estimated_tokens)
+        response = await _send_attempt(client, url, headers, payload, api_key, estimated_tokens, attempt)
+        if response.status_code not in KEY_REFUSALS or attempt == attempts:
+            return response
+        RETRIES.inc()
+        logger.info(f"OpenRouter key {key_id(api_key)} refused the request ({response.status_code}); trying another key")
+    return response
+
+
+async def _send_attempt(
+    client: httpx.AsyncClient, url: str, headers: Dict[str, str], payload: Dict[str, Any],
+    api_key: str, estimated_tokens: int, attempt: int,
+) -> httpx.Response:
+    """One request of post_completion, in an "llm_call" span, recorded for the key and in the usage ledger."""
+    attributes = {"llm.model": payload.get("model"), "llm.key": key_id(api_key), "llm.attempt": attempt}
+    with tracing.span("llm_call", attributes, kind="client") as current:
+        request = client.build_request(
+            "POST", url, headers={**headers, "Authorization": f"Bearer {api_key}"}, json=payload
+        )
+        start = time.perf_counter()
+        try:
+            response = await cassettes.send(client, request, payload)
+            ttfb = time.perf_counter() - start
+            STAGE_SECONDS.observe(ttfb, stage="llm_ttfb")
+            current.set_attribute("llm.ttfb_ms", round(ttfb * 1000, 1))
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+        except httpx.RequestError:
+            await asyncio.to_thread(_record_outcome, payload, api_key, estimated_tokens, time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage="llm_total")
+        cassettes.record(payload, response, ttfb, elapsed, secrets=key_pool.keys)
+        current.set_attribute("http.status_code", response.status_code)
+        await asyncio.to_thread(_record_outcome, payload, api_key, estimated_tokens, elapsed, response)
+        return response
+
+
+def _record_outcome(
+    payload: Dict[str, Any], api_key: str, estimated_tokens: int, elapsed: float, response: Optional[httpx.Response] = None
+) -> None:
+    """Records a request for its key and in the usage ledger; ``response`` is None when it got none."""
+    if response is None:
+        key_pool.observe_error(api_key, estimated_tokens)
+    else:
+        key_pool.observe(api_key, estimated_tokens, response)
+    usage_ledger.record_call(payload.get("model"), key_id(api_key), elapsed, response)
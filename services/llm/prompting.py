@@ -1,12 +1,14 @@
 """
 Prompt generation utilities for creating effective LLM prompts.
 
-This module contains functions for building prompts for story generation and continuation.
+This module contains functions for building prompts for story and lesson generation
+and continuation.
 """
 
 import json
 from typing import Tuple, Dict, Any
 from models.story import StoryGenerationRequest, StoryContinuationRequest
+from models.lesson import LessonGenerationRequest
 
 def build_story_generation_prompt(request: StoryGenerationRequest) -> Tuple[str, str]:
     """
@@ -80,6 +82,76 @@ def get_story_output_schema(request: StoryGenerationRequest) -> Dict[str, Any]:
 
     return output_schema
 
+def build_lesson_generation_prompt(request: LessonGenerationRequest) -> Tuple[str, str]:
+    """
+    Build the prompt and output schema for lesson generation.
+    
+    Args:
+        request: Lesson generation request parameters (canonicalized)
+        
+    Returns:
+        Tuple of (prompt_text, output_format_description)
+    """
+    subject_display = request.other_subject if request.subject == 'other' and request.other_subject else request.subject
+
+    if request.academic_grade.lower() == 'university':
+        audience_line = "Target Audience: University students."
+    else:
+        audience_line = f"Target Audience: Grade {request.academic_grade} students."
+
+    prompt_lines = [
+        f"Generate an educational lesson in {request.language}.",
+        audience_line,
+        f"Subject: {subject_display}.",
+    ]
+    
+    if request.subject_specification:
+        prompt_lines.append(f"Specific Topic Focus: {request.subject_specification}.")
+    if request.setting:
+        prompt_lines.append(f"Lesson Setting: {request.setting}.")
+    if request.main_character:
+        prompt_lines.append(f"Main Character: {request.main_character}.")
+
+    prompt_lines.append(f"Approximate Word Count: {request.word_count} words.")
+    prompt_lines.append("The lesson should be clear, engaging, age-appropriate, and structured around the key concepts of the subject.")
+    prompt_lines.append("\nRequirements:")
+    prompt_lines.append("- Generate a clear title.")
+    prompt_lines.append("- Generate the main lesson content. Use double line breaks '\\n\\n' between paragraphs.")
+
+    output_schema = get_lesson_output_schema(request)
+    prompt_lines.append("\nOutput the entire result as a single JSON object conforming exactly to the specified structure.")
+
+    output_format_description = json.dumps(output_schema, indent=2)
+
+    return "\n".join(prompt_lines), output_format_description
+
+def get_lesson_output_schema(request: LessonGenerationRequest) -> Dict[str, Any]:
+    """
+    Build the lesson output schema based on request parameters.
+    
+    Args:
+        request: Lesson generation request with feature flags
+        
+    Returns:
+        Dictionary describing the expected output format
+    """
+    output_schema = {
+        "title": "string (Clear title for the lesson)",
+        "lesson_content": "string (The full lesson text, with paragraphs separated by double line breaks '\\n\\n')",
+        "learning_objectives": "[string] (Optional: 3-5 bullet points outlining the key learning takeaways)"
+    }
+
+    if request.generate_summary:
+        output_schema["summary"] = "string (Concise 2-3 sentence summary)"
+
+    if request.generate_vocabulary:
+        output_schema["vocabulary"] = '[{"term": "string", "definition": "string"}] (List of 4 vocabulary words and definitions)'
+
+    if request.generate_quiz:
+        output_schema["quiz"] = '[{"question": "string", "options": ["string"], "correct_answer": int}] (List of quiz questions, each with an array of 4 options and the index of the correct answer (0-3))'
+
+    return output_schema
+
 def build_continuation_prompt(story_id: str, request: StoryContinuationRequest) -> Tuple[str, str]:
     """
     Build the prompt and output schema for story continuation.
@@ -0,0 +1,200 @@
+"""
+Token-bucket rate limiting for OpenRouter, shared by all worker processes.
+
+OpenRouter limits requests and tokens per minute for each API key. The
+buckets for a key live in the shared state store (services/utils/shared_state.py),
+so with several workers the limit holds for all of them together rather than
+for each one. A request takes one request and its estimated tokens before it
+is sent. The estimate is corrected with the usage the response reports. A 429
+pauses the key for every worker until its Retry-After has passed.
+"""
+
+import os
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from services.utils import metrics
+from services.utils.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+WAIT_SECONDS = metrics.counter(
+    "llm_rate_limit_wait_seconds_total",
+    "Time LLM calls spent waiting for the OpenRouter rate limiter.",
+)
+UPSTREAM_429S = metrics.counter(
+    "llm_rate_limited_responses_total",
+    "OpenRouter responses with status 429 (rate limited).",
+)
+
+# Completion tokens assumed for a request that does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = int(os.getenv("OPENROUTER_COMPLETION_TOKENS_ESTIMATE", "1500"))
+# Pause after a 429 that carries no Retry-After header
+DEFAULT_RETRY_AFTER = 10.0
+# Idle buckets are refilled by then anyway, so their state can expire
+STATE_TTL = 120.0
+
+
+class RateLimitExceeded(ConnectionError):
+    """The rate limiter would make a call wait longer than allowed."""
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Rough token count of a chat completion request: ~4 characters per prompt token plus the completion."""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in payload.get("messages", []))
+    return prompt_chars // 4 + int(payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def usage_tokens(response_data: Dict[str, Any]) -> Optional[int]:
+    """Total tokens an OpenRouter response reports having used, if it says."""
+    usage = response_data.get("usage") if isinstance(response_data, dict) else None
+    if not isinstance(usage, dict):
+        return None
+    total = usage.get("total_tokens")
+    if total is None and ("prompt_tokens" in usage or "completion_tokens" in usage):
+        total = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    return int(total) if total is not None else None
+
+
+def retry_after(response: httpx.Response) -> float:
+    try:
+        return max(0.0, float(response.headers.get("retry-after", DEFAULT_RETRY_AFTER)))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets per API key. A limit of
+    0 disables that bucket; backing off after a 429 applies regardless.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_wait: float = 30.0,
+        state: SharedState = shared_state,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self.state = state
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Builds the limiter from OPENROUTER_RPM, OPENROUTER_TPM and OPENROUTER_RATE_LIMIT_MAX_WAIT."""
+        return cls(
+            requests_per_minute=float(os.getenv("OPENROUTER_RPM", "0")),
+            tokens_per_minute=float(os.getenv("OPENROUTER_TPM", "0")),
+            max_wait=float(os.getenv("OPENROUTER_RATE_LIMIT_MAX_WAIT", "30")),
+        )
+
+    @staticmethod
+    def _key(api_key: str) -> str:
+        return "ratelimit:openrouter:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def _refill(self, bucket: Optional[Dict[str, float]], now: float) -> Dict[str, float]:
+        if bucket is None:
+            return {"requests": self.requests_per_minute, "tokens": self.tokens_per_minute, "at": now}
+        elapsed = max(0.0, now - bucket["at"])
+        return {
+            **bucket,
+            "requests": min(self.requests_per_minute, bucket["requests"] + elapsed * self.requests_per_minute / 60),
+            "tokens": min(self.tokens_per_minute, bucket["tokens"] + elapsed * self.tokens_per_minute / 60),
+            "at": now,
+        }
+
+    def try_acquire(self, api_key: str, tokens: int) -> float:
+        """
+        Takes one request and ``tokens`` from the key's buckets if they hold
+        enough. Returns 0 on success, otherwise the seconds until they will.
+        """
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)  # A request larger than the bucket waits for a full one
+        wait = 0.0
+
+        def take(bucket: Optional[Dict[str, float]]) -> Dict[str, float]:
+            nonlocal wait
+            now = time.time()
+            bucket = self._refill(bucket, now)
+            wait = max(0.0, bucket.get("blocked_until", 0.0) - now)
+            if self.requests_per_minute and bucket["requests"] < 1:
+                wait = max(wait, (1 - bucket["requests"]) * 60 / self.requests_per_minute)
+            if self.tokens_per_minute and bucket["tokens"] < tokens:
+                wait = max(wait, (tokens - bucket["tokens"]) * 60 / self.tokens_per_minute)
+            if wait == 0:
+                bucket["requests"] -= 1 if self.requests_per_minute else 0
+                bucket["tokens"] -= tokens if self.tokens_per_minute else 0
+            return bucket
+
+        self.state.update(self._key(api_key), take, ttl=STATE_TTL)
+        return wait
+
+    def record_usage(self, api_key: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Corrects the token bucket by the difference between the estimate and the reported usage."""
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        estimated_tokens = min(estimated_tokens, self.tokens_per_minute)  # As charged by try_acquire
+
+        def correct(bucket: Optional[Dict[str, float]]) -> Dict[str, float]:
+            bucket = self._refill(bucket, time.time())
+            bucket["tokens"] = min(self.tokens_per_minute, bucket["tokens"] + estimated_tokens - actual_tokens)
+            return bucket
+
+        self.state.update(self._key(api_key), correct, ttl=STATE_TTL)
+
+    def block(self, api_key: str, seconds: float) -> None:
+        """Pauses the key for every worker, e.g. for the Retry-After of a 429."""
+        def pause(bucket: Optional[Dict[str, float]]) -> Dict[str, float]:
+            now = time.time()
+            bucket = self._refill(bucket, now)
+            bucket["blocked_until"] = max(bucket.get("blocked_until", 0.0), now + seconds)
+            return bucket
+
+        self.state.update(self._key(api_key), pause, ttl=max(STATE_TTL, seconds))
+
+    def headroom(self, api_key: str) -> float:
+        """Fraction (0-1) of the key's capacity available right now; 0 while it is blocked."""
+        now = time.time()
+        bucket = self._refill(self.state.get(self._key(api_key)), now)
+        if bucket.get("blocked_until", 0.0) > now:
+            return 0.0
+        fractions = [
+            max(0.0, bucket[name]) / limit
+            for name, limit in (("requests", self.requests_per_minute), ("tokens", self.tokens_per_minute))
+            if limit
+        ]
+        return min(fractions, default=1.0)
+
+    def blocked_until(self, api_key: str) -> float:
+        bucket = self.state.get(self._key(api_key)) or {}
+        return bucket.get("blocked_until", 0.0)
+
+    def observe(self, api_key: str, estimated_tokens: int, response: httpx.Response) -> Optional[int]:
+        """
+        Updates the key's buckets from an OpenRouter response (usage, or a 429).
+
+        Returns:
+            The tokens the response reports having used, if any.
+        """
+        try:
+            if response.status_code == 429:
+                UPSTREAM_429S.inc()
+                self.block(api_key, retry_after(response))
+                self.record_usage(api_key, estimated_tokens, 0)  # Rejected requests use no tokens
+            elif response.is_success:
+                used = usage_tokens(response.json())
+                self.record_usage(api_key, estimated_tokens, used)
+                return used
+        except Exception as e:  # Never fail a call because its bookkeeping did
+            logger.warning(f"Could not update the OpenRouter rate limiter: {e}")
+        return None
+
+
+# Shared by all keys of the key pool (services/llm/key_pool.py)
+rate_limiter = RateLimiter.from_env()
@@ -0,0 +1,272 @@
+"""
+Ledger of LLM usage and cost, one row per OpenRouter request (and per
+generation answered without one, such as a reused lesson or a call that
+joined an identical one in flight, cache_status "coalesced").
+
+post_completion records every request with its tokens, model, latency,
+endpoint and key. The generation pipelines label their calls with the
+pipeline (via instrumentation.generation) and the subject (``label_usage``).
+Cost is what OpenRouter reports in ``usage.cost`` when present, otherwise
+derived from the per-million-token prices in PRICES / OPENROUTER_PRICES.
+
+Rows go to a SQLite file (USAGE_LEDGER_PATH, shared by all workers; set it
+empty to disable the ledger). ``report()`` aggregates them per day, subject,
+endpoint, model, pipeline, key or cache status; it backs GET /api/admin/usage
+and usage_report.py.
+"""
+
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from services.utils.cancellation import current_route
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = Path(__file__).parent.parent.parent / "data" / "usage.sqlite3"
+
+# USD per million (prompt, completion) tokens; OPENROUTER_PRICES adds to or overrides these,
+# e.g. {"google/gemini-2.0-flash-001": [0.1, 0.4]}
+PRICES: Dict[str, Tuple[float, float]] = {
+    "google/gemini-2.0-flash-001": (0.10, 0.40),
+    "google/gemini-1.5-flash-latest": (0.075, 0.30),
+    "google/gemini-flash-1.5": (0.075, 0.30),
+}
+
+# Report groupings -> ledger column
+GROUPS = {
+    "day": "day",
+    "subject": "subject",
+    "endpoint": "endpoint",
+    "model": "model",
+    "pipeline": "pipeline",
+    "key": "api_key",
+    "cache_status": "cache_status",
+}
+
+_labels: ContextVar[Optional[Dict[str, str]]] = ContextVar("usage_labels", default=None)
+
+
+@contextmanager
+def usage_scope(**labels: str) -> Iterator[None]:
+    """Attributes the LLM calls made in the enclosed block (and the tasks it starts) to ``labels``."""
+    token = _labels.set({**(_labels.get() or {}), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def label_usage(**labels: Optional[str]) -> None:
+    """Adds labels (e.g. the subject) to the calls of the current usage_scope."""
+    current = _labels.get()
+    if current is not None:
+        current.update({name: value for name, value in labels.items() if value})
+
+
+def _load_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(PRICES)
+    raw = os.getenv("OPENROUTER_PRICES")
+    if raw:
+        try:
+            prices.update({model: (float(prompt), float(completion)) for model, (prompt, completion) in json.loads(raw).items()})
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring invalid OPENROUTER_PRICES: {e}")
+    return prices
+
+
+def _usage(response: Optional[httpx.Response]) -> Dict[str, Any]:
+    if response is None or not response.is_success:
+        return {}
+    try:
+        data = response.json()
+    except ValueError:
+        return {}
+    usage = data.get("usage") if isinstance(data, dict) else None
+    return {**(usage if isinstance(usage, dict) else {}), "model": data.get("model") if isinstance(data, dict) else None}
+
+
+class UsageLedger:
+    def __init__(self, path: Optional[str], prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.path = path
+        self.prices = prices if prices is not None else _load_prices()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._unavailable = False
+
+    @classmethod
+    def from_env(cls) -> "UsageLedger":
+        path = os.getenv("USAGE_LEDGER_PATH", str(DEFAULT_LEDGER_PATH))
+        return cls(path or None)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not self._unavailable
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so importing the module never creates the file
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    day TEXT NOT NULL,
+                    endpoint TEXT,
+                    pipeline TEXT,
+                    subject TEXT,
+                    model TEXT,
+                    api_key TEXT,
+                    status INTEGER,
+                    cache_status TEXT NOT NULL,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    cost_usd REAL NOT NULL DEFAULT 0,
+                    latency_ms REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_day ON llm_usage (day)")
+            self._conn = conn
+        return self._conn
+
+    def cost(self, model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+        """USD cost of the tokens at the model's price (0 for models without a price)."""
+        prompt_price, completion_price = self.prices.get(model or "", (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def _insert(self, row: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        row = {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost_usd": 0.0,
+            **(_labels.get() or {}),
+            "endpoint": current_route(),
+            **row,
+            "created_at": now,
+            "day": time.strftime("%Y-%m-%d", time.gmtime(now)),
+        }
+        columns = [
+            "created_at", "day", "endpoint", "pipeline", "subject", "model", "api_key", "status",
+            "cache_status", "prompt_tokens", "completion_tokens", "cost_usd", "latency_ms",
+        ]
+        try:
+            with self._lock:
+                self._connection().execute(
+                    f"INSERT INTO llm_usage ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    [row.get(column) for column in columns],
+                )
+        except (sqlite3.Error, OSError) as e:  # Never fail a generation because its accounting did
+            if self._conn is None:
+                # The ledger file cannot be opened (e.g. read-only disk): say so once and stop trying
+                self._unavailable = True
+                logger.warning(f"Disabling the LLM usage ledger, {self.path} cannot be opened: {e}")
+            else:
+                logger.warning(f"Could not record LLM usage in {self.path}: {e}")
+
+    def record_call(
+        self, model: Optional[str], api_key: str, latency: float, response: Optional[httpx.Response] = None
+    ) -> None:
+        """Records one OpenRouter request; ``response`` is None when it got none (network error)."""
+        usage = _usage(response)
+        model = usage.get("model") or model
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        reported_cost = usage.get("cost")
+        self._insert({
+            "model": model,
+            "api_key": api_key,
+            "status": response.status_code if response is not None else 0,
+            "cache_status": "miss",
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": float(reported_cost) if reported_cost is not None else self.cost(model, prompt_tokens, completion_tokens),
+            "latency_ms": latency * 1000,
+        })
+
+    def record_cache_hit(self, cache_status: str, **labels: Optional[str]) -> None:
+        """Records a generation answered without calling the LLM (e.g. cache_status="reused")."""
+        self._insert({**{name: value for name, value in labels.items() if value}, "cache_status": cache_status})
+
+    def report(self, group_by: str = "day", since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Usage aggregated per ``group_by`` (one of GROUPS), for the UTC days
+        ``since`` to ``until`` inclusive (YYYY-MM-DD, both optional). Rows are
+        ordered by day, or by cost for the other groupings.
+
+        Raises:
+            ValueError: For an unknown grouping.
+        """
+        if group_by not in GROUPS:
+            raise ValueError(f"Unknown grouping '{group_by}'; expected one of {', '.join(GROUPS)}.")
+        if not self.enabled:
+            return []
+        column = GROUPS[group_by]
+        conditions, params = [], []
+        if since:
+            conditions.append("day >= ?")
+            params.append(since)
+        if until:
+            conditions.append("day <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "grp" if group_by == "day" else "cost_usd DESC, requests DESC"
+        query = f"""
+            SELECT {column} AS grp,
+                   COUNT(*) AS requests,
+                   SUM(cache_status != 'miss') AS cache_hits,
+                   SUM(status IS NOT NULL AND (status < 200 OR status >= 300)) AS errors,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(cost_usd) AS cost_usd,
+                   AVG(latency_ms) AS avg_latency_ms,
+                   MAX(latency_ms) AS max_latency_ms
+            FROM llm_usage {where}
+            GROUP BY grp ORDER BY {order}
+        """
+        with self._lock:
+            rows = self._connection().execute(query, params).fetchall()
+        return [
+            {
+                group_by: row["grp"],
+                "requests": row["requests"],
+                "cache_hits": row["cache_hits"],
+                "errors": row["errors"],
+                "prompt_tokens": row["prompt_tokens"],
+                "completion_tokens": row["completion_tokens"],
+                "total_tokens": row["prompt_tokens"] + row["completion_tokens"],
+                "cost_usd": round(row["cost_usd"], 6),
+                "avg_latency_ms": round(row["avg_latency_ms"], 1) if row["avg_latency_ms"] is not None else None,
+                "max_latency_ms": round(row["max_latency_ms"], 1) if row["max_latency_ms"] is not None else None,
+            }
+            for row in rows
+        ]
+
+
+def totals(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sums the rows of a report (latencies excepted)."""
+    summed = ("requests", "cache_hits", "errors", "prompt_tokens", "completion_tokens", "total_tokens", "cost_usd")
+    result = {name: sum(row[name] for row in rows) for name in summed}
+    result["cost_usd"] = round(result["cost_usd"], 6)
+    return result
+
+
+usage_ledger = UsageLedger.from_env()
@@ -1,27 +1,35 @@
 import httpx
 import os
 import json
+import logging
 from dotenv import load_dotenv
 from models.story import StoryGenerationRequest, StoryGenerationResponse, VocabularyItem, QuizItem, StoryContinuationRequest, StoryContinuationResponse
 from typing import Tuple, Optional, List, Dict, Any
+from services.utils.cancellation import cancel_on_disconnect
+from services.llm.key_pool import key_pool, post_completion
+from services.llm.instrumentation import PARSE_FAILURES, generation, stage
+from services.llm.usage_ledger import label_usage
+from services.utils.structured_logging import truncate
 
 load_dotenv() # Load environment variables from .env file
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+logger = logging.getLogger(__name__)
+
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.0-flash-001") # Default model
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")  # Or benchmarks/mock_openrouter.py
 
+@generation("story")
 async def generate_story_content(request: StoryGenerationRequest) -> StoryGenerationResponse:
     """
     Generates story content, title, summary, and vocabulary using an LLM.
     """
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY environment variable not set.")
+    key_pool.require_keys() # Raises ValueError when no OpenRouter key is configured
+    label_usage(subject=request.subject)
 
-    prompt, output_format_description = _build_llm_prompt(request)
+    with stage("prompt_build"):
+        prompt, output_format_description = _build_llm_prompt(request)
 
     headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "http://localhost", # Optional, replace with your site URL
         "X-Title": "EasyStory", # Optional, replace with your app name
@@ -38,15 +46,16 @@ async def generate_story_content(request: StoryGenerationRequest) -> StoryGenera
 
     async with httpx.AsyncClient(timeout=90.0) as client: # Increased timeout for generation
         try:
-            print(f"--- Sending request to OpenRouter (Model: {OPENROUTER_MODEL}) ---")
-            # print(f"Prompt: {prompt}") # Uncomment for debugging
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
+            logger.debug(f"Sending request to OpenRouter (Model: {OPENROUTER_MODEL})")
+            logger.debug("Prompt: %s", truncate(prompt))
+            response = await cancel_on_disconnect(post_completion(client, OPENROUTER_API_URL, headers, payload))
             response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-            print("--- Received response from OpenRouter ---")
+            logger.debug("Received response from OpenRouter")
 
             result_json_str = response.json()['choices'][0]['message']['content']
             # Attempt to parse the JSON string from the LLM response
-            generated_data = json.loads(result_json_str)
+            with stage("parse"):
+                generated_data = json.loads(result_json_str)
 
             # Basic validation of received structure
             if not all(k in generated_data for k in ["title", "story_content"]):
@@ -60,15 +69,15 @@ async def generate_story_content(request: StoryGenerationRequest) -> StoryGenera
             if request.generate_vocabulary and "vocabulary" in generated_data:
                 try:
                     raw_vocab = generated_data["vocabulary"]
-                    print(f"Raw vocabulary data: {raw_vocab}")
+                    logger.debug("Raw vocabulary data: %s", truncate(raw_vocab))
                     if isinstance(raw_vocab, list):
                         vocabulary_list = [VocabularyItem(**item) for item in raw_vocab 
                                           if isinstance(item, dict) and "term" in item and "definition" in item]
-                        print(f"Processed vocabulary items: {len(vocabulary_list)} items")
+                        logger.debug(f"Processed vocabulary items: {len(vocabulary_list)} items")
                     else:
-                        print(f"Vocabulary is not a list: {type(raw_vocab)}")
+                        logger.warning(f"Vocabulary is not a list: {type(raw_vocab)}")
                 except Exception as e:
-                    print(f"Warning: Could not parse vocabulary list: {e}")
+                    logger.warning(f"Could not parse vocabulary list: {e}")
                     vocabulary_list = None
                     
             # Process quiz if present
@@ -76,7 +85,7 @@ async def generate_story_content(request: StoryGenerationRequest) -> StoryGenera
             if request.generate_quiz and "quiz" in generated_data:
                 try:
                     raw_quiz = generated_data["quiz"]
-                    print(f"Raw quiz data: {raw_quiz}")
+                    logger.debug("Raw quiz data: %s", truncate(raw_quiz))
                     if isinstance(raw_quiz, list):
                         quiz_list = []
                         for item in raw_quiz:
@@ -87,11 +96,11 @@ async def generate_story_content(request: StoryGenerationRequest) -> StoryGenera
                                 elif isinstance(item["correct_answer"], str) and item["correct_answer"].isdigit():
                                     item["correct_answer"] = int(item["correct_answer"])
                                     quiz_list.append(QuizItem(**item))
-                        print(f"Processed quiz items: {len(quiz_list)} questions")
+                        logger.debug(f"Processed quiz items: {len(quiz_list)} questions")
                     else:
-                        print(f"Quiz is not a list: {type(raw_quiz)}")
+                        logger.warning(f"Quiz is not a list: {type(raw_quiz)}")
                 except Exception as e:
-                    print(f"Warning: Could not parse quiz list: {e}")
+                    logger.warning(f"Could not parse quiz list: {e}")
                     quiz_list = None # Fallback if parsing fails
 
 
@@ -109,17 +118,18 @@ async def generate_story_content(request: StoryGenerationRequest) -> StoryGenera
             )
 
         except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+            logger.error("OpenRouter request failed: %s - %s", e.response.status_code, truncate(e.response.text))
             raise Exception(f"LLM API request failed with status {e.response.status_code}.") from e
         except httpx.RequestError as e:
-            print(f"An error occurred while requesting {e.request.url!r}.")
+            logger.error(f"Network error while requesting {e.request.url!r}: {e}")
             raise Exception("Could not connect to the LLM API.") from e
         except json.JSONDecodeError as e:
-             print(f"Error decoding JSON response from LLM: {e}")
-             print(f"Received text: {result_json_str}")
+             PARSE_FAILURES.inc()
+             logger.error(f"Error decoding JSON response from LLM: {e}")
+             logger.debug("Received text: %s", truncate(result_json_str))
              raise ValueError("Could not parse the JSON response from the language model.") from e
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            logger.error(f"An unexpected error occurred: {e}")
             raise
 
 
@@ -171,22 +181,22 @@ def _build_llm_prompt(request: StoryGenerationRequest) -> Tuple[str, str]:
 
     return "\n".join(prompt_lines), output_format_description 
 
+@generation("story_continuation")
 async def continue_story_content(story_id: str, request: StoryContinuationRequest) -> StoryContinuationResponse:
     """
     Continues an existing story with specified length and difficulty.
     """
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY environment variable not set.")
+    key_pool.require_keys() # Raises ValueError when no OpenRouter key is configured
 
     # TODO: In a real implementation, we would fetch the original story from a database
     # For now, we'll rely on the original_story_content field provided in the request
     if not request.original_story_content:
         raise ValueError("Original story content must be provided if story retrieval is not implemented.")
 
-    prompt, output_format_description = _build_continuation_prompt(story_id, request)
+    with stage("prompt_build"):
+        prompt, output_format_description = _build_continuation_prompt(story_id, request)
 
     headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "http://localhost", # Optional, replace with your site URL
         "X-Title": "EasyStory", # Optional, replace with your app name
@@ -203,14 +213,15 @@ async def continue_story_content(story_id: str, request: StoryContinuationReques
 
     async with httpx.AsyncClient(timeout=60.0) as client:
         try:
-            print(f"--- Sending continuation request to OpenRouter (Model: {OPENROUTER_MODEL}) ---")
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
+            logger.debug(f"Sending continuation request to OpenRouter (Model: {OPENROUTER_MODEL})")
+            response = await cancel_on_disconnect(post_completion(client, OPENROUTER_API_URL, headers, payload))
             response.raise_for_status()
-            print("--- Received continuation response from OpenRouter ---")
+            logger.debug("Received continuation response from OpenRouter")
 
             result_json_str = response.json()['choices'][0]['message']['content']
             # Attempt to parse the JSON string from the LLM response
-            generated_data = json.loads(result_json_str)
+            with stage("parse"):
+                generated_data = json.loads(result_json_str)
 
             # Basic validation of received structure
             if "continuation_text" not in generated_data:
@@ -224,15 +235,15 @@ async def continue_story_content(story_id: str, request: StoryContinuationReques
             if "vocabulary" in generated_data:
                 try:
                     raw_vocab = generated_data["vocabulary"]
-                    print(f"Raw vocabulary data: {raw_vocab}")
+                    logger.debug("Raw vocabulary data: %s", truncate(raw_vocab))
                     if isinstance(raw_vocab, list):
                         vocabulary_list = [VocabularyItem(**item) for item in raw_vocab 
                                           if isinstance(item, dict) and "term" in item and "definition" in item]
-                        print(f"Processed vocabulary items: {len(vocabulary_list)} items")
+                        logger.debug(f"Processed vocabulary items: {len(vocabulary_list)} items")
                     else:
-                        print(f"Vocabulary is not a list: {type(raw_vocab)}")
+                        logger.warning(f"Vocabulary is not a list: {type(raw_vocab)}")
                 except Exception as e:
-                    print(f"Warning: Could not parse vocabulary list: {e}")
+                    logger.warning(f"Could not parse vocabulary list: {e}")
                     vocabulary_list = None
                     
             # Process quiz if present
@@ -240,15 +251,15 @@ async def continue_story_content(story_id: str, request: StoryContinuationReques
             if "quiz" in generated_data:
                 try:
                     raw_quiz = generated_data["quiz"]
-                    print(f"Raw quiz data: {raw_quiz}")
+                    logger.debug("Raw quiz data: %s", truncate(raw_quiz))
                     if isinstance(raw_quiz, list):
                         quiz_list = [QuizItem(**item) for item in raw_quiz
                                     if isinstance(item, dict) and "question" in item and "options" in item and "correct_answer" in item]
-                        print(f"Processed quiz items: {len(quiz_list)} questions")
+                        logger.debug(f"Processed quiz items: {len(quiz_list)} questions")
                     else:
-                        print(f"Quiz is not a list: {type(raw_quiz)}")
+                        logger.warning(f"Quiz is not a list: {type(raw_quiz)}")
                 except Exception as e:
-                    print(f"Warning: Could not parse quiz: {e}")
+                    logger.warning(f"Could not parse quiz: {e}")
                     quiz_list = None
                     
             # Extract summary
@@ -266,17 +277,18 @@ async def continue_story_content(story_id: str, request: StoryContinuationReques
             )
 
         except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+            logger.error("OpenRouter request failed: %s - %s", e.response.status_code, truncate(e.response.text))
             raise Exception(f"LLM API request failed with status {e.response.status_code}.") from e
         except httpx.RequestError as e:
-            print(f"An error occurred while requesting {e.request.url!r}.")
+            logger.error(f"Network error while requesting {e.request.url!r}: {e}")
             raise Exception("Could not connect to the LLM API.") from e
         except json.JSONDecodeError as e:
-            print(f"Error decoding JSON response from LLM: {e}")
-            print(f"Received text: {result_json_str}")
+            PARSE_FAILURES.inc()
+            logger.error(f"Error decoding JSON response from LLM: {e}")
+            logger.debug("Received text: %s", truncate(result_json_str))
             raise ValueError("Could not parse the JSON response from the language model.") from e
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            logger.error(f"An unexpected error occurred: {e}")
             raise
 
 def _build_continuation_prompt(story_id: str, request: StoryContinuationRequest) -> Tuple[str, str]:
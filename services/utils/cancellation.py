@@ -0,0 +1,213 @@
+"""
+Cancelling upstream LLM calls when the client that asked for them disconnects.
+
+DisconnectMiddleware tracks the connection of every HTTP request. Upstream calls
+made while handling it go through ``shared_llm_call``:
+
+- identical concurrent calls share one upstream request (SharedCalls), and
+- each waiter gives up as soon as its own client disconnects
+  (cancel_on_disconnect), raising ClientDisconnected.
+
+The upstream request is cancelled only once no connected client is waiting
+for it any more, so coalesced callers still get their result.
+"""
+
+import json
+import asyncio
+import hashlib
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics
+from .tracing import route_template
+
+logger = logging.getLogger(__name__)
+
+CLIENT_DISCONNECTS = metrics.counter(
+    "http_client_disconnects_total",
+    "Requests whose pending upstream work was abandoned because the client disconnected.",
+    ("route",),
+)
+UPSTREAM_CANCELLATIONS = metrics.counter(
+    "llm_calls_cancelled_total",
+    "Upstream LLM calls cancelled because no connected client was waiting for them any more.",
+)
+COALESCED_CALLS = metrics.counter(
+    "llm_calls_coalesced_total",
+    "LLM calls that joined an identical call already in flight instead of starting a new one.",
+)
+
+
+class ClientDisconnected(asyncio.CancelledError):
+    """
+    The client went away while its request was waiting on upstream work.
+
+    A CancelledError, so that the `except Exception` error handling along the
+    request path lets it through; DisconnectMiddleware swallows it.
+    """
+
+
+class _Connection:
+    def __init__(self, scope: Scope, receive: Receive):
+        self.scope = scope
+        self._receive = receive
+        self._lock = asyncio.Lock()
+        self.disconnected = False
+
+    async def receive(self) -> Message:
+        message = await self._receive()
+        if message["type"] == "http.disconnect":
+            self.disconnected = True
+        return message
+
+    async def wait_for_disconnect(self) -> None:
+        """
+        Returns once the client disconnects. Only used after the request body
+        has been read, so the messages it consumes are nobody else's.
+        """
+        async with self._lock:
+            while not self.disconnected:
+                await self.receive()
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope) or self.scope.get("path", "")
+
+
+_current_connection: ContextVar[Optional[_Connection]] = ContextVar("current_connection", default=None)
+
+
+class DisconnectMiddleware:
+    """Makes the current HTTP connection available to cancel_on_disconnect."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        connection = _Connection(scope, receive)
+        token = _current_connection.set(connection)
+        try:
+            await self.app(scope, connection.receive, send)
+        except ClientDisconnected:
+            logger.info(f"Client disconnected from {scope.get('method')} {scope.get('path')}; request abandoned")
+        finally:
+            _current_connection.reset(token)
+
+
+def current_route() -> Optional[str]:
+    """Route template of the HTTP request being handled, if any (e.g. for attributing upstream calls)."""
+    connection = _current_connection.get()
+    return connection.route if connection is not None else None
+
+
+async def cancel_on_disconnect(awaitable: Awaitable[Any]) -> Any:
+    """
+    Awaits ``awaitable``, cancelling it if the client of the current request
+    disconnects first (outside a request, simply awaits it).
+
+    Raises:
+        ClientDisconnected: If the client disconnected before the result was ready.
+    """
+    connection = _current_connection.get()
+    if connection is None:
+        return await awaitable
+
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(connection.wait_for_disconnect())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if work.done():
+        return work.result()
+
+    work.cancel()
+    try:
+        await work  # Let the cancellation finish, e.g. close the upstream connection
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.debug(f"Abandoned upstream work failed while being cancelled: {e}")
+    CLIENT_DISCONNECTS.inc(route=connection.route)
+    raise ClientDisconnected(f"Client disconnected from {connection.route}")
+
+
+@dataclass
+class _SharedCall:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SharedCalls:
+    """
+    Coalesces identical concurrent calls: the first caller starts the call,
+    later callers with the same key wait for its result. A waiter that is
+    cancelled leaves the others waiting; the call itself is cancelled when
+    its last waiter is.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _SharedCall] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(
+        self, key: str, factory: Callable[[], Awaitable[Any]], on_coalesced: Optional[Callable[[], None]] = None
+    ) -> Any:
+        """Runs ``factory()`` or joins the call in flight for ``key`` (then calls ``on_coalesced``)."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _SharedCall(asyncio.ensure_future(factory()))
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+        else:
+            COALESCED_CALLS.inc()
+            if on_coalesced is not None:
+                on_coalesced()
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                self._forget(key, call)  # Callers arriving from now on start afresh
+                call.task.cancel()
+                UPSTREAM_CANCELLATIONS.inc()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _SharedCall) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+llm_calls = SharedCalls()
+
+
+def call_key(*parts: Any) -> str:
+    """Stable key for an upstream call made with these arguments."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+async def shared_llm_call(
+    key: str, factory: Callable[[], Awaitable[Any]], on_coalesced: Optional[Callable[[], None]] = None
+) -> Any:
+    """
+    Runs an upstream LLM call, sharing it with identical calls in flight, and
+    stops waiting as soon as the current client disconnects.
+
+    ``factory`` must be self-contained (open its own HTTP client), since the
+    call may outlive the request that started it. ``on_coalesced`` is called
+    (in the caller's context) when the call joins one already in flight.
+    """
+    return await cancel_on_disconnect(llm_calls.run(key, factory, on_coalesced))
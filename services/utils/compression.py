@@ -0,0 +1,127 @@
+"""
+Negotiated gzip/brotli compression of API responses.
+"""
+
+import os
+import gzip
+import logging
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; only gzip is offered without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this are sent as-is: compressing them saves little and costs CPU
+COMPRESSION_MIN_BYTES = int(os.getenv("API_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Dynamic content: far cheaper than the maximum 11, most of the gain
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "text/", "application/x-ndjson", "application/javascript", "image/svg+xml",
+    "application/msgpack", "application/cbor",  # Binary, but lesson payloads are mostly text
+)
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Parses an Accept-Encoding header into the encodings the client accepts (q > 0)."""
+    accepted = []
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name and quality > 0:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, available: List[str]) -> Optional[str]:
+    """Picks the preferred encoding (brotli, then gzip) that is both available and accepted."""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non-streamed) responses with brotli or gzip, whichever
+    the client prefers, once they reach ``minimum_size`` bytes.
+
+    Streamed responses, responses that already have a Content-Encoding (such as
+    pre-compressed static files) and non-text content types pass through untouched.
+
+    A strong ETag of a compressed response is made weak, since it was computed
+    for the identity bytes; If-None-Match compares weakly, so it still matches.
+    304 responses get the weak form too when that is what the client sent.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.available = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                if message["status"] == 304:
+                    headers = MutableHeaders(scope=message)
+                    etag = headers.get("etag", "")
+                    if etag.startswith('"') and f"W/{etag}" in request_headers.get("if-none-match", ""):
+                        headers["etag"] = f"W/{etag}"
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            content_type = headers.get("content-type", "")
+            compressible = not headers.get("content-encoding") and content_type.startswith(COMPRESSIBLE_TYPES)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if not compressible or message.get("more_body") or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            if headers.get("etag", "").startswith('"'):
+                headers["etag"] = f"W/{headers['etag']}"
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
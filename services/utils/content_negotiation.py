@@ -0,0 +1,211 @@
+"""
+MessagePack/CBOR content negotiation for the lesson API.
+
+Routes declared with ``route_class=NegotiatedRoute`` answer in MessagePack or
+CBOR when the Accept header prefers it, and accept request bodies in either
+format. Both use the same response models as JSON. JSON responses take
+FastAPI's usual path (its native model-to-JSON serialization where available);
+for MessagePack and CBOR the JSON the route rendered is re-encoded.
+Responses built by hand with negotiated_response() are encoded directly.
+"""
+
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+from .responses import OrjsonResponse, orjson
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency; MessagePack is not offered without it
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # Optional dependency; CBOR is not offered without it
+    cbor2 = None
+
+logger = logging.getLogger(__name__)
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# Other names clients use for the same formats
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/cbor-seq": CBOR,  # A sequence of one item is the item itself
+}
+
+
+def _encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, use_bin_type=True, default=str)
+
+
+def _decode_msgpack(body: bytes) -> Any:
+    return msgpack.unpackb(body, raw=False)
+
+
+CODECS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {}
+if msgpack is not None:
+    CODECS[MSGPACK] = (_encode_msgpack, _decode_msgpack)
+if cbor2 is not None:
+    CODECS[CBOR] = (cbor2.dumps, cbor2.loads)
+
+# Media type the current request negotiated (None for JSON), set by NegotiatedRoute
+_negotiated_media_type: ContextVar[Optional[str]] = ContextVar("negotiated_media_type", default=None)
+
+
+def normalize_media_type(value: str) -> str:
+    """Strips parameters from a media type and maps aliases onto MSGPACK/CBOR."""
+    media_type = value.split(";", 1)[0].strip().lower()
+    return MEDIA_TYPE_ALIASES.get(media_type, media_type)
+
+
+def preferred_media_type(accept: str, available: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Picks the binary format an Accept header prefers over JSON.
+
+    Exact media types beat application/* and */*; on a tie JSON wins, so
+    browsers and clients sending */* keep getting JSON.
+
+    Returns:
+        MSGPACK or CBOR, or None for JSON.
+    """
+    available = list(CODECS) if available is None else available
+    qualities: Dict[str, float] = {}
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type.strip():
+            qualities[normalize_media_type(media_type)] = quality
+
+    def rank(media_type: str) -> Tuple[float, int]:
+        for specificity, key in ((2, media_type), (1, "application/*"), (0, "*/*")):
+            if key in qualities:
+                return qualities[key], specificity
+        return 0.0, 0
+
+    best, best_rank = None, rank(JSON)
+    for media_type in available:
+        candidate = rank(media_type)
+        if candidate[0] > 0 and candidate > best_rank:
+            best, best_rank = media_type, candidate
+    return best
+
+
+def encode(content: Any, media_type: str) -> bytes:
+    return CODECS[media_type][0](content)
+
+
+def decode(body: bytes, media_type: str) -> Any:
+    """Decodes a MessagePack/CBOR body; raises ValueError if it is malformed."""
+    try:
+        return CODECS[media_type][1](body)
+    except Exception as e:
+        raise ValueError(f"Malformed {media_type} body: {e}") from e
+
+
+class NegotiatedResponse(OrjsonResponse if orjson is not None else JSONResponse):
+    """
+    Renders in the format the current request negotiated: MessagePack, CBOR,
+    or JSON (with orjson when installed) outside NegotiatedRoute or by default.
+    """
+
+    def __init__(self, content: Any, status_code: int = 200, *args, **kwargs):
+        self.negotiated_media_type = _negotiated_media_type.get()
+        if self.negotiated_media_type:
+            self.media_type = self.negotiated_media_type
+        super().__init__(content, status_code, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if self.negotiated_media_type:
+            return encode(content, self.negotiated_media_type)
+        return super().render(content)
+
+
+def negotiated_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Builds a response by hand in the format the current request negotiated."""
+    return NegotiatedResponse(content, status_code=status_code, headers=headers)
+
+
+class _BinaryBodyRequest(Request):
+    """
+    A request with a MessagePack/CBOR body, presented to FastAPI as a JSON
+    request whose json() returns the decoded body. FastAPI only hands bodies
+    it considers JSON to the body model, so the content type is rewritten.
+    """
+
+    def __init__(self, request: Request, media_type: str):
+        headers = [(name, value) for name, value in request.scope["headers"] if name != b"content-type"]
+        headers.append((b"content-type", JSON.encode()))
+        super().__init__({**request.scope, "headers": headers}, request.receive)
+        self.body_media_type = media_type
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = decode(await self.body(), self.body_media_type)
+        return self._json
+
+
+def _transcode(response: Response, media_type: str) -> Response:
+    """Re-encodes a JSON response in ``media_type``, keeping its status and headers."""
+    body = getattr(response, "body", None)  # Streaming responses have none
+    if not body or normalize_media_type(response.headers.get("content-type", "")) != JSON:
+        return response
+    content = orjson.loads(body) if orjson is not None else json.loads(body)
+    transcoded = Response(encode(content, media_type), status_code=response.status_code,
+                          media_type=media_type, background=response.background)
+    replaced = (b"content-length", b"content-type")
+    transcoded.raw_headers = [
+        *(header for header in response.raw_headers if header[0] not in replaced),
+        *(header for header in transcoded.raw_headers if header[0] in replaced),
+    ]
+    return transcoded
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    APIRoute that speaks MessagePack and CBOR besides JSON (see the module
+    docstring). Its response class stays the router's, so JSON keeps
+    FastAPI's native serialization.
+    """
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def negotiated_route_handler(request: Request) -> Response:
+            body_type = normalize_media_type(request.headers.get("content-type", ""))
+            if body_type in (MSGPACK, CBOR):
+                if body_type not in CODECS:
+                    raise HTTPException(
+                        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail=f"{body_type} request bodies are not supported by this server.",
+                    )
+                request = _BinaryBodyRequest(request, body_type)
+
+            media_type = preferred_media_type(request.headers.get("accept", ""))
+            token = _negotiated_media_type.set(media_type)
+            try:
+                response = await route_handler(request)
+            finally:
+                _negotiated_media_type.reset(token)
+            if media_type and not isinstance(response, NegotiatedResponse):
+                response = _transcode(response, media_type)
+            response.headers.add_vary_header("Accept")
+            return response
+
+        return negotiated_route_handler
@@ -0,0 +1,76 @@
+"""
+Sparse fieldsets: the `fields=` query parameter of the lesson and story endpoints.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel
+
+from .content_negotiation import negotiated_response
+
+# Fields that are always returned, so a projected item can still be fetched in full later
+ALWAYS_INCLUDED = ("id",)
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """
+    Parses a comma-separated field list against a response model.
+
+    Args:
+        fields: Value of the `fields=` query parameter.
+        model: Response model the fields must belong to.
+
+    Returns:
+        The selected field names in model order (None when all fields are wanted).
+
+    Raises:
+        ValueError: If a field is not part of the model.
+    """
+    if not fields or not fields.strip():
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(requested - set(model.model_fields))
+    if unknown:
+        raise ValueError(
+            f"Unknown field(s) {', '.join(unknown)}; available fields are {', '.join(model.model_fields)}"
+        )
+    requested.update(name for name in ALWAYS_INCLUDED if name in model.model_fields)
+    return [name for name in model.model_fields if name in requested]
+
+
+def fieldset_query(model: Type[BaseModel]) -> Callable[..., Optional[List[str]]]:
+    """Builds a dependency that reads `fields=` for ``model`` (422 on unknown fields)."""
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description=f"Comma-separated {model.__name__} fields to return (default: all). 'id' is always included.",
+        ),
+    ) -> Optional[List[str]]:
+        try:
+            return parse_fields(fields, model)
+        except ValueError as ve:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(ve))
+
+    return dependency
+
+
+def project(item: Any, fields: List[str]) -> Dict[str, Any]:
+    """Projects a response model (or an already-projected dict) onto ``fields``, leaving out nulls."""
+    if isinstance(item, BaseModel):
+        return item.model_dump(mode="json", include=set(fields), exclude_none=True)
+    return {name: item[name] for name in fields if item.get(name) is not None}
+
+
+def projected_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """
+    Wraps projected content in a response, bypassing response_model validation
+    (a projection is missing required fields by design). Status and headers set
+    on the endpoint's injected ``response`` are carried over, and the body is
+    encoded in the format the request negotiated.
+    """
+    if response is not None and response.status_code:
+        status_code = response.status_code
+    headers = dict(response.headers) if response is not None else None
+    return negotiated_response(content, status_code=status_code, headers=headers)
@@ -0,0 +1,133 @@
+"""
+Event loop lag monitoring, and a watchdog that reports blocking callbacks.
+
+A monitor task sleeps LOOP_LAG_INTERVAL seconds at a time and records how
+late it wakes up. The lateness is the event loop lag: the time some callback
+held the loop without yielding, e.g. a synchronous database call inside an
+async handler. The lags are exported at /metrics in two ways:
+
+- the ``event_loop_lag_seconds`` histogram;
+- the p50/p90/p99/max of the last minute, as ``event_loop_lag_quantile_seconds``.
+
+With LOOP_WATCHDOG=true (meant for staging), a watchdog thread also notices
+while the loop is blocked for more than LOOP_BLOCK_THRESHOLD seconds. It logs
+the stack of the code blocking the loop, and then how long the block lasted.
+
+LoopWatchdogMiddleware starts both in each worker once its event loop runs.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG", "false").lower() == "true"
+BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+# Seconds of lag samples the quantiles are computed over
+QUANTILE_WINDOW = 60.0
+QUANTILES = {"0.5": 0.5, "0.9": 0.9, "0.99": 0.99, "max": 1.0}
+STACK_LIMIT = 25
+
+LAG = metrics.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer, i.e. how long callbacks held the loop.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LAG_QUANTILES = metrics.gauge(
+    "event_loop_lag_quantile_seconds",
+    "Event loop lag percentiles over the last minute, per worker.",
+    ("quantile", "worker"),
+)
+BLOCKED = metrics.counter(
+    "event_loop_blocked_total",
+    "Times the watchdog saw the event loop blocked for longer than LOOP_BLOCK_THRESHOLD.",
+)
+
+
+class LoopMonitor:
+    def __init__(
+        self, interval: float = LAG_INTERVAL, watchdog: bool = WATCHDOG_ENABLED, threshold: float = BLOCK_THRESHOLD
+    ):
+        self.interval = interval
+        self.watchdog = watchdog
+        self.threshold = threshold
+        self.lags: deque = deque(maxlen=max(1, int(QUANTILE_WINDOW / interval)))
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop (call from inside it)."""
+        if self.running:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._measure(), name="loop-lag-monitor")
+        if self.watchdog:
+            threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+            logger.info(f"Event loop watchdog on: reporting blocks longer than {self.threshold * 1000:.0f}ms")
+
+    async def _measure(self) -> None:
+        worker = str(os.getpid())
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            lag = max(0.0, self.heartbeat - before - self.interval)
+            LAG.observe(lag)
+            self.lags.append(lag)
+            ordered = sorted(self.lags)
+            for label, quantile in QUANTILES.items():
+                LAG_QUANTILES.set(ordered[min(len(ordered) - 1, int(quantile * len(ordered)))], quantile=label, worker=worker)
+
+    def _overdue(self) -> float:
+        """Seconds the monitor task is late for its next wake-up."""
+        return time.monotonic() - self.heartbeat - self.interval
+
+    def _watch(self) -> None:
+        blocked_at: Optional[float] = None
+        while self.running or self._task is None:
+            time.sleep(self.threshold / 2)
+            overdue = self._overdue()
+            if blocked_at is None and overdue > self.threshold:
+                blocked_at = self.heartbeat
+                BLOCKED.inc()
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame else "(no stack)\n"
+                logger.warning(
+                    f"Event loop blocked for more than {overdue * 1000:.0f}ms; the loop is running:\n{stack.rstrip()}"
+                )
+            elif blocked_at is not None and self.heartbeat != blocked_at:
+                logger.warning(f"Event loop was blocked for about {(self.heartbeat - blocked_at - self.interval) * 1000:.0f}ms")
+                blocked_at = None
+
+
+loop_monitor = LoopMonitor()
+
+
+class LoopWatchdogMiddleware:
+    """Starts the loop monitor of this worker with its first lifespan or request event."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not loop_monitor.running:
+            loop_monitor.start()
+        await self.app(scope, receive, send)
@@ -0,0 +1,333 @@
+"""
+In-process application metrics, exposed in the Prometheus text format at /metrics.
+
+Metrics are registered once at import time of the module that records them:
+
+    CANCELLATIONS = metrics.counter("llm_calls_cancelled_total", "Upstream LLM calls cancelled")
+    CANCELLATIONS.inc()
+
+Recording is a dictionary update under a lock, cheap enough for hot paths.
+With several workers (SHARED_STATE_DIR set), each worker periodically writes a
+snapshot of its metrics to that directory, and /metrics sums the snapshots of
+all live workers, so a scrape sees the whole server whichever worker answers.
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; covers everything from a cache lookup to a slow generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[Dict[str, str], Any]]:
+        """Current values as ({label: value}, value) pairs."""
+        with self._lock:
+            items = [(key, list(value) if isinstance(value, list) else value) for key, value in self._values.items()]
+        if not items and not self.labelnames and self.kind in ("counter", "gauge"):
+            items = [((), 0.0)]  # Unlabelled series exist from the start
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name, "kind": self.kind, "documentation": self.documentation,
+            "labelnames": list(self.labelnames), "buckets": list(getattr(self, "buckets", ())),
+            "values": [[list(labels.values()), value] for labels, value in self.samples()],
+        }
+
+
+class Counter(_Metric):
+    """A monotonically increasing value, optionally split by labels."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, such as work in progress."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Counts the enclosed block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. durations in seconds) over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per-bucket (non-cumulative) counts, then +Inf, sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes how long the enclosed block takes, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+class FunctionMetric(_Metric):
+    """A counter or gauge whose value is read from ``func`` at collection time."""
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, documentation)
+        self.func = func
+        self.kind = kind
+
+    def samples(self) -> List[Tuple[Dict[str, str], Any]]:
+        try:
+            return [({}, float(self.func()))]
+        except Exception as e:
+            logger.warning(f"Could not collect metric {self.name}: {e}")
+            return []
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Registers ``metric``, or returns the one already registered under its name."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} is already registered with a different type or labels.")
+            return existing
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def function(self, name: str, documentation: str, func: Callable[[], float], kind: str = "gauge") -> FunctionMetric:
+        """Registers a metric read from ``func``; re-registering replaces the function."""
+        metric = FunctionMetric(name, documentation, func, kind)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def collect(self) -> List[_Metric]:
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [metric.snapshot() for metric in self.collect()]
+
+
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+function = REGISTRY.function
+
+
+# --- Exposition ---
+
+def merge_snapshots(snapshots: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Sums the metrics of several processes, matching series by name and labels."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for metric in snapshot:
+            target = merged.setdefault(metric["name"], {**metric, "values": {}})
+            for labels, value in metric["values"]:
+                key = tuple(labels)
+                current = target["values"].get(key)
+                if current is None:
+                    target["values"][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target["values"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["values"][key] = current + value
+    return [{**metric, "values": list(metric["values"].items())} for _, metric in sorted(merged.items())]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: List[str], values: List[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshot: List[Dict[str, Any]]) -> str:
+    """Renders merged snapshots in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in snapshot:
+        name, names = metric["name"], metric["labelnames"]
+        lines.append(f"# HELP {name} {_escape(metric['documentation'])}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for labels, value in metric["values"]:
+            labels = list(labels)
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], value[:-2]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{name}_bucket{_labels(names, labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Multi-worker snapshots ---
+
+def _snapshot_path(directory: Path, pid: int) -> Path:
+    return directory / f"metrics-{pid}.json"
+
+
+def write_snapshot(directory: Path) -> None:
+    path = _snapshot_path(directory, os.getpid())
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(REGISTRY.snapshot()))
+    os.replace(temporary, path)  # Readers never see a partial file
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshots(directory: Path) -> List[List[Dict[str, Any]]]:
+    """Snapshots written by the other live workers; files of exited workers are removed."""
+    snapshots = []
+    for path in directory.glob("metrics-*.json"):
+        try:
+            pid = int(path.stem.split("-", 1)[1])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        if not _pid_alive(pid):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError) as e:
+            logger.debug(f"Skipping unreadable metrics snapshot {path}: {e}")
+    return snapshots
+
+
+_writer_pid: Optional[int] = None
+
+
+def start_snapshot_writer(directory: Path, interval: float = 5.0) -> None:
+    """Writes this worker's snapshot every ``interval`` seconds from a daemon thread (once per process)."""
+    global _writer_pid
+    if _writer_pid == os.getpid():
+        return
+    _writer_pid = os.getpid()
+
+    def loop() -> None:
+        while True:
+            try:
+                write_snapshot(directory)
+            except OSError as e:
+                logger.warning(f"Could not write metrics snapshot to {directory}: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-snapshot", daemon=True).start()
+
+
+def exposition(directory: Optional[Path] = None) -> str:
+    """This process's metrics, summed with the other workers' snapshots in ``directory`` if given."""
+    snapshots = [REGISTRY.snapshot()]
+    if directory is not None:
+        snapshots.extend(read_snapshots(directory))
+    return render(merge_snapshots(snapshots))
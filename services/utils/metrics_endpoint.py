@@ -0,0 +1,32 @@
+"""
+GET /metrics: the Prometheus scrape endpoint, included by both apps.
+
+In multi-worker mode every worker writes its metrics to SHARED_STATE_DIR every
+METRICS_SNAPSHOT_INTERVAL seconds, and the endpoint reports the sum over all
+workers (see services/utils/metrics.py).
+"""
+
+import os
+
+from fastapi import APIRouter, Response
+
+from . import metrics
+from .shared_state import shared_state_dir
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+router = APIRouter(tags=["Monitoring"])
+
+
+def start_worker_snapshots() -> None:
+    """Starts writing this worker's snapshots when workers share a state directory."""
+    directory = shared_state_dir()
+    if directory is not None:
+        metrics.start_snapshot_writer(directory, SNAPSHOT_INTERVAL)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Metrics of the whole server in the Prometheus text format."""
+    return Response(metrics.exposition(shared_state_dir()), media_type=CONTENT_TYPE)
@@ -0,0 +1,183 @@
+"""
+On-demand sampling profiler for single requests (admins only).
+
+A request sent with the admin token (X-Admin-Token) and either an
+``X-Profile`` header or a ``profile`` query parameter is profiled. While it
+runs, a background thread samples the event loop thread's stack every
+PROFILE_INTERVAL seconds (default 0.005). Each sample is attributed to one
+of three roots:
+
+- ``request``: the task handling the profiled request;
+- ``other-task``: other tasks, e.g. a shared LLM call or concurrent requests;
+- ``awaiting-io``: the loop waiting on sockets.
+
+Pydantic validation, JSON decoding and prompt building therefore appear as
+ordinary frames, and time spent awaiting I/O appears as its own bar.
+
+The result uses the folded-stack format of flamegraph.pl (speedscope.app
+opens it too). With ``store`` (the default mode) it is written to
+PROFILE_DIR, and the file name is returned in the X-Profile-File header.
+With ``inline`` it replaces the response body.
+
+Without ADMIN_TOKEN the middleware passes every request straight through.
+Other requests pay for one header lookup and are never sampled.
+"""
+
+import os
+import re
+import sys
+import hmac
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .tracing import current_trace_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = Path(__file__).parent.parent.parent / "data" / "profiles"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+MAX_STACK_DEPTH = 128
+
+_UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+# Event loop frames below the task being run; stacks are cut there
+_LOOP_FILES = ("asyncio/events.py", "asyncio/base_events.py", "asyncio/runners.py", "uvloop")
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def fold_stack(frame: Optional[FrameType]) -> List[str]:
+    """The frames of a stack from the outermost frame of the running task inward (loop machinery dropped)."""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        if frame.f_code.co_filename.replace("\\", "/").endswith(_LOOP_FILES):
+            break
+        frames.append(_frame_label(frame))
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+class RequestProfiler:
+    """Samples the stack of the event loop thread while one task runs."""
+
+    def __init__(self, task: asyncio.Task, interval: float = PROFILE_INTERVAL):
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.started = self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            running = asyncio.tasks._current_tasks.get(self.loop)
+            if running is None:
+                root = ["awaiting-io"]
+            elif running is self.task:
+                root = ["request"]
+            else:
+                root = ["other-task", running.get_name()]
+            self.samples[";".join(root + fold_stack(frame))] += 1
+
+    def folded(self) -> str:
+        """The samples in flamegraph.pl's folded format: one "frame;frame;... count" line per stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _admin_token_valid(token: Optional[str]) -> bool:
+    admin_token = os.getenv("ADMIN_TOKEN")
+    return bool(admin_token and token and hmac.compare_digest(token, admin_token))
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it with X-Profile (or ?profile=) and a valid X-Admin-Token."""
+
+    def __init__(self, app: ASGIApp, profile_dir: Optional[str] = None):
+        self.app = app
+        self.profile_dir = Path(profile_dir or os.getenv("PROFILE_DIR") or DEFAULT_PROFILE_DIR)
+
+    def _requested_mode(self, scope: Scope) -> Optional[str]:
+        if scope["type"] != "http" or not os.getenv("ADMIN_TOKEN"):
+            return None
+        headers = Headers(scope=scope)
+        mode = headers.get("x-profile")
+        if mode is None and b"profile" in scope.get("query_string", b""):
+            mode = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [None])[0]
+        if mode is None or not _admin_token_valid(headers.get("x-admin-token")):
+            return None
+        return "inline" if mode.lower() == "inline" else "store"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        mode = self._requested_mode(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = RequestProfiler(asyncio.current_task())
+        name = self._profile_name(scope)
+
+        async def send_with_profile(message: Message) -> None:
+            if mode == "inline":
+                return  # The profile replaces the response
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-File", name)
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profiler.stop()
+            folded = profiler.folded()
+            logger.info(
+                f"Profiled {scope['method']} {scope['path']}: {sum(profiler.samples.values())} samples "
+                f"over {profiler.duration * 1000:.0f}ms"
+            )
+        if mode == "inline":
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"x-profile-file", name.encode())],
+            })
+            await send({"type": "http.response.body", "body": folded.encode("utf-8")})
+        else:
+            # Written after the response went out, so storing it does not delay the client
+            await asyncio.to_thread(self._store, name, folded)
+
+    def _profile_name(self, scope: Scope) -> str:
+        path = _UNSAFE_NAME_RE.sub("_", scope["path"].strip("/")) or "root"
+        trace_id = current_trace_id()  # Links the profile to the request's trace
+        suffix = f"-{trace_id[:16]}" if trace_id else ""
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{path[:60]}{suffix}.folded"
+
+    def _store(self, name: str, folded: str) -> None:
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            (self.profile_dir / name).write_text(folded, encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Could not store profile {name} in {self.profile_dir}: {e}")
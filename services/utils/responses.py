@@ -0,0 +1,45 @@
+"""
+Default JSON response class for the API routers.
+"""
+
+import inspect
+import logging
+from typing import Any
+
+from fastapi import routing
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional dependency; the stdlib encoder is used without it
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered with orjson (several times faster than the stdlib encoder)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _fastapi_dumps_models_natively() -> bool:
+    """
+    Newer FastAPI versions serialize response models straight to JSON bytes
+    with pydantic-core when the default JSONResponse is used, which beats
+    dumping the model to Python objects and encoding those with orjson.
+    """
+    return "dump_json" in inspect.signature(routing.serialize_response).parameters
+
+
+# DefaultJSONResponse is for building responses by hand; routers take
+# ROUTER_RESPONSE_CLASS. FastAPI only uses its native path while the response
+# class is left at its default, so passing JSONResponse explicitly would turn it off.
+if _fastapi_dumps_models_natively() or orjson is None:
+    DefaultJSONResponse = JSONResponse
+    ROUTER_RESPONSE_CLASS = Default(JSONResponse)
+else:
+    DefaultJSONResponse = OrjsonResponse
+    ROUTER_RESPONSE_CLASS = OrjsonResponse
@@ -0,0 +1,202 @@
+"""
+State shared by the worker processes of a multi-worker deployment.
+
+With SHARED_STATE_DIR set (start.sh sets it when WEB_CONCURRENCY > 1), caches,
+rate limits and job state live in a SQLite file in that directory, which every
+worker on the host opens; no external service is needed. Without it the same
+API is backed by an in-memory database private to the process.
+
+    from services.utils.shared_state import shared_state
+    shared_state.incr("ratelimit:requests", ttl=60)
+
+run_once() coordinates startup work (migrations, asset builds, warmup) so that
+it runs in only one of the workers started together.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; run_once then runs the task in every worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STATE_FILENAME = "shared-state.sqlite3"
+
+
+def shared_state_dir() -> Optional[Path]:
+    """Directory holding the cross-process state, or None in single-process mode."""
+    value = os.getenv("SHARED_STATE_DIR")
+    return Path(value) if value else None
+
+
+def worker_count() -> int:
+    """Number of worker processes the server is started with (WEB_CONCURRENCY, default 1)."""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        logger.warning(f"Invalid WEB_CONCURRENCY={os.getenv('WEB_CONCURRENCY')!r}; using 1 worker")
+        return 1
+
+
+class SharedState:
+    """
+    A key/value store with per-key expiry. Values are anything JSON can
+    represent. Every operation is atomic across threads and, when the store is
+    file-backed, across processes.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        if self.is_shared:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    @property
+    def is_shared(self) -> bool:
+        return self.path != ":memory:"
+
+    @classmethod
+    def from_env(cls) -> "SharedState":
+        directory = shared_state_dir()
+        if directory is None:
+            if worker_count() > 1:
+                logger.warning(
+                    "WEB_CONCURRENCY > 1 but SHARED_STATE_DIR is not set; caches and rate limits are per worker."
+                )
+            return cls()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            state = cls(str(directory / STATE_FILENAME))
+            logger.info(f"Shared state at {state.path}")
+            return state
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Could not open shared state in {directory}: {e}. Using per-process state.")
+            return cls()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Holds the database write lock, so read-modify-write sequences are atomic."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, key: str) -> Any:
+        row = conn.execute(
+            "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, key: str, value: Any, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        conn.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, default=str), expires_at),
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._read(self._conn, key)
+        return default if value is None else value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores ``value`` under ``key``, expiring after ``ttl`` seconds (never by default)."""
+        with self._transaction() as conn:
+            self._write(conn, key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def update(self, key: str, func: Callable[[Any], T], ttl: Optional[float] = None) -> T:
+        """
+        Atomically replaces the value of ``key`` with ``func(current value)``
+        (current value is None if unset or expired) and returns the new value.
+        ``func`` runs while the store is locked, so it must be quick.
+        """
+        with self._transaction() as conn:
+            value = func(self._read(conn, key))
+            self._write(conn, key, value, ttl)
+        return value
+
+    def incr(self, key: str, amount: float = 1, ttl: Optional[float] = None) -> float:
+        """
+        Adds ``amount`` to a counter and returns its new value. ``ttl`` applies
+        when the counter is created, so it works as a fixed window.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                value = amount
+                self._write(conn, key, value, ttl)
+            else:
+                value = json.loads(row[0]) + amount
+                conn.execute("UPDATE shared_state SET value = ? WHERE key = ?", (json.dumps(value), key))
+        return value
+
+    def purge_expired(self) -> int:
+        """Deletes expired keys; returns how many were removed."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+
+
+# Process-wide store; file-backed (and shared by the workers) when SHARED_STATE_DIR is set
+shared_state = SharedState.from_env()
+
+
+def run_once(name: str, func: Callable[[], T]) -> Optional[T]:
+    """
+    Runs startup task ``name`` in only one of the workers started together.
+
+    Workers of one start share STARTUP_ID (exported by start.sh). The first to
+    take the task's lock runs it; the others wait for it to finish and skip the
+    task, unless it failed, in which case the next worker retries it. Without
+    SHARED_STATE_DIR or STARTUP_ID, ``func`` simply runs.
+
+    Returns:
+        The result of ``func``, or None where another worker already ran it.
+    """
+    directory = shared_state_dir()
+    startup_id = os.getenv("STARTUP_ID")
+    if directory is None or not startup_id or fcntl is None or not shared_state.is_shared:
+        return func()
+
+    marker = f"startup:{name}"
+    with open(directory / f"{name}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)  # Held until the file is closed
+        if shared_state.get(marker) == startup_id:
+            logger.info(f"Startup task {name} already ran in another worker; skipping")
+            return None
+        result = func()
+        shared_state.set(marker, startup_id)
+        return result
@@ -0,0 +1,179 @@
+"""
+Non-blocking, structured logging for both apps.
+
+``configure_logging()`` routes every record, uvicorn's included, through a
+bounded in-memory queue. A background thread formats the queued records and
+writes them to stdout. Logging from the event loop is then only a queue put,
+and it never waits on stdout or the log pipeline. When the queue is full,
+records are dropped and counted in ``log_records_dropped_total`` rather
+than blocking.
+
+Settings:
+- LOG_FORMAT picks the output: "json" (the default) gives one JSON object
+  per line, with the trace ID of the current span; "text" is the classic
+  format.
+- LOG_SAMPLING keeps only a share of a logger's records below WARNING, for
+  high-volume messages. Example: "services.llm.client=0.1,main=0.01".
+- Payload dumps belong at DEBUG level and go through ``truncate()``, as a
+  %-style argument so nothing is rendered unless the record is emitted:
+
+    logger.debug("Raw quiz data: %s", truncate(raw_quiz))
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Any, Dict, Optional
+
+from . import metrics
+from .tracing import current_trace_id
+
+DROPPED = metrics.counter(
+    "log_records_dropped_total",
+    "Log records dropped because the log queue was full.",
+)
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Characters of a payload kept by truncate()
+LOG_PAYLOAD_LIMIT = int(os.getenv("LOG_PAYLOAD_LIMIT", "500"))
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Attributes every LogRecord has; anything else was passed in `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "trace_id", "color_message"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class truncate:
+    """
+    ``value`` as text cut to ``limit`` characters (LOG_PAYLOAD_LIMIT by
+    default), rendered only when the log message is.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = LOG_PAYLOAD_LIMIT if limit is None else limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text) - self.limit} more characters)"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, trace ID, extra fields and exception."""
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of the records below WARNING from the configured loggers (and their children)."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    @classmethod
+    def from_env(cls) -> "SamplingFilter":
+        rates = {}
+        for part in os.getenv("LOG_SAMPLING", "").split(","):
+            name, _, rate = part.partition("=")
+            try:
+                rates[name.strip()] = float(rate)
+            except ValueError:
+                continue
+        return cls(rates)
+
+    def rate(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        return random.random() < self.rate(record.name)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue without waiting, dropping them when it is full.
+    Records are made self-contained first (message rendered, traceback as text,
+    trace ID captured), since they are formatted on another thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None) -> None:
+    """
+    Replaces the root logger's handlers with the queue handler and starts the
+    writer thread (once per process; later calls only update the level).
+    Uvicorn's loggers propagate to the root, so their output is queued too.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    if _listener is not None:
+        return
+
+    log_format = (log_format or os.getenv("LOG_FORMAT", "json")).lower()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(SamplingFilter.from_env())
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Flushes what is still queued
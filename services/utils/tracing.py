@@ -0,0 +1,344 @@
+"""
+Lightweight request tracing with OpenTelemetry span semantics, no collector needed.
+
+TracingMiddleware starts a root span for every HTTP request, continuing the
+trace of an incoming W3C ``traceparent`` header. Code on the request path
+opens child spans with ``span()``:
+
+    with tracing.span("parse"):
+        data = json.loads(raw)
+
+The generation stages get theirs from services/llm/instrumentation.stage().
+post_completion opens one span per OpenRouter attempt, so retries appear as
+sibling spans. The current span lives in a contextvar, so spans follow the
+request into the tasks it starts.
+
+Finished traces go to the exporter that TRACE_EXPORTER names:
+- "console" logs one JSON line per span on the ``tracing`` logger.
+- "file" appends JSON lines to TRACE_FILE, from a background thread.
+- "none" (the default) exports nothing.
+TRACE_SAMPLE_RATE sets the share of traces exported. Every response
+carries a Server-Timing header with its span durations summed per name, for
+the browser devtools, and an X-Trace-Id header to look the trace up.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import secrets
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+span_logger = logging.getLogger("tracing")
+
+DEFAULT_TRACE_FILE = Path(__file__).parent.parent.parent / "data" / "traces.jsonl"
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+# Finished traces waiting for the file exporter's writer thread
+TRACE_QUEUE_SIZE = 1000
+
+DROPPED_SPANS = metrics.counter(
+    "trace_spans_dropped_total",
+    "Spans not exported because the trace file writer had fallen behind.",
+)
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_TIMING_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class _Trace:
+    """The spans of one trace in this process, exported together when its local root ends."""
+
+    __slots__ = ("trace_id", "sampled", "spans", "timings", "exported")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.timings: Dict[str, float] = {}
+        self.exported = False
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace", "span_id", "parent_id", "attributes", "events", "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, kind: str, trace: _Trace, parent_id: Optional[str], attributes: Optional[Dict[str, Any]]):
+        self.name = name
+        self.kind = kind
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes or {}})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The span in (flattened) OTLP JSON form."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind.upper()}",
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_UNSET"},
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+# --- Exporters ---
+
+class FileExporter:
+    """
+    Appends spans as JSON lines. export() only queues them; a writer thread
+    serializes and writes them, so the event loop never waits on the disk.
+    Traces that arrive while the queue is full are dropped.
+    """
+
+    def __init__(self, path: str, queue_size: int = TRACE_QUEUE_SIZE):
+        self.path = Path(path)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+
+    def export(self, spans: List[Span]) -> None:
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            DROPPED_SPANS.inc(len(spans))
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_forever, name="trace-exporter", daemon=True)
+                self._writer.start()
+                atexit.register(self._queue.join)  # Writes what is still queued
+
+    def _write_forever(self) -> None:
+        while True:
+            batches = [self._queue.get()]
+            while len(batches) < 100:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for spans in batches for span in spans)
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(lines)
+            except Exception as e:
+                logger.warning(f"Could not write {len(batches)} trace(s) to {self.path}: {e}")
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+
+
+class ConsoleExporter:
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            span_logger.info(json.dumps(span.to_dict(), default=str))
+
+
+def exporter_from_env():
+    name = os.getenv("TRACE_EXPORTER", "none").lower()
+    if name == "file":
+        return FileExporter(os.getenv("TRACE_FILE") or str(DEFAULT_TRACE_FILE))
+    if name == "console":
+        return ConsoleExporter()
+    if name not in ("", "none"):
+        logger.warning(f"Unknown TRACE_EXPORTER '{name}'; traces are not exported")
+    return None
+
+
+exporter = exporter_from_env()
+
+
+def _export(spans: List[Span]) -> None:
+    try:
+        exporter.export(spans)
+    except Exception as e:  # Never fail a request because its trace could not be written
+        logger.warning(f"Could not export {len(spans)} span(s): {e}")
+
+
+# --- Spans ---
+
+def _start(
+    name: str, kind: str, attributes: Optional[Dict[str, Any]],
+    trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None, sampled: Optional[bool] = None,
+) -> Span:
+    parent = _current_span.get()
+    if parent is not None and trace_id is None:
+        return Span(name, kind, parent.trace, parent.span_id, attributes)
+    if sampled is None:
+        sampled = random.random() < SAMPLE_RATE
+    trace = _Trace(trace_id or secrets.token_hex(16), sampled and exporter is not None)
+    return Span(name, kind, trace, remote_parent_id, attributes)
+
+
+def _finish(span: Span, is_root: bool) -> None:
+    span.end_ns = time.time_ns()
+    trace = span.trace
+    if not is_root:
+        key = _TIMING_NAME_RE.sub("_", span.name)
+        trace.timings[key] = trace.timings.get(key, 0.0) + span.duration_ms
+    if not trace.sampled:
+        return
+    if trace.exported:
+        _export([span])  # Outlived its request, e.g. an LLM call shared with another client
+        return
+    trace.spans.append(span)
+    if is_root:
+        trace.exported = True
+        _export(trace.spans)
+
+
+@contextmanager
+def _activate(current: Span, is_root: bool) -> Iterator[Span]:
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current, is_root)
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, kind: str = "internal"):
+    """
+    Context manager timing the enclosed block as a span, a child of the
+    current span (outside a trace, the root of a new one). Exceptions mark
+    the span as failed and propagate.
+    """
+    current = _start(name, kind, attributes)
+    return _activate(current, is_root=current.parent_id is None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Sets an attribute on the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def add_event(name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+    """Records a point-in-time event (such as a JSON repair) on the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.add_event(name, attributes)
+
+
+def server_timing(root: Span) -> str:
+    """Server-Timing header value: the span durations of the trace so far, and the total."""
+    entries = [f"{name};dur={duration:.1f}" for name, duration in root.trace.timings.items()]
+    entries.append(f"total;dur={root.duration_ms:.1f}")
+    return ", ".join(entries)
+
+
+def parse_traceparent(value: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[bool]]:
+    """(trace ID, parent span ID, sampled) from a W3C traceparent header; Nones if absent or invalid."""
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None, None, None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def route_template(scope: Scope) -> Optional[str]:
+    """
+    Full path template of the route that handled a request, e.g.
+    "/api/lessons/{lesson_id}", or None before routing.
+
+    FastAPI may not copy the routes of included routers, in which case the
+    route's own path lacks the include prefixes. The prefix is then recovered
+    as the part of the request path in front of what the route matched.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    path_regex = getattr(route, "path_regex", None)
+    if not template or path_regex is None:
+        return template
+    path = scope.get("path", "")
+    for index, char in enumerate(path):
+        if char == "/" and path_regex.match(path[index:]):
+            return path[:index] + template
+    return template
+
+
+class TracingMiddleware:
+    """Traces every HTTP request and adds Server-Timing and X-Trace-Id headers to its response."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id, parent_id, sampled = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        root = _start(f"{scope['method']} {scope['path']}", "server", attributes, trace_id, parent_id, sampled)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(root))
+                headers.append("X-Trace-Id", root.trace_id)
+            await send(message)
+
+        with _activate(root, is_root=True):
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                # Known only once routing is done, e.g. "POST /api/lessons/generate"
+                route = route_template(scope)
+                if route:
+                    root.name = f"{scope['method']} {route}"
+                    root.set_attribute("http.route", route)
@@ -5,7 +5,10 @@ This module provides validation functions for various inputs
 to ensure data consistency and error handling.
 """
 
-from typing import Dict, Any, Optional, List
+import re
+import json
+import hashlib
+from typing import Dict, Any, Optional, List, Tuple
 
 def validate_api_key(api_key: Optional[str]) -> bool:
     """
@@ -83,4 +86,220 @@ def validate_request_fields(data: Dict[str, Any], required_fields: List[str]) ->
     for field in required_fields:
         if field not in data or data[field] is None:
             missing_fields.append(field)
-    return missing_fields 
\ No newline at end of file
+    return missing_fields
+
+# --- Canonicalization ---
+#
+# Grade, subject and language arrive as free-form strings ("5", "Grade 5", "5th";
+# "English", "en"; "Biology", "biology "). The tables below map the common
+# spellings onto one canonical value so that identical requests build identical
+# prompts and share cache, coalescing and similarity keys.
+
+ORDINAL_GRADES = {
+    "first": "1", "second": "2", "third": "3", "fourth": "4", "fifth": "5", "sixth": "6",
+    "seventh": "7", "eighth": "8", "ninth": "9", "tenth": "10", "eleventh": "11", "twelfth": "12",
+}
+
+GRADE_ALIASES = {
+    "k": "K", "kg": "K", "kindergarten": "K", "kinder": "K", "reception": "K", "0": "K",
+    "university": "university", "college": "university", "undergraduate": "university",
+    "uni": "university", "higher education": "university",
+}
+
+SUBJECT_ALIASES = {
+    "bio": "biology", "biological sciences": "biology",
+    "chem": "chemistry",
+    "phys": "physics",
+    "math": "mathematics", "maths": "mathematics",
+    "lit": "literature",
+    "med": "medicine",
+}
+
+# ISO 639-1 code -> English name used in prompts and responses
+LANGUAGE_NAMES = {
+    "en": "English", "es": "Spanish", "fr": "French", "de": "German", "it": "Italian",
+    "pt": "Portuguese", "nl": "Dutch", "pl": "Polish", "tr": "Turkish", "ru": "Russian",
+    "zh": "Chinese", "ja": "Japanese", "ko": "Korean", "ar": "Arabic", "hi": "Hindi",
+}
+
+# Alternate spellings (endonyms and ISO 639-2 codes) -> ISO 639-1 code
+LANGUAGE_ALIASES = {
+    "eng": "en", "english": "en",
+    "spa": "es", "español": "es", "espanol": "es", "castellano": "es",
+    "fra": "fr", "fre": "fr", "français": "fr", "francais": "fr",
+    "deu": "de", "ger": "de", "deutsch": "de",
+    "ita": "it", "italiano": "it",
+    "por": "pt", "português": "pt", "portugues": "pt",
+    "nld": "nl", "dut": "nl", "nederlands": "nl",
+    "pol": "pl", "polski": "pl",
+    "tur": "tr", "türkçe": "tr", "turkce": "tr",
+    "rus": "ru", "русский": "ru",
+    "zho": "zh", "chi": "zh", "mandarin": "zh", "中文": "zh",
+    "jpn": "ja", "日本語": "ja",
+    "kor": "ko", "한국어": "ko",
+    "ara": "ar", "العربية": "ar",
+    "hin": "hi", "हिन्दी": "hi",
+}
+LANGUAGE_ALIASES.update({name.lower(): code for code, name in LANGUAGE_NAMES.items()})
+
+# Request fields that are canonicalized, and the free-text ones that are tidied
+# (and case-folded in keys only, so prompts and responses keep their casing)
+CANONICAL_FIELDS = ("academic_grade", "subject", "language")
+FOLDED_FIELDS = ("topic", "other_subject", "subject_specification")
+
+def collapse_whitespace(value: Optional[str]) -> Optional[str]:
+    """
+    Trim a free-text value and collapse its runs of whitespace.
+
+    Args:
+        value: Text to tidy
+
+    Returns:
+        The tidied text, or None if it is empty
+    """
+    if value is None:
+        return None
+    return " ".join(value.split()) or None
+
+def fold_text(value: Optional[str]) -> Optional[str]:
+    """
+    Collapse whitespace and case-fold a free-text value.
+
+    Args:
+        value: Text to fold
+
+    Returns:
+        The folded text, or None if it is empty
+    """
+    if value is None:
+        return None
+    folded = " ".join(value.split()).casefold()
+    return folded or None
+
+def normalize_grade(grade: str) -> str:
+    """
+    Map a grade level onto 'K', '1'-'12' or 'university'.
+
+    Args:
+        grade: Grade level as entered (e.g., '5', 'Grade 5', '5th', 'fifth grade')
+
+    Returns:
+        The canonical grade, or the folded input if it is not recognized
+    """
+    folded = fold_text(grade) or ""
+    # 'Year N' is left alone: UK years run one ahead of US grades (Year 7 is grade 6)
+    stripped = re.sub(r"\b(grade|class|level)\b", " ", folded)
+    stripped = " ".join(stripped.replace("-", " ").split())
+    if stripped in GRADE_ALIASES:
+        return GRADE_ALIASES[stripped]
+    for word, number in ORDINAL_GRADES.items():
+        if stripped == word:
+            return number
+    match = re.fullmatch(r"(\d{1,2})(st|nd|rd|th)?", stripped)
+    if match:
+        number = int(match.group(1))
+        if number == 0:
+            return "K"
+        if 1 <= number <= 12:
+            return str(number)
+    return folded
+
+def normalize_subject(subject: str) -> str:
+    """
+    Map a subject onto its canonical lowercase name.
+
+    Args:
+        subject: Subject as entered (e.g., 'Biology', 'bio', ' maths ')
+
+    Returns:
+        The canonical subject name
+    """
+    folded = fold_text(subject) or ""
+    return SUBJECT_ALIASES.get(folded, folded)
+
+def normalize_language(language: str) -> str:
+    """
+    Map a language name or code onto its ISO 639-1 code.
+
+    Args:
+        language: Language as entered (e.g., 'English', 'en', 'EN-us', 'Deutsch')
+
+    Returns:
+        The ISO 639-1 code, or the folded input if it is not recognized
+    """
+    folded = fold_text(language) or ""
+    base = re.split(r"[-_]", folded, maxsplit=1)[0]  # 'en-us' -> 'en'
+    if base in LANGUAGE_NAMES:
+        return base
+    return LANGUAGE_ALIASES.get(folded, LANGUAGE_ALIASES.get(base, folded))
+
+def language_display_name(language: str) -> str:
+    """
+    Get the English name used in prompts for a language name or code.
+
+    Args:
+        language: Language as entered or its ISO code
+
+    Returns:
+        The English language name (the input, tidied, if it is not recognized)
+    """
+    code = normalize_language(language)
+    return LANGUAGE_NAMES.get(code, " ".join(language.split()).title())
+
+def canonicalize_request_fields(fields: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, str]]]:
+    """
+    Canonicalize the free-form fields of a generation request.
+
+    Grade, subject and language are mapped through the normalization tables
+    (language to its English name, matching what the prompts expect); topic and
+    other free-text fields are whitespace-collapsed but keep their casing, since
+    they end up in the prompt and the response (canonical_request_key folds them).
+
+    Args:
+        fields: Request fields (e.g., ``request.model_dump()``)
+
+    Returns:
+        Tuple of (canonical fields, {field: {"original", "canonical"}} for every changed field)
+    """
+    canonical = dict(fields)
+    if fields.get("academic_grade") is not None:
+        canonical["academic_grade"] = normalize_grade(fields["academic_grade"])
+    if fields.get("subject") is not None:
+        canonical["subject"] = normalize_subject(fields["subject"])
+    if fields.get("language") is not None:
+        canonical["language"] = language_display_name(fields["language"])
+    for field in FOLDED_FIELDS:
+        if field in fields:
+            canonical[field] = collapse_whitespace(fields[field])
+
+    changes = {
+        field: {"original": str(fields[field]), "canonical": str(canonical[field])}
+        for field in CANONICAL_FIELDS + FOLDED_FIELDS
+        if fields.get(field) is not None and canonical.get(field) != fields[field]
+    }
+    return canonical, changes
+
+def canonical_request_key(fields: Dict[str, Any], exclude: Tuple[str, ...] = ()) -> str:
+    """
+    Build a stable key for a request from its canonical form.
+
+    Use this for every cache, coalescing and similarity key so that logically
+    identical requests share one entry. Languages are keyed by ISO code and
+    free-text fields are case-folded.
+
+    Args:
+        fields: Request fields (canonicalized or not)
+        exclude: Field names that should not contribute to the key
+
+    Returns:
+        Hex SHA-256 digest of the canonical fields
+    """
+    canonical, _ = canonicalize_request_fields(fields)
+    if canonical.get("language") is not None:
+        canonical["language"] = normalize_language(canonical["language"])
+    for field in FOLDED_FIELDS:
+        if field in canonical:
+            canonical[field] = fold_text(canonical[field])
+    keyed = {k: v for k, v in canonical.items() if k not in exclude}
+    payload = json.dumps(keyed, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
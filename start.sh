@@ -1,5 +1,17 @@
 #!/usr/bin/env bash
 # start.sh - Start script for Render deployment
+#
+# WEB_CONCURRENCY sets the number of worker processes (default 1). With more
+# than one, the workers share caches, rate limits and job state through
+# SQLite files in SHARED_STATE_DIR, and startup tasks run in only one of them.
 
-echo "Starting FastAPI application with Uvicorn..."
-uvicorn main:app --host 0.0.0.0 --port $PORT 
\ No newline at end of file
+WORKERS="${WEB_CONCURRENCY:-1}"
+if [ "$WORKERS" -gt 1 ]; then
+    export SHARED_STATE_DIR="${SHARED_STATE_DIR:-${TMPDIR:-/tmp}/easylesson-state}"
+    mkdir -p "$SHARED_STATE_DIR"
+fi
+# Identifies the workers started together, for run-once startup tasks
+export STARTUP_ID="${STARTUP_ID:-$(date +%s)-$$}"
+
+echo "Starting FastAPI application with Uvicorn ($WORKERS worker(s))..."
+exec uvicorn main:app --host 0.0.0.0 --port $PORT --workers "$WORKERS"
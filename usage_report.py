@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Usage Report - LLM tokens, cost and latency from the usage ledger.
+
+    python usage_report.py                      # per day
+    python usage_report.py --by subject --since 2026-10-01
+    python usage_report.py --by endpoint --json
+
+Reads USAGE_LEDGER_PATH (default data/usage.sqlite3), like the running app.
+The same report is served at GET /api/admin/usage.
+"""
+
+import sys
+import json
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.llm.usage_ledger import GROUPS, totals, usage_ledger  # noqa: E402  (needs the environment loaded first)
+
+COLUMNS = ("requests", "cache_hits", "errors", "prompt_tokens", "completion_tokens", "cost_usd", "avg_latency_ms", "max_latency_ms")
+
+
+def _format(name: str, value) -> str:
+    if value is None:
+        return "-"
+    if name == "cost_usd":
+        return f"{value:,.4f}"
+    if isinstance(value, float):
+        return f"{value:,.1f}"
+    return f"{value:,}" if isinstance(value, int) else str(value)
+
+
+def print_table(group_by: str, rows) -> None:
+    header = (group_by,) + COLUMNS
+    lines = [[_format(name, row.get(name)) for name in header] for row in rows]
+    summed = totals(rows)
+    lines.append(["TOTAL"] + [_format(name, summed.get(name)) for name in COLUMNS])
+    widths = [max(len(name), *(len(line[i]) for line in lines)) for i, name in enumerate(header)]
+    print("  ".join(name.ljust(width) if i == 0 else name.rjust(width) for i, (name, width) in enumerate(zip(header, widths))))
+    for line in lines:
+        print("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(line, widths))))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report LLM usage and cost from the usage ledger")
+    parser.add_argument("--by", choices=list(GROUPS), default="day", help="Aggregate per this dimension (default: day)")
+    parser.add_argument("--since", help="First UTC day to include (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last UTC day to include (YYYY-MM-DD)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not usage_ledger.enabled:
+        print("The usage ledger is disabled (USAGE_LEDGER_PATH is empty).", file=sys.stderr)
+        return 1
+    rows = usage_ledger.report(args.by, args.since, args.until)
+    if args.json:
+        print(json.dumps({"group_by": args.by, "rows": rows, "totals": totals(rows)}, indent=2))
+    elif not rows:
+        print(f"No LLM usage recorded in {usage_ledger.path} for that period.")
+    else:
+        print_table(args.by, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())